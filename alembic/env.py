@@ -12,7 +12,12 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from models.Base import Base
 from models.Campaign import Campaign
 from models.CampaignSchedule import CampaignSchedule
+from models.ScheduleTemplate import ScheduleTemplate
+from models.ScheduleTemplateSlot import ScheduleTemplateSlot
 from models.RuleEvaluationLog import RuleEvaluationLog
+from models.EvaluationSweep import EvaluationSweep
+from models.SweepCycle import SweepCycle
+from models.SweepChunk import SweepChunk
 
 POSTGRES_DB = os.getenv("POSTGRES_DB", "db_name")
 POSTGRES_USER = os.getenv("POSTGRES_USER", "db_user")
@@ -0,0 +1,33 @@
+"""Evaluation count
+
+Revision ID: 0a6d3e8f4c12
+Revises: f5c2a8d31b47
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a6d3e8f4c12'
+down_revision: Union[str, Sequence[str], None] = 'f5c2a8d31b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('campaigns', sa.Column('evaluation_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.execute(
+        "UPDATE campaigns SET evaluation_count = counts.total "
+        "FROM (SELECT campaign_id, count(*) AS total FROM rule_evaluation_logs GROUP BY campaign_id) AS counts "
+        "WHERE counts.campaign_id = campaigns.id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('campaigns', 'evaluation_count')
@@ -0,0 +1,54 @@
+"""Dirty tracking
+
+Revision ID: 3f2b9c1d7a10
+Revises: 67a1ac74239d
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2b9c1d7a10'
+down_revision: Union[str, Sequence[str], None] = '67a1ac74239d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DIRTY_CONDITION = "evaluated_version IS NULL OR evaluated_version < inputs_version"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('campaigns', sa.Column('inputs_version', sa.Integer(), server_default=sa.text('1'), nullable=False))
+    op.add_column('campaigns', sa.Column('evaluated_version', sa.Integer(), nullable=True))
+    op.create_index('ix_campaigns_dirty', 'campaigns', ['id'], unique=False,
+                    postgresql_where=sa.text(DIRTY_CONDITION))
+    op.create_index('ix_campaign_schedules_day_start', 'campaign_schedules', ['day_of_week', 'start_time'], unique=False)
+    op.create_index('ix_campaign_schedules_day_end', 'campaign_schedules', ['day_of_week', 'end_time'], unique=False)
+    op.create_table('evaluation_sweeps',
+    sa.Column('mode', sa.Enum('FULL', 'INCREMENTAL', name='sweep_mode_enum'), nullable=False),
+    sa.Column('swept_at', sa.DateTime(), nullable=False),
+    sa.Column('evaluated', sa.Integer(), nullable=False),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_evaluation_sweeps_id'), 'evaluation_sweeps', ['id'], unique=False)
+    op.create_index(op.f('ix_evaluation_sweeps_swept_at'), 'evaluation_sweeps', ['swept_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_evaluation_sweeps_swept_at'), table_name='evaluation_sweeps')
+    op.drop_index(op.f('ix_evaluation_sweeps_id'), table_name='evaluation_sweeps')
+    op.drop_table('evaluation_sweeps')
+    sa.Enum(name='sweep_mode_enum').drop(op.get_bind(), checkfirst=True)
+    op.drop_index('ix_campaign_schedules_day_end', table_name='campaign_schedules')
+    op.drop_index('ix_campaign_schedules_day_start', table_name='campaign_schedules')
+    op.drop_index('ix_campaigns_dirty', table_name='campaigns')
+    op.drop_column('campaigns', 'evaluated_version')
+    op.drop_column('campaigns', 'inputs_version')
@@ -0,0 +1,154 @@
+"""Partition evaluation logs
+
+Revision ID: 6e1f9b2c7d45
+Revises: 0a6d3e8f4c12
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e1f9b2c7d45'
+down_revision: Union[str, Sequence[str], None] = '0a6d3e8f4c12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Размер пачки переноса строк, каждая пачка - отдельная транзакция
+COPY_BATCH_SIZE = 10000
+
+COLUMNS = "id, campaign_id, triggered_rule, previous_target, new_target, context, created_at, updated_at"
+
+# Разбиение на момент миграции; дальше партиции создает LogPartitionService по своим настройкам
+PARTITION_INTERVAL = "month"
+PARTITIONS_AHEAD = 2
+
+
+# Копии функций log_partition_service на момент ревизии: миграция не зависит от кода приложения
+def partition_start(moment: datetime) -> datetime:
+    moment = moment.astimezone(timezone.utc)
+    if PARTITION_INTERVAL == "day":
+        return datetime(moment.year, moment.month, moment.day, tzinfo=timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def next_partition_start(start: datetime) -> datetime:
+    if PARTITION_INTERVAL == "day":
+        return start + timedelta(days=1)
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_ddl(start: datetime) -> str:
+    suffix = start.strftime("%Y%m%d" if PARTITION_INTERVAL == "day" else "%Y%m")
+    return (
+        f"CREATE TABLE IF NOT EXISTS rule_evaluation_logs_p{suffix} "
+        f"PARTITION OF rule_evaluation_logs "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{next_partition_start(start).isoformat()}')"
+    )
+
+
+# Строки вне созданных диапазонов не роняют перенос и вставки
+DEFAULT_PARTITION_DDL = "CREATE TABLE IF NOT EXISTS rule_evaluation_logs_default PARTITION OF rule_evaluation_logs DEFAULT"
+
+
+def _create_log_table(partitioned: bool) -> None:
+    op.create_table('rule_evaluation_logs',
+    sa.Column('campaign_id', sa.UUID(), nullable=False),
+    sa.Column('triggered_rule', sa.String(length=80), nullable=True),
+    sa.Column('previous_target', postgresql.ENUM('ACTIVE', 'PAUSED', name='status_enum', create_type=False), nullable=False),
+    sa.Column('new_target', postgresql.ENUM('ACTIVE', 'PAUSED', name='status_enum', create_type=False), nullable=False),
+    sa.Column('context', sa.JSON(), nullable=False),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['campaign_id'], ['campaigns.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', 'created_at') if partitioned else sa.PrimaryKeyConstraint('id'),
+    **({'postgresql_partition_by': 'RANGE (created_at)'} if partitioned else {})
+    )
+
+
+def _create_log_indexes() -> None:
+    op.create_index(op.f('ix_rule_evaluation_logs_campaign_id'), 'rule_evaluation_logs', ['campaign_id'], unique=False)
+    op.create_index(op.f('ix_rule_evaluation_logs_id'), 'rule_evaluation_logs', ['id'], unique=False)
+    op.create_index('ix_rule_evaluation_logs_campaign_created', 'rule_evaluation_logs',
+                    ['campaign_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+
+
+def _rename_to_legacy() -> None:
+    """Старая таблица переименовывается вместе с индексами, чтобы имена освободились для новой"""
+    op.rename_table('rule_evaluation_logs', 'rule_evaluation_logs_legacy')
+    op.execute("ALTER TABLE rule_evaluation_logs_legacy RENAME CONSTRAINT rule_evaluation_logs_pkey "
+               "TO rule_evaluation_logs_legacy_pkey")
+    op.drop_index('ix_rule_evaluation_logs_campaign_created', table_name='rule_evaluation_logs_legacy')
+    op.drop_index(op.f('ix_rule_evaluation_logs_campaign_id'), table_name='rule_evaluation_logs_legacy')
+    op.drop_index(op.f('ix_rule_evaluation_logs_id'), table_name='rule_evaluation_logs_legacy')
+
+
+def _legacy_exists() -> bool:
+    """Прерванный перенос: переименование и новая таблица уже закоммичены, осталось докопировать"""
+    return sa.inspect(op.get_bind()).has_table('rule_evaluation_logs_legacy')
+
+
+def _copy_in_batches() -> None:
+    """
+    Перенос строк keyset-пачками по первичному ключу старой таблицы. Пачки идут по возрастанию id,
+    поэтому повторный запуск продолжает с наибольшего уже перенесенного id (сервис в это время остановлен).
+    """
+    bind = op.get_bind()
+    last_id = bind.execute(sa.text("SELECT id FROM rule_evaluation_logs ORDER BY id DESC LIMIT 1")).scalar()
+    last_id = str(last_id) if last_id is not None else None
+    with op.get_context().autocommit_block():
+        while True:
+            copied = bind.execute(
+                sa.text(
+                    f"WITH batch AS ("
+                    f"SELECT {COLUMNS} FROM rule_evaluation_logs_legacy "
+                    f"WHERE CAST(:last_id AS uuid) IS NULL OR id > CAST(:last_id AS uuid) "
+                    f"ORDER BY id LIMIT :batch_size"
+                    f") INSERT INTO rule_evaluation_logs ({COLUMNS}) SELECT {COLUMNS} FROM batch RETURNING id"
+                ),
+                {"last_id": last_id, "batch_size": COPY_BATCH_SIZE}
+            ).scalars().all()
+            if not copied:
+                break
+            last_id = str(max(copied))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _legacy_exists():
+        _rename_to_legacy()
+        _create_log_table(partitioned=True)
+
+        # Партиции от самой старой записи до PARTITIONS_AHEAD интервалов вперед
+        oldest = op.get_bind().execute(sa.text("SELECT min(created_at) FROM rule_evaluation_logs_legacy")).scalar()
+        now = datetime.now(timezone.utc)
+        start = partition_start(oldest or now)
+        last = partition_start(now)
+        for _ in range(PARTITIONS_AHEAD):
+            last = next_partition_start(last)
+        while start <= last:
+            op.execute(partition_ddl(start))
+            start = next_partition_start(start)
+        op.execute(DEFAULT_PARTITION_DDL)
+
+        # Индексы создаются на родителе до переноса и наследуются всеми партициями
+        _create_log_indexes()
+    _copy_in_batches()
+    op.drop_table('rule_evaluation_logs_legacy')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if not _legacy_exists():
+        _rename_to_legacy()
+        _create_log_table(partitioned=False)
+        _create_log_indexes()
+    _copy_in_batches()
+    # Партиции удаляются вместе с родительской таблицей
+    op.drop_table('rule_evaluation_logs_legacy')
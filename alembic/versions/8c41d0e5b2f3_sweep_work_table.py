@@ -0,0 +1,66 @@
+"""Sweep work table
+
+Revision ID: 8c41d0e5b2f3
+Revises: 3f2b9c1d7a10
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41d0e5b2f3'
+down_revision: Union[str, Sequence[str], None] = '3f2b9c1d7a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('sweep_cycles',
+    sa.Column('cycle_key', sa.String(length=120), nullable=False),
+    sa.Column('mode', postgresql.ENUM('FULL', 'INCREMENTAL', name='sweep_mode_enum', create_type=False), nullable=False),
+    sa.Column('swept_at', sa.DateTime(), nullable=False),
+    sa.Column('since', sa.DateTime(), nullable=True),
+    sa.Column('chunk_count', sa.Integer(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('cycle_key')
+    )
+    op.create_index(op.f('ix_sweep_cycles_id'), 'sweep_cycles', ['id'], unique=False)
+    op.create_table('sweep_chunks',
+    sa.Column('cycle_id', sa.UUID(), nullable=False),
+    sa.Column('chunk_no', sa.Integer(), nullable=False),
+    sa.Column('id_after', sa.UUID(), nullable=True),
+    sa.Column('id_to', sa.UUID(), nullable=True),
+    sa.Column('progress_id', sa.UUID(), nullable=True),
+    sa.Column('status', sa.Enum('PENDING', 'CLAIMED', 'DONE', name='chunk_status_enum'), nullable=False),
+    sa.Column('lease_owner', sa.String(length=120), nullable=True),
+    sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('attempt', sa.Integer(), nullable=False),
+    sa.Column('evaluated', sa.Integer(), nullable=False),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['cycle_id'], ['sweep_cycles.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_sweep_chunks_cycle_status', 'sweep_chunks', ['cycle_id', 'status', 'chunk_no'], unique=False)
+    op.create_index(op.f('ix_sweep_chunks_id'), 'sweep_chunks', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_sweep_chunks_id'), table_name='sweep_chunks')
+    op.drop_index('ix_sweep_chunks_cycle_status', table_name='sweep_chunks')
+    op.drop_table('sweep_chunks')
+    sa.Enum(name='chunk_status_enum').drop(op.get_bind(), checkfirst=True)
+    op.drop_index(op.f('ix_sweep_cycles_id'), table_name='sweep_cycles')
+    op.drop_table('sweep_cycles')
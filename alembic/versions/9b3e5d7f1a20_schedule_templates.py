@@ -0,0 +1,66 @@
+"""Schedule templates
+
+Revision ID: 9b3e5d7f1a20
+Revises: 6e1f9b2c7d45
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b3e5d7f1a20'
+down_revision: Union[str, Sequence[str], None] = '6e1f9b2c7d45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('schedule_templates',
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('version', sa.Integer(), server_default=sa.text('1'), nullable=False),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_schedule_templates_id'), 'schedule_templates', ['id'], unique=False)
+    op.create_index(op.f('ix_schedule_templates_name'), 'schedule_templates', ['name'], unique=True)
+    op.create_table('schedule_template_slots',
+    sa.Column('template_id', sa.UUID(), nullable=False),
+    sa.Column('day_of_week', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.Time(), nullable=False),
+    sa.Column('end_time', sa.Time(), nullable=False),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['template_id'], ['schedule_templates.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_schedule_template_slots_id'), 'schedule_template_slots', ['id'], unique=False)
+    op.create_index(op.f('ix_schedule_template_slots_template_id'), 'schedule_template_slots', ['template_id'], unique=False)
+    op.create_index('ix_schedule_template_slots_day_start', 'schedule_template_slots', ['day_of_week', 'start_time'], unique=False)
+    op.create_index('ix_schedule_template_slots_day_end', 'schedule_template_slots', ['day_of_week', 'end_time'], unique=False)
+    op.add_column('campaigns', sa.Column('schedule_template_id', sa.UUID(), nullable=True))
+    op.create_index(op.f('ix_campaigns_schedule_template_id'), 'campaigns', ['schedule_template_id'], unique=False)
+    op.create_foreign_key('campaigns_schedule_template_id_fkey', 'campaigns', 'schedule_templates',
+                          ['schedule_template_id'], ['id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('campaigns_schedule_template_id_fkey', 'campaigns', type_='foreignkey')
+    op.drop_index(op.f('ix_campaigns_schedule_template_id'), table_name='campaigns')
+    op.drop_column('campaigns', 'schedule_template_id')
+    op.drop_index('ix_schedule_template_slots_day_end', table_name='schedule_template_slots')
+    op.drop_index('ix_schedule_template_slots_day_start', table_name='schedule_template_slots')
+    op.drop_index(op.f('ix_schedule_template_slots_template_id'), table_name='schedule_template_slots')
+    op.drop_index(op.f('ix_schedule_template_slots_id'), table_name='schedule_template_slots')
+    op.drop_table('schedule_template_slots')
+    op.drop_index(op.f('ix_schedule_templates_name'), table_name='schedule_templates')
+    op.drop_index(op.f('ix_schedule_templates_id'), table_name='schedule_templates')
+    op.drop_table('schedule_templates')
@@ -0,0 +1,31 @@
+"""Status change stream
+
+Revision ID: a4d8f2c6e0b3
+Revises: e3a7c9b5d1f8
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d8f2c6e0b3'
+down_revision: Union[str, Sequence[str], None] = 'e3a7c9b5d1f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Индекс на партиционированной таблице создается и на всех ее партициях
+    op.create_index('ix_rule_evaluation_logs_target_changes', 'rule_evaluation_logs',
+                    ['created_at', 'id'], unique=False,
+                    postgresql_where=sa.text('previous_target <> new_target'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_rule_evaluation_logs_target_changes', table_name='rule_evaluation_logs')
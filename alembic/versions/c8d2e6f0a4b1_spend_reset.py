@@ -0,0 +1,33 @@
+"""Spend reset
+
+Revision ID: c8d2e6f0a4b1
+Revises: 9b3e5d7f1a20
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8d2e6f0a4b1'
+down_revision: Union[str, Sequence[str], None] = '9b3e5d7f1a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('campaigns', sa.Column('timezone', sa.String(length=64), server_default='UTC', nullable=False))
+    # Существующие кампании считаются уже сброшенными сегодня, иначе первый прогон обнулит текущий расход
+    op.add_column('campaigns', sa.Column('spend_reset_on', sa.Date(), server_default=sa.text('CURRENT_DATE'), nullable=False))
+    op.create_index('ix_campaigns_timezone_reset', 'campaigns', ['timezone', 'spend_reset_on'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_campaigns_timezone_reset', table_name='campaigns')
+    op.drop_column('campaigns', 'spend_reset_on')
+    op.drop_column('campaigns', 'timezone')
@@ -0,0 +1,39 @@
+"""Hot path indexes
+
+Revision ID: d41a7f2e9c58
+Revises: b7e93a4c61d2
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41a7f2e9c58'
+down_revision: Union[str, Sequence[str], None] = 'b7e93a4c61d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('campaigns', sa.Column('needs_sync', sa.Boolean(),
+                                         sa.Computed('current_status <> target_status', persisted=True),
+                                         nullable=False))
+    op.create_index('ix_campaigns_needs_sync', 'campaigns', ['id'], unique=False,
+                    postgresql_where=sa.text('needs_sync'))
+    op.create_index('ix_campaigns_managed', 'campaigns', ['id'], unique=False,
+                    postgresql_where=sa.text('is_managed'))
+    op.create_index('ix_rule_evaluation_logs_campaign_created', 'rule_evaluation_logs',
+                    ['campaign_id', sa.text('created_at DESC')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_rule_evaluation_logs_campaign_created', table_name='rule_evaluation_logs')
+    op.drop_index('ix_campaigns_managed', table_name='campaigns')
+    op.drop_index('ix_campaigns_needs_sync', table_name='campaigns')
+    op.drop_column('campaigns', 'needs_sync')
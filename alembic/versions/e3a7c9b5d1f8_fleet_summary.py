@@ -0,0 +1,29 @@
+"""Fleet summary
+
+Revision ID: e3a7c9b5d1f8
+Revises: c8d2e6f0a4b1
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a7c9b5d1f8'
+down_revision: Union[str, Sequence[str], None] = 'c8d2e6f0a4b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Заполняется следующим полным прогоном правил
+    op.add_column('campaigns', sa.Column('blocked_by', sa.String(length=80), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('campaigns', 'blocked_by')
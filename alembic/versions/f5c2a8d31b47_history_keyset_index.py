@@ -0,0 +1,32 @@
+"""History keyset index
+
+Revision ID: f5c2a8d31b47
+Revises: d41a7f2e9c58
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5c2a8d31b47'
+down_revision: Union[str, Sequence[str], None] = 'd41a7f2e9c58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index('ix_rule_evaluation_logs_campaign_created', table_name='rule_evaluation_logs')
+    op.create_index('ix_rule_evaluation_logs_campaign_created', 'rule_evaluation_logs',
+                    ['campaign_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_rule_evaluation_logs_campaign_created', table_name='rule_evaluation_logs')
+    op.create_index('ix_rule_evaluation_logs_campaign_created', 'rule_evaluation_logs',
+                    ['campaign_id', sa.text('created_at DESC')], unique=False)
@@ -0,0 +1,141 @@
+import csv
+import json
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
+from pydantic import TypeAdapter, ValidationError
+
+from models.schemas.campaignSchema import CampaignCreate
+from app.services.campaign_service import BULK_CHUNK_SIZE
+
+
+# Один адаптер на процесс: схема валидации строится один раз, пачка проверяется одним вызовом
+campaigns_adapter = TypeAdapter(List[CampaignCreate])
+
+def detect_format(content_type: Optional[str]) -> str:
+    return "csv" if content_type and "csv" in content_type.lower() else "ndjson"
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Строки тела запроса по мере поступления, без чтения всего тела в память"""
+    tail = b""
+    async for chunk in stream:
+        tail += chunk
+        *lines, tail = tail.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if tail:
+        yield tail.decode("utf-8-sig").rstrip("\r")
+
+
+async def iter_records(
+    stream: AsyncIterator[bytes],
+    body_format: str
+) -> AsyncIterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Записи импорта: (номер записи с 1, поля или None, ошибка разбора или None).
+    NDJSON - один JSON-объект на строку, CSV - заголовок и одна кампания на строку,
+    пустые ячейки CSV считаются незаданными полями.
+    """
+    header = None
+    row_no = 0
+    async for line in iter_lines(stream):
+        if not line.strip():
+            continue
+        if body_format == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row_no += 1
+            if len(values) != len(header):
+                yield row_no, None, f"Ожидалось {len(header)} колонок, получено {len(values)}"
+                continue
+            yield row_no, {name: value for name, value in zip(header, values) if value != ""}, None
+        else:
+            row_no += 1
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield row_no, None, f"Некорректный JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield row_no, None, "Ожидался JSON-объект"
+                continue
+            yield row_no, record, None
+
+
+def _name_of(record: Dict[str, Any]) -> Optional[str]:
+    name = record.get("name")
+    return name if isinstance(name, str) else None
+
+
+def validate_chunk(
+    records: List[Tuple[int, Dict[str, Any]]]
+) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]:
+    """
+    Проверка пачки одним вызовом адаптера. При ошибках сломанные строки
+    определяются по индексу в loc и исключаются, остаток проверяется повторно.
+    """
+    errors: Dict[int, str] = {}
+    while True:
+        pending = [(position, data) for position, (_, data) in enumerate(records) if position not in errors]
+        try:
+            validated = campaigns_adapter.validate_python([data for _, data in pending])
+            break
+        except ValidationError as e:
+            for error in e.errors():
+                position = pending[error["loc"][0]][0]
+                field = ".".join(str(part) for part in error["loc"][1:])
+                errors.setdefault(position, f"{field}: {error['msg']}" if field else error["msg"])
+
+    valid = [
+        (records[position][0], campaign.model_dump(exclude_unset=True))
+        for (position, _), campaign in zip(pending, validated)
+    ]
+    invalid = [
+        {"row": records[position][0], "name": _name_of(records[position][1]), "error": message}
+        for position, message in sorted(errors.items())
+    ]
+    return valid, invalid
+
+
+def _drop_repeated_names(
+    valid: List[Tuple[int, Dict[str, Any]]],
+    seen_names: Dict[str, int]
+) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]:
+    """Повтор имени внутри импорта - ошибка строки-повтора, первая строка остается"""
+    unique, repeated = [], []
+    for row_no, data in valid:
+        first_row = seen_names.setdefault(data["name"], row_no)
+        if first_row == row_no:
+            unique.append((row_no, data))
+        else:
+            repeated.append({"row": row_no, "name": data["name"], "error": f"Имя уже встречалось в строке {first_row}"})
+    return unique, repeated
+
+
+async def iter_validated_chunks(
+    stream: AsyncIterator[bytes],
+    body_format: str,
+    chunk_size: int = BULK_CHUNK_SIZE
+) -> AsyncIterator[Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]]:
+    """Пачки (валидные строки, ошибки строк) по chunk_size записей"""
+    seen_names: Dict[str, int] = {}
+    records: List[Tuple[int, Dict[str, Any]]] = []
+    errors: List[Dict[str, Any]] = []
+
+    async for row_no, record, error in iter_records(stream, body_format):
+        if error is not None:
+            errors.append({"row": row_no, "name": None, "error": error})
+        else:
+            records.append((row_no, record))
+        if len(records) < chunk_size:
+            continue
+        valid, invalid = validate_chunk(records)
+        unique, repeated = _drop_repeated_names(valid, seen_names)
+        yield unique, errors + invalid + repeated
+        records, errors = [], []
+
+    if records or errors:
+        valid, invalid = validate_chunk(records)
+        unique, repeated = _drop_repeated_names(valid, seen_names)
+        yield unique, errors + invalid + repeated
@@ -0,0 +1,57 @@
+import re
+import zlib
+from typing import List, Optional, Sequence
+
+# "v<version>" или "v<version>-<crc32 полей>" для ответа с ?fields=
+ETAG_PATTERN = re.compile(r'"v(\d+)(?:-[0-9a-f]{8})?"')
+
+
+def campaign_etag(version: int, fields: Optional[Sequence[str]] = None) -> str:
+    """
+    Сильный ETag кампании и ее расписания. version растет при каждой записи, меняющей
+    ответ API, включая замену слотов привязанного шаблона, поэтому одинаковый ETag
+    означает байт-в-байт одинаковый ответ. Ответ с набором полей (?fields=) - другое
+    представление той же версии, к ETag добавляется контрольная сумма списка полей.
+    """
+    if fields is None:
+        return f'"v{version}"'
+    return f'"v{version}-{zlib.crc32(",".join(fields).encode()):08x}"'
+
+
+def _etags(header: str) -> List[str]:
+    return [value.strip() for value in header.split(",") if value.strip()]
+
+
+def etag_matches(if_none_match: Optional[str], version: int, fields: Optional[Sequence[str]] = None) -> bool:
+    """If-None-Match совпадает с текущей версией (слабое сравнение, как требует RFC 9110)"""
+    if if_none_match is None:
+        return False
+    etag = campaign_etag(version, fields)
+    return any(value == "*" or value.removeprefix("W/") == etag for value in _etags(if_none_match))
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[List[int]]:
+    """
+    Версии из If-Match для условной записи
+
+    Returns:
+        None - условия нет (заголовка нет или "*": кампания только должна существовать),
+        иначе список версий; ETag ответа с ?fields= задает ту же версию,
+        слабые и чужие ETag не совпадают ни с одной версией
+
+    Raises:
+        ValueError: в заголовке нет ни одного ETag
+    """
+    if if_match is None:
+        return None
+    etags = _etags(if_match)
+    if not etags:
+        raise ValueError("Пустой If-Match")
+    if "*" in etags:
+        return None
+    versions = []
+    for etag in etags:
+        match = ETAG_PATTERN.fullmatch(etag)
+        if match:
+            versions.append(int(match.group(1)))
+    return versions
@@ -1,10 +1,14 @@
 from typing import AsyncGenerator
-from fastapi import Depends
+from fastapi import Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.config import get_db
+from database.config import get_db, get_read_db, ReplicaRouter, read_router
 from app.services.campaign_service import CampaignService
 from app.services.evaluation_service import EvaluationService
+from app.services.sweep_service import SweepService
+from app.services.schedule_template_service import ScheduleTemplateService
+from app.services.ingestion_service import MetricsBuffer, metrics_buffer
+from app.services.fleet_summary import FleetSummary, fleet_summary
 
 
 async def get_campaign_service(db: AsyncSession = Depends(get_db)) -> AsyncGenerator[CampaignService, None]:
@@ -13,3 +17,48 @@ async def get_campaign_service(db: AsyncSession = Depends(get_db)) -> AsyncGener
 
 async def get_evaluation_service(db: AsyncSession = Depends(get_db)) -> AsyncGenerator[EvaluationService, None]:
     yield EvaluationService(db)
+
+
+async def get_read_campaign_service(db: AsyncSession = Depends(get_read_db)) -> AsyncGenerator[CampaignService, None]:
+    yield CampaignService(db)
+
+
+async def get_read_evaluation_service(db: AsyncSession = Depends(get_read_db)) -> AsyncGenerator[EvaluationService, None]:
+    yield EvaluationService(db)
+
+
+def get_read_router() -> ReplicaRouter:
+    return read_router
+
+
+async def get_evaluation_service_for_run(
+    dry_run: bool = Query(False, description="Dry-run режим"),
+    db: AsyncSession = Depends(get_db),
+    router: ReplicaRouter = Depends(get_read_router)
+) -> AsyncGenerator[EvaluationService, None]:
+    """
+    Dry-run ничего не пишет и читает с реплики, обычная оценка идет в основную базу.
+    Сессия реплики (и проверка ее отставания) открывается только для dry-run.
+    """
+    if not dry_run:
+        yield EvaluationService(db)
+        return
+    session_factory = await router.session_factory()
+    async with session_factory() as read_db:
+        yield EvaluationService(read_db)
+
+
+async def get_sweep_service(db: AsyncSession = Depends(get_db)) -> AsyncGenerator[SweepService, None]:
+    yield SweepService(db)
+
+
+async def get_schedule_template_service(db: AsyncSession = Depends(get_db)) -> AsyncGenerator[ScheduleTemplateService, None]:
+    yield ScheduleTemplateService(db)
+
+
+def get_metrics_buffer() -> MetricsBuffer:
+    return metrics_buffer
+
+
+def get_fleet_summary() -> FleetSummary:
+    return fleet_summary
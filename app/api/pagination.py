@@ -0,0 +1,41 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Sequence, Tuple
+from uuid import UUID
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Непрозрачный курсор keyset-пагинации: ключ сортировки последней отданной строки.
+    Клиент не должен разбирать курсор, формат может меняться.
+    """
+    payload = json.dumps(
+        [value.isoformat() if isinstance(value, datetime) else str(value) for value in values],
+        separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> Tuple[Any, ...]:
+    """
+    Разобрать курсор обратно в ключ сортировки
+
+    Args:
+        cursor: строка из next_cursor предыдущей страницы
+        types: типы элементов ключа (UUID или datetime)
+
+    Raises:
+        ValueError: курсор поврежден или выдан другим эндпоинтом
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return tuple(
+            datetime.fromisoformat(value) if kind is datetime else UUID(value)
+            for kind, value in zip(types, values)
+        )
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError("Некорректный курсор пагинации")
@@ -2,7 +2,7 @@ from typing import Optional, List, Dict, Any
 from uuid import UUID
 from pydantic import BaseModel, ConfigDict, field_validator
 from datetime import datetime
-from models.enums import Statuses
+from models.enums import Statuses, SweepMode, CountMode
 
 
 class MessageResponse(BaseModel):
@@ -11,9 +11,11 @@ class MessageResponse(BaseModel):
 
 
 class PaginatedResponse(BaseModel):
-    total: int
+    total: Optional[int] = None
+    count_mode: CountMode = CountMode.EXACT
     skip: int
     limit: int
+    next_cursor: Optional[str] = None
 
 
 class EvaluateResponse(BaseModel):
@@ -62,8 +64,24 @@ class BatchEvaluateResult(BaseModel):
 class BatchEvaluateResponse(BaseModel):
     """Ответ для эндпоинта /campaigns/evaluate-all"""
     evaluated: int
-    total_managed: int
+    # None для распределенного прогона: реплика видит только свои чанки (см. processed)
+    total_managed: Optional[int] = None
+    needs_sync: int
+    dry_run: bool = False
+    mode: SweepMode = SweepMode.FULL
+    evaluated_at: datetime
+    cycle_key: Optional[str] = None
+    chunks_processed: Optional[int] = None
+    processed: Optional[int] = None
+    results: List[BatchEvaluateResult]
+
+
+class EvaluateBatchResponse(BaseModel):
+    """Ответ для эндпоинта /campaigns/evaluate-batch"""
+    evaluated: int
+    matched: int
     needs_sync: int
+    not_matched: List[UUID]
     dry_run: bool = False
     evaluated_at: datetime
     results: List[BatchEvaluateResult]
@@ -81,9 +99,26 @@ class ScheduleResponse(BaseModel):
     """Ответ с расписанием кампании"""
     campaign_id: UUID
     schedule_enabled: bool
+    schedule_template_id: Optional[UUID] = None
     slots: List[ScheduleSlotResponse]
 
 
+class ScheduleTemplateResponse(BaseModel):
+    """Шаблон расписания со слотами"""
+    id: UUID
+    name: str
+    version: int
+    campaigns: int
+    slots: List[ScheduleSlotResponse]
+
+
+class ScheduleTemplateAssignResponse(BaseModel):
+    """Результат привязки шаблона к пачке кампаний"""
+    template_id: UUID
+    attached: int
+    not_found: List[UUID]
+
+
 class EvaluationHistoryEntry(BaseModel):
     """Запись из истории оценок"""
     model_config = ConfigDict(from_attributes=True)
@@ -119,4 +154,48 @@ class CampaignSimpleResponse(BaseModel):
 
 class CampaignsListResponse(PaginatedResponse):
     """Пагинированный ответ со списком кампаний"""
-    campaigns: List[CampaignSimpleResponse]
\ No newline at end of file
+    campaigns: List[CampaignSimpleResponse]
+
+
+class BulkImportError(BaseModel):
+    """Ошибка одной строки пакетного импорта"""
+    row: int
+    name: Optional[str] = None
+    error: str
+
+
+class BulkImportResponse(BaseModel):
+    """Итог пакетного импорта кампаний"""
+    received: int
+    created: int
+    updated: int
+    skipped: int
+    failed: int
+    errors: List[BulkImportError]
+
+
+class MetricsIngestError(BaseModel):
+    """Отклоненная запись метрик"""
+    row: int
+    error: str
+
+
+class MetricsIngestResponse(BaseModel):
+    """Итог приема метрик"""
+    accepted: int
+    rejected: int
+    durability: str
+    pending_campaigns: int
+    flushed_campaigns: Optional[int] = None
+    errors: List[MetricsIngestError]
+
+
+class FleetSummaryResponse(BaseModel):
+    """Сводка парка кампаний по статусам"""
+    total: int
+    by_current_status: Dict[str, int]
+    by_target_status: Dict[str, int]
+    needs_sync: int
+    blocked_by_rule: Dict[str, int]
+    reconciled_at: Optional[datetime] = None
+    last_drift: int
@@ -1,27 +1,89 @@
-from typing import Optional, List, Dict, Any
+import asyncio
+from typing import Optional, List, Dict, Any, Tuple
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, Header
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.dependencies import get_campaign_service, get_evaluation_service
+from app.api.dependencies import (
+    get_campaign_service, get_sweep_service, get_metrics_buffer,
+    get_read_campaign_service, get_read_evaluation_service, get_evaluation_service_for_run
+)
+from app.api.pagination import encode_cursor, decode_cursor
+from app.api.conditional import campaign_etag, etag_matches, parse_if_match
+from app.api.serialization import (
+    JSONBytesResponse, CAMPAIGN_LIST_FIELDS, CAMPAIGN_READ_FIELDS, HISTORY_FIELDS,
+    parse_fields, campaigns_page_json, history_page_json, campaign_json, status_change_event
+)
+from app.api.bulk_import import detect_format, iter_validated_chunks
 from app.api.responses import (
     MessageResponse,
     EvaluateResponse,
     BatchEvaluateResponse,
+    EvaluateBatchResponse,
     ScheduleResponse,
     ScheduleSlotResponse,
     EvaluationHistoryResponse,
-    EvaluationHistoryEntry,
     CampaignsListResponse,
-    CampaignSimpleResponse
+    BulkImportResponse
 )
+from models.Campaign import Campaign
 from models.schemas.campaignSchema import CampaignCreate, CampaignUpdate, CampaignRead
-from models.schemas.campaignScheduleSchema import CampaignScheduleCreate
-from app.services.campaign_service import CampaignService
-from app.services.evaluation_service import EvaluationService
+from models.schemas.evaluationBatchSchema import EvaluateBatchRequest
+from models.enums import SweepMode, CountMode
+from app.services.campaign_service import CampaignService, VersionMismatchError
+from app.services.evaluation_service import EvaluationService, EvaluationConflictError
+from app.services.sweep_service import SweepService
+from app.services.ingestion_service import MetricsBuffer
+from app.services.status_changes import (
+    status_feed, read_changes, STATUS_STREAM_REPLAY_LIMIT, STATUS_STREAM_HEARTBEAT_SECONDS
+)
+from database.config import get_db
 
 
 router = APIRouter(prefix="/campaigns", tags=["campaigns"])
 
+# Колонки строки списка кампаний, в порядке полей CampaignSimpleResponse
+CAMPAIGN_LIST_COLUMNS = tuple(getattr(Campaign, field) for field in CAMPAIGN_LIST_FIELDS)
+
+FIELDS_DESCRIPTION = "Только эти поля через запятую, например id,target_status,needs_sync; остальные колонки не читаются из базы"
+
+
+async def check_not_modified(
+    campaign_id: UUID,
+    if_none_match: Optional[str],
+    campaign_service: CampaignService,
+    fields: Optional[Tuple[str, ...]] = None
+) -> Optional[Response]:
+    """304 по If-None-Match; версия берется из кэша или одной колонкой, без чтения кампании целиком"""
+    if if_none_match is None:
+        return None
+    version = await campaign_service.get_campaign_version(campaign_id)
+    if version is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Кампания с ID {campaign_id} не найдена"
+        )
+    if etag_matches(if_none_match, version, fields):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": campaign_etag(version, fields)})
+    return None
+
+
+def expected_versions(if_match: Optional[str]) -> Optional[List[int]]:
+    try:
+        return parse_if_match(if_match)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def requested_fields(fields: Optional[str], allowed: Tuple[str, ...]) -> Optional[Tuple[str, ...]]:
+    try:
+        return parse_fields(fields, allowed)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 
 @router.post(
     "",
@@ -44,6 +106,43 @@ async def create_campaign(
         )
 
 
+@router.post(
+    "/bulk",
+    response_model=BulkImportResponse,
+    summary="Пакетный импорт кампаний",
+    description="Создать или обновить кампании по name из потока NDJSON или CSV"
+)
+async def bulk_import_campaigns(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$", description="Формат тела; по умолчанию по Content-Type"),
+    on_conflict: str = Query("update", pattern="^(update|skip)$", description="update - обновить кампанию с тем же name, skip - пропустить"),
+    campaign_service: CampaignService = Depends(get_campaign_service),
+    buffer: MetricsBuffer = Depends(get_metrics_buffer)
+):
+    body_format = format or detect_format(request.headers.get("content-type"))
+    report = {"received": 0, "created": 0, "updated": 0, "skipped": 0, "errors": []}
+    
+    async for valid, errors in iter_validated_chunks(request.stream(), body_format):
+        report["received"] += len(valid) + len(errors)
+        report["errors"].extend(errors)
+        if not valid:
+            continue
+        chunk_report = await campaign_service.bulk_upsert(valid, update_existing=on_conflict == "update")
+        for key in ("created", "updated", "skipped"):
+            report[key] += chunk_report[key]
+        report["errors"].extend(chunk_report["errors"])
+        # Каждая пачка фиксируется отдельно, длинный импорт не держит одну транзакцию
+        await campaign_service.db.commit()
+    
+    if report["updated"]:
+        # id обновленных кампаний неизвестны, индекс порогов загрузится заново
+        buffer.thresholds.clear()
+    
+    report["errors"].sort(key=lambda error: error["row"])
+    report["failed"] = len(report["errors"]) - report["skipped"]
+    return BulkImportResponse(**report)
+
+
 @router.get(
     "",
     response_model=CampaignsListResponse,
@@ -51,40 +150,102 @@ async def create_campaign(
     description="Получить список кампаний с пагинацией и фильтрацией"
 )
 async def get_campaigns(
-    skip: int = Query(0, ge=0, description="Сколько записей пропустить"),
+    skip: int = Query(0, ge=0, description="Сколько записей пропустить (устарело, используйте after)"),
     limit: int = Query(100, ge=1, le=1000, description="Сколько записей вернуть"),
+    after: Optional[str] = Query(None, description="Курсор next_cursor из предыдущей страницы"),
+    count: CountMode = Query(CountMode.EXACT, description="Подсчет total: exact - COUNT(*), estimated - приблизительно, none - не считать"),
     is_managed: Optional[bool] = Query(None, description="Фильтр по автоматическому управлению"),
     needs_sync: Optional[bool] = Query(None, description="Фильтр по необходимости синхронизации"),
-    campaign_service: CampaignService = Depends(get_campaign_service)
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    campaign_service: CampaignService = Depends(get_read_campaign_service)
 ):
-    campaigns, total = await campaign_service.get_campaigns(
+    selected = requested_fields(fields, CAMPAIGN_LIST_FIELDS)
+    after_id = None
+    if after is not None:
+        try:
+            after_id, = decode_cursor(after, (UUID,))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    campaigns, total, count_mode = await campaign_service.get_campaigns(
         skip=skip,
         limit=limit,
         is_managed=is_managed,
-        needs_sync=needs_sync
+        needs_sync=needs_sync,
+        after=after_id,
+        count=count,
+        # id читается всегда, из него строится курсор
+        columns=CAMPAIGN_LIST_COLUMNS if selected is None else tuple(
+            column for column in CAMPAIGN_LIST_COLUMNS if column.key == "id" or column.key in selected
+        )
     )
     
-    campaign_responses = []
-    for campaign in campaigns:
-        needs_sync_flag = campaign.current_status != campaign.target_status
-        campaign_responses.append(
-            CampaignSimpleResponse(
-                id=campaign.id,
-                name=campaign.name,
-                current_status=campaign.current_status,
-                target_status=campaign.target_status,
-                is_managed=campaign.is_managed,
-                needs_sync=needs_sync_flag,
-                schedule_enabled=campaign.schedule_enabled,
-                created_at=campaign.created_at
-            )
-        )
+    next_cursor = encode_cursor(campaigns[-1].id) if len(campaigns) == limit else None
     
-    return CampaignsListResponse(
-        total=total,
-        skip=skip,
-        limit=limit,
-        campaigns=campaign_responses
+    # Строки сериализуются сразу в JSON; response_model остается для схемы OpenAPI
+    return JSONBytesResponse(campaigns_page_json(
+        {"total": total, "count_mode": count_mode, "skip": skip, "limit": limit, "next_cursor": next_cursor},
+        campaigns,
+        selected or CAMPAIGN_LIST_FIELDS
+    ))
+
+
+@router.get(
+    "/changes/stream",
+    response_class=StreamingResponse,
+    summary="Поток смен target_status",
+    description="Server-Sent Events: каждая закоммиченная смена target_status оценкой правил. "
+                "id события - токен, с которым переподключение (Last-Event-ID или ?after=) досылает пропущенное"
+)
+async def stream_status_changes(
+    after: Optional[str] = Query(None, description="Токен (id) последнего полученного события"),
+    last_event_id: Optional[str] = Header(None),
+    # Сессия нужна только для досылки и закрывается до начала потока, соединение не держится
+    db: AsyncSession = Depends(get_db, scope="function")
+):
+    if not status_feed.running:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Поток изменений выключен")
+    token = after or last_event_id
+    after_key = None
+    if token is not None:
+        try:
+            after_key = decode_cursor(token, (datetime, UUID))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    # Подписка раньше досылки: событие, закоммиченное между ними, придет живым, повтор отсеется по id
+    subscription = status_feed.subscribe()
+    try:
+        missed = await read_changes(db, after_key) if after_key is not None else []
+    except Exception:
+        status_feed.unsubscribe(subscription)
+        raise
+    
+    async def events():
+        try:
+            if len(missed) >= STATUS_STREAM_REPLAY_LIMIT:
+                # Пропущено больше, чем досылается: клиенту нужна сверка через GET /campaigns?needs_sync=true
+                yield b"event: reset\ndata: {}\n\n"
+            replayed = {change.id for change in missed}
+            for change in missed:
+                yield status_change_event(change)
+            while True:
+                try:
+                    change = await asyncio.wait_for(subscription.queue.get(), timeout=STATUS_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if change is None:
+                    break
+                if change.id not in replayed:
+                    yield status_change_event(change)
+        finally:
+            status_feed.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
@@ -96,17 +257,38 @@ async def get_campaigns(
 )
 async def get_campaign(
     campaign_id: UUID,
-    campaign_service: CampaignService = Depends(get_campaign_service)
+    response: Response,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+    campaign_service: CampaignService = Depends(get_read_campaign_service)
 ):
-    campaign = await campaign_service.get_campaign(campaign_id)
+    selected = requested_fields(fields, CAMPAIGN_READ_FIELDS)
+    not_modified = await check_not_modified(campaign_id, if_none_match, campaign_service, selected)
+    if not_modified is not None:
+        return not_modified
     
-    if not campaign:
+    if selected is not None:
+        values = await campaign_service.get_campaign_fields(campaign_id, selected)
+        if values is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Кампания с ID {campaign_id} не найдена"
+            )
+        return JSONBytesResponse(
+            campaign_json(values, selected),
+            headers={"ETag": campaign_etag(values["version"], selected)}
+        )
+    
+    state = await campaign_service.get_campaign_state(campaign_id)
+    
+    if not state:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Кампания с ID {campaign_id} не найдена"
         )
     
-    return campaign
+    response.headers["ETag"] = campaign_etag(state["campaign"]["version"])
+    return state["campaign"]
 
 
 @router.patch(
@@ -118,9 +300,16 @@ async def get_campaign(
 async def update_campaign(
     campaign_id: UUID,
     update_data: CampaignUpdate,
-    campaign_service: CampaignService = Depends(get_campaign_service)
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    campaign_service: CampaignService = Depends(get_campaign_service),
+    buffer: MetricsBuffer = Depends(get_metrics_buffer)
 ):
-    campaign = await campaign_service.update_campaign(campaign_id, update_data)
+    try:
+        campaign = await campaign_service.update_campaign(campaign_id, update_data, expected_versions(if_match))
+    except VersionMismatchError as e:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=str(e))
+    buffer.thresholds.discard(campaign_id)
     
     if not campaign:
         raise HTTPException(
@@ -128,6 +317,7 @@ async def update_campaign(
             detail=f"Кампания с ID {campaign_id} не найдена"
         )
     
+    response.headers["ETag"] = campaign_etag(campaign.version)
     return campaign
 
 
@@ -140,24 +330,22 @@ async def update_campaign(
 async def set_campaign_schedule(
     campaign_id: UUID,
     schedule_slots: List[Dict[str, Any]],
+    response: Response,
+    if_match: Optional[str] = Header(None),
     campaign_service: CampaignService = Depends(get_campaign_service)
 ):
-    validated_slots = []
-    for slot in schedule_slots:
-        try:
-            slot_with_campaign = {**slot, "campaign_id": campaign_id}
-            validated_slot = CampaignScheduleCreate(**slot_with_campaign)
-            validated_slots.append(validated_slot.model_dump(exclude={"campaign_id"}))
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Неверный формат слота расписания: {str(e)}"
-            )
-    
     try:
         created_slots = await campaign_service.set_campaign_schedule(
             campaign_id=campaign_id,
-            schedule_slots=validated_slots
+            schedule_slots=schedule_slots,
+            expected_versions=expected_versions(if_match)
+        )
+    except VersionMismatchError as e:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=str(e))
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Неверный формат слота расписания: {str(e)}"
         )
     except Exception as e:
         raise HTTPException(
@@ -176,11 +364,10 @@ async def set_campaign_schedule(
             )
         )
     
-    campaign = await campaign_service.get_campaign(campaign_id)
-    
+    response.headers["ETag"] = campaign_etag(await campaign_service.get_campaign_version(campaign_id))
     return ScheduleResponse(
         campaign_id=str(campaign_id),
-        schedule_enabled=campaign.schedule_enabled,
+        schedule_enabled=bool(created_slots),
         slots=slot_responses
     )
 
@@ -193,29 +380,37 @@ async def set_campaign_schedule(
 )
 async def get_campaign_schedule(
     campaign_id: UUID,
-    campaign_service: CampaignService = Depends(get_campaign_service)
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    campaign_service: CampaignService = Depends(get_read_campaign_service)
 ):
-    campaign = await campaign_service.get_campaign(campaign_id)
-    if not campaign:
+    not_modified = await check_not_modified(campaign_id, if_none_match, campaign_service)
+    if not_modified is not None:
+        return not_modified
+    
+    state = await campaign_service.get_campaign_state(campaign_id)
+    if not state:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Кампания с ID {campaign_id} не найдена"
         )
-    schedules = await campaign_service.get_campaign_schedules(campaign_id)
+    response.headers["ETag"] = campaign_etag(state["campaign"]["version"])
+    # Слоты шаблона или собственные, в зависимости от привязки кампании
     slot_responses = []
-    for schedule in schedules:
+    for schedule in state["slots"]:
         slot_responses.append(
             ScheduleSlotResponse(
-                id=str(schedule.id),
-                day_of_week=schedule.day_of_week,
-                start_time=schedule.start_time.isoformat(),
-                end_time=schedule.end_time.isoformat()
+                id=str(schedule["id"]),
+                day_of_week=schedule["day_of_week"],
+                start_time=schedule["start_time"].isoformat(),
+                end_time=schedule["end_time"].isoformat()
             )
         )
     
     return ScheduleResponse(
         campaign_id=str(campaign_id),
-        schedule_enabled=campaign.schedule_enabled,
+        schedule_enabled=state["campaign"]["schedule_enabled"],
+        schedule_template_id=state["campaign"]["schedule_template_id"],
         slots=slot_responses
     )
 
@@ -257,7 +452,7 @@ async def delete_campaign_schedule(
 async def evaluate_campaign(
     campaign_id: UUID,
     dry_run: bool = Query(False, description="Dry-run режим"),
-    evaluation_service: EvaluationService = Depends(get_evaluation_service)
+    evaluation_service: EvaluationService = Depends(get_evaluation_service_for_run)
 ):
     try:
         result = await evaluation_service.evaluate_single_campaign(
@@ -271,6 +466,11 @@ async def evaluate_campaign(
         
         return EvaluateResponse(**result)
         
+    except EvaluationConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -291,10 +491,22 @@ async def evaluate_campaign(
 )
 async def evaluate_all_campaigns(
     dry_run: bool = Query(False, description="Dry-run режим (не сохранять изменения)"),
-    evaluation_service: EvaluationService = Depends(get_evaluation_service)
+    mode: SweepMode = Query(SweepMode.FULL, description="full - все кампании, incremental - только изменившиеся"),
+    distributed: bool = Query(False, description="Разделить прогон с другими репликами через общий цикл"),
+    cycle_key: Optional[str] = Query(None, max_length=120, description="Ключ цикла для distributed режима"),
+    evaluation_service: EvaluationService = Depends(get_evaluation_service_for_run),
+    sweep_service: SweepService = Depends(get_sweep_service)
 ):
+    if distributed and dry_run:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Распределенный прогон не поддерживает dry-run"
+        )
     try:
-        result = await evaluation_service.evaluate_all_campaigns(dry_run=dry_run)
+        if distributed:
+            result = await sweep_service.run_cycle(mode=mode, cycle_key=cycle_key)
+        else:
+            result = await evaluation_service.evaluate_all_campaigns(dry_run=dry_run, mode=mode)
         for item in result["results"]:
             if "campaign_id" in item:
                 item["campaign_id"] = str(item["campaign_id"])
@@ -307,6 +519,34 @@ async def evaluate_all_campaigns(
             detail=f"Ошибка при оценке всех кампаний: {str(e)}"
         )
 
+@router.post(
+    "/evaluate-batch",
+    response_model=EvaluateBatchResponse,
+    summary="Оценить выбранные кампании",
+    description="Вычислить target_status для списка кампаний и/или кампаний, подходящих под фильтр"
+)
+async def evaluate_campaigns_batch(
+    selection: EvaluateBatchRequest,
+    dry_run: bool = Query(False, description="Dry-run режим (не сохранять изменения)"),
+    evaluation_service: EvaluationService = Depends(get_evaluation_service_for_run)
+):
+    criteria = ()
+    if selection.filter is not None:
+        criteria = tuple(evaluation_service.campaign_service.filter_criteria(selection.filter))
+    try:
+        result = await evaluation_service.evaluate_batch(
+            campaign_ids=selection.campaign_ids,
+            criteria=criteria,
+            dry_run=dry_run
+        )
+        return EvaluateBatchResponse(**result)
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка при оценке кампаний: {str(e)}"
+        )
+
 @router.get(
     "/{campaign_id}/evaluation-history",
     response_model=EvaluationHistoryResponse,
@@ -315,39 +555,43 @@ async def evaluate_all_campaigns(
 )
 async def get_evaluation_history(
     campaign_id: UUID,
-    skip: int = Query(0, ge=0, description="Сколько записей пропустить"),
+    skip: int = Query(0, ge=0, description="Сколько записей пропустить (устарело, используйте after)"),
     limit: int = Query(100, ge=1, le=1000, description="Сколько записей вернуть"),
-    evaluation_service: EvaluationService = Depends(get_evaluation_service)
+    after: Optional[str] = Query(None, description="Курсор next_cursor из предыдущей страницы"),
+    count: CountMode = Query(CountMode.EXACT, description="Подсчет total: exact - COUNT(*), estimated - приблизительно, none - не считать"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    evaluation_service: EvaluationService = Depends(get_read_evaluation_service)
 ):
+    selected = requested_fields(fields, HISTORY_FIELDS)
+    after_key = None
+    if after is not None:
+        try:
+            after_key = decode_cursor(after, (datetime, UUID))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    # Существование кампании проверяется одной колонкой (или по кэшу), без чтения строки целиком
     campaign_service = CampaignService(evaluation_service.db)
-    campaign = await campaign_service.get_campaign(campaign_id)
-    if not campaign:
+    if await campaign_service.get_campaign_version(campaign_id) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Кампания с ID {campaign_id} не найдена"
         )
-    logs, total = await evaluation_service.get_evaluation_history(
+    logs, total, count_mode = await evaluation_service.get_evaluation_history(
         campaign_id=campaign_id,
         skip=skip,
-        limit=limit
+        limit=limit,
+        after=after_key,
+        count=count,
+        raw_context=True,
+        fields=selected
     )
-    entries = []
-    for log in logs:
-        entries.append(
-            EvaluationHistoryEntry(
-                id=str(log.id),
-                campaign_id=str(log.campaign_id),
-                triggered_rule=log.triggered_rule,
-                previous_target=log.previous_target,
-                new_target=log.new_target,
-                context=log.context,
-                created_at=log.created_at
-            )
-        )
     
-    return EvaluationHistoryResponse(
-        total=total,
-        skip=skip,
-        limit=limit,
-        entries=entries
-    )
\ No newline at end of file
+    next_cursor = encode_cursor(logs[-1].created_at, logs[-1].id) if len(logs) == limit else None
+    
+    # context горячих записей уходит в ответ текстом из базы, без json.loads и повторной сериализации
+    return JSONBytesResponse(history_page_json(
+        {"total": total, "count_mode": count_mode, "skip": skip, "limit": limit, "next_cursor": next_cursor},
+        logs,
+        selected or HISTORY_FIELDS
+    ))
\ No newline at end of file
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.config import get_db
+from app.api.dependencies import get_fleet_summary
+from app.api.responses import FleetSummaryResponse
+from app.services.fleet_summary import FleetSummary, reconcile
+
+
+router = APIRouter(prefix="/fleet", tags=["fleet"])
+
+
+@router.get(
+    "/summary",
+    response_model=FleetSummaryResponse,
+    summary="Сводка парка",
+    description="Количество кампаний по статусам, требующих синхронизации и заблокированных каждым правилом"
+)
+async def get_fleet_summary_endpoint(
+    summary: FleetSummary = Depends(get_fleet_summary),
+    db: AsyncSession = Depends(get_db)
+):
+    # Сессия нужна только для первой сверки и после пакетных записей; сверка идет по основной базе,
+    # реплика может вернуть количества старше уже примененных переходов
+    if summary.needs_reconcile:
+        await reconcile(db, summary)
+    return summary.snapshot()
@@ -0,0 +1,99 @@
+import asyncio
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from pydantic import TypeAdapter, ValidationError
+
+from app.api.dependencies import get_metrics_buffer
+from app.api.responses import MetricsIngestResponse
+from app.api.bulk_import import iter_lines
+from app.services.ingestion_service import (
+    MetricsBuffer,
+    BufferFullError,
+    METRICS_DURABILITY,
+    METRICS_FLUSH_INTERVAL_SECONDS
+)
+from models.schemas.metricsSchema import MetricUpdate
+
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+metric_adapter = TypeAdapter(MetricUpdate)
+
+
+@router.post(
+    "/ingest",
+    response_model=MetricsIngestResponse,
+    summary="Прием метрик",
+    description="Принять spend_today / stock_days_left пачкой (JSON-массив или NDJSON) через буфер записи"
+)
+async def ingest_metrics(
+    request: Request,
+    response: Response,
+    durability: Optional[str] = Query(None, pattern="^(buffered|flushed)$", description="buffered - ответ сразу, flushed - после записи в базу"),
+    buffer: MetricsBuffer = Depends(get_metrics_buffer)
+):
+    durability = durability or METRICS_DURABILITY
+    content_type = request.headers.get("content-type", "")
+    
+    if "ndjson" in content_type:
+        records = []
+        async for line in iter_lines(request.stream()):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError as e:
+                records.append(ValueError(f"Некорректный JSON: {e}"))
+    else:
+        try:
+            records = json.loads(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Некорректный JSON: {e}")
+        if not isinstance(records, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ожидался JSON-массив метрик")
+    
+    metrics, errors = [], []
+    for row, record in enumerate(records, start=1):
+        if isinstance(record, ValueError):
+            errors.append({"row": row, "error": str(record)})
+            continue
+        try:
+            metrics.append(metric_adapter.validate_python(record).model_dump(exclude_none=True))
+        except ValidationError as e:
+            errors.append({"row": row, "error": "; ".join(error["msg"] for error in e.errors())})
+    
+    try:
+        flushed = buffer.add(metrics)
+    except BufferFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, round(METRICS_FLUSH_INTERVAL_SECONDS)))}
+        )
+    
+    flushed_campaigns = None
+    if durability == "flushed" and metrics:
+        try:
+            if METRICS_FLUSH_INTERVAL_SECONDS <= 0:
+                # Периодического сброса нет, иначе ответ ждал бы его вечно
+                await asyncio.shield(buffer.flush())
+            # shield: обрыв одного клиента не должен отменять общее ожидание сброса
+            flushed_campaigns = await asyncio.shield(flushed)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Метрики не записаны, повторите запрос: {e}"
+            )
+    
+    if errors and not metrics:
+        response.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    
+    return MetricsIngestResponse(
+        accepted=len(metrics),
+        rejected=len(errors),
+        durability=durability,
+        pending_campaigns=len(buffer.pending),
+        flushed_campaigns=flushed_campaigns,
+        errors=errors
+    )
@@ -0,0 +1,166 @@
+from typing import List
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.exc import IntegrityError
+
+from app.api.dependencies import get_schedule_template_service
+from app.api.responses import (
+    MessageResponse,
+    ScheduleSlotResponse,
+    ScheduleTemplateResponse,
+    ScheduleTemplateAssignResponse
+)
+from app.services.schedule_template_service import ScheduleTemplateService, TemplateInUseError
+from models.ScheduleTemplate import ScheduleTemplate
+from models.schemas.scheduleTemplateSchema import (
+    ScheduleTemplateCreate,
+    ScheduleTemplateSlotsUpdate,
+    ScheduleTemplateAssign
+)
+
+
+router = APIRouter(prefix="/schedule-templates", tags=["schedule-templates"])
+
+
+async def build_template_response(
+    template: ScheduleTemplate,
+    template_service: ScheduleTemplateService
+) -> ScheduleTemplateResponse:
+    slots = await template_service.get_template_slots(template.id)
+    return ScheduleTemplateResponse(
+        id=template.id,
+        name=template.name,
+        version=template.version,
+        campaigns=await template_service.count_campaigns(template.id),
+        slots=[
+            ScheduleSlotResponse(
+                id=slot.id,
+                day_of_week=slot.day_of_week,
+                start_time=slot.start_time.isoformat(),
+                end_time=slot.end_time.isoformat()
+            )
+            for slot in slots
+        ]
+    )
+
+
+async def get_template_or_404(template_id: UUID, template_service: ScheduleTemplateService) -> ScheduleTemplate:
+    template = await template_service.get_template(template_id)
+    if not template:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Шаблон расписания с ID {template_id} не найден"
+        )
+    return template
+
+
+@router.post(
+    "",
+    response_model=ScheduleTemplateResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Создать шаблон расписания",
+    description="Именованное недельное расписание, общее для многих кампаний"
+)
+async def create_template(
+    template_data: ScheduleTemplateCreate,
+    template_service: ScheduleTemplateService = Depends(get_schedule_template_service)
+):
+    try:
+        template = await template_service.create_template(template_data)
+    except IntegrityError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Шаблон с именем '{template_data.name}' уже существует"
+        )
+    return await build_template_response(template, template_service)
+
+
+@router.get(
+    "",
+    response_model=List[ScheduleTemplateResponse],
+    summary="Список шаблонов расписания"
+)
+async def get_templates(
+    template_service: ScheduleTemplateService = Depends(get_schedule_template_service)
+):
+    return [
+        await build_template_response(template, template_service)
+        for template in await template_service.get_templates()
+    ]
+
+
+@router.get(
+    "/{template_id}",
+    response_model=ScheduleTemplateResponse,
+    summary="Получить шаблон расписания"
+)
+async def get_template(
+    template_id: UUID,
+    template_service: ScheduleTemplateService = Depends(get_schedule_template_service)
+):
+    template = await get_template_or_404(template_id, template_service)
+    return await build_template_response(template, template_service)
+
+
+@router.put(
+    "/{template_id}/slots",
+    response_model=ScheduleTemplateResponse,
+    summary="Заменить слоты шаблона",
+    description="Новые слоты сразу действуют для всех привязанных кампаний"
+)
+async def replace_template_slots(
+    template_id: UUID,
+    slots_data: ScheduleTemplateSlotsUpdate,
+    template_service: ScheduleTemplateService = Depends(get_schedule_template_service)
+):
+    template = await template_service.replace_slots(template_id, slots_data.slots)
+    if not template:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Шаблон расписания с ID {template_id} не найден"
+        )
+    return await build_template_response(template, template_service)
+
+
+@router.post(
+    "/{template_id}/campaigns",
+    response_model=ScheduleTemplateAssignResponse,
+    summary="Привязать шаблон к кампаниям",
+    description="Привязать шаблон к пачке кампаний одним запросом; собственные слоты кампаний удаляются"
+)
+async def assign_template(
+    template_id: UUID,
+    assignment: ScheduleTemplateAssign,
+    template_service: ScheduleTemplateService = Depends(get_schedule_template_service)
+):
+    await get_template_or_404(template_id, template_service)
+    campaign_ids = list(dict.fromkeys(assignment.campaign_ids))
+    attached = await template_service.assign_template(template_id, campaign_ids)
+    
+    return ScheduleTemplateAssignResponse(
+        template_id=template_id,
+        attached=len(attached),
+        not_found=[campaign_id for campaign_id in campaign_ids if campaign_id not in attached]
+    )
+
+
+@router.delete(
+    "/{template_id}",
+    response_model=MessageResponse,
+    summary="Удалить шаблон расписания"
+)
+async def delete_template(
+    template_id: UUID,
+    template_service: ScheduleTemplateService = Depends(get_schedule_template_service)
+):
+    try:
+        deleted = await template_service.delete_template(template_id)
+    except TemplateInUseError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    
+    if not deleted:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Шаблон расписания с ID {template_id} не найден"
+        )
+    return MessageResponse(message="Шаблон расписания удален")
@@ -0,0 +1,135 @@
+import json
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from typing_extensions import TypedDict
+from uuid import UUID
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from models.enums import Statuses, CountMode
+from models.schemas.campaignSchema import CampaignRead
+from app.api.pagination import encode_cursor
+
+
+class PageEnvelope(TypedDict):
+    total: Optional[int]
+    count_mode: CountMode
+    skip: int
+    limit: int
+    next_cursor: Optional[str]
+
+
+class CampaignListItem(TypedDict):
+    """Поля CampaignSimpleResponse; строки списка читаются ровно этими колонками"""
+    id: UUID
+    name: str
+    current_status: Statuses
+    target_status: Statuses
+    is_managed: bool
+    needs_sync: bool
+    schedule_enabled: bool
+    created_at: datetime
+
+
+class HistoryEntryHead(TypedDict):
+    """Поля EvaluationHistoryEntry без context: context вставляется в ответ как есть"""
+    id: UUID
+    campaign_id: UUID
+    triggered_rule: Optional[str]
+    previous_target: Statuses
+    new_target: Statuses
+    created_at: datetime
+
+
+# Схемы сериализации строятся один раз. TypedDict только сериализуется, без валидации:
+# значения уже типизированы базой
+envelope_adapter = TypeAdapter(PageEnvelope)
+campaign_list_adapter = TypeAdapter(List[CampaignListItem])
+history_head_adapter = TypeAdapter(HistoryEntryHead)
+
+CAMPAIGN_LIST_FIELDS = tuple(CampaignListItem.__annotations__)
+HISTORY_HEAD_FIELDS = tuple(HistoryEntryHead.__annotations__)
+HISTORY_FIELDS = HISTORY_HEAD_FIELDS + ("context",)
+CAMPAIGN_READ_FIELDS = tuple(CampaignRead.model_fields)
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Поля из ?fields=a,b,c в порядке allowed
+    
+    Returns:
+        None - параметра нет, ответ содержит все поля
+    
+    Raises:
+        ValueError: список пуст или в нем есть неизвестное поле
+    """
+    if fields is None:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    if not requested:
+        raise ValueError("Пустой список полей")
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(sorted(unknown))}; допустимые: {', '.join(allowed)}")
+    return tuple(field for field in allowed if field in requested)
+
+
+class JSONBytesResponse(Response):
+    """Тело уже собрано в JSON, повторной сериализации нет"""
+    media_type = "application/json"
+
+
+def _page(envelope: Dict[str, Any], field: str, items_json: bytes) -> bytes:
+    # '{...}' конверта + ',"<field>":[...]}'
+    return envelope_adapter.dump_json(envelope)[:-1] + b',"' + field.encode() + b'":' + items_json + b"}"
+
+
+def campaigns_page_json(
+    envelope: Dict[str, Any],
+    rows: Sequence[Any],
+    fields: Sequence[str] = CAMPAIGN_LIST_FIELDS
+) -> bytes:
+    """Страница списка кампаний из строк с колонками fields (строки могут нести лишние колонки)"""
+    items = [{field: getattr(row, field) for field in fields} for row in rows]
+    return _page(envelope, "campaigns", campaign_list_adapter.dump_json(items))
+
+
+def history_page_json(
+    envelope: Dict[str, Any],
+    entries: Sequence[Any],
+    fields: Sequence[str] = HISTORY_FIELDS
+) -> bytes:
+    """
+    Страница истории оценок из полей fields. context горячих записей приходит из базы текстом JSON
+    и вставляется без разбора; записи из архива несут уже разобранный dict.
+    """
+    head_fields = [field for field in fields if field != "context"]
+    with_context = "context" in fields
+    parts = []
+    for entry in entries:
+        head = history_head_adapter.dump_json({field: getattr(entry, field) for field in head_fields})
+        if with_context:
+            context = entry.context
+            raw_context = context.encode() if isinstance(context, str) else json.dumps(context, separators=(",", ":")).encode()
+            head = head[:-1] + (b',"context":' if head_fields else b'"context":') + raw_context + b"}"
+        parts.append(head)
+    return _page(envelope, "entries", b"[" + b",".join(parts) + b"]")
+
+
+def campaign_json(values: Dict[str, Any], fields: Sequence[str]) -> bytes:
+    """Кампания в формате CampaignRead, только поля fields; values уже типизированы базой или кэшем"""
+    return CampaignRead.model_construct(**values).model_dump_json(include=set(fields))
+
+
+@lru_cache(maxsize=4096)
+def status_change_event(change: Any) -> bytes:
+    """
+    Событие Server-Sent Events о смене target_status. id события - токен для продолжения
+    (тот же курсор, что в истории оценок). Строка одна на всех подписчиков, поэтому
+    событие сериализуется один раз, а не для каждого подписчика.
+    """
+    data = history_head_adapter.dump_json({field: getattr(change, field) for field in HISTORY_HEAD_FIELDS})
+    token = encode_cursor(change.created_at, change.id)
+    return b"id: " + token.encode() + b"\nevent: target_status\ndata: " + data + b"\n\n"
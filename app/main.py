@@ -2,7 +2,15 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.api.routers.campaigns import router as campaigns_router
-from database.config import engine
+from app.api.routers.metrics import router as metrics_router
+from app.api.routers.schedule_templates import router as schedule_templates_router
+from app.api.routers.fleet import router as fleet_router
+from database.config import engine, read_engine
+from app.services.campaign_cache import campaign_cache
+from app.services.cache_invalidation import invalidation_listener
+from app.services.fleet_summary import fleet_summary
+from app.services.status_changes import status_feed
+from app.tasks import start_background_tasks, stop_tasks, flush_buffers
 
 
 @asynccontextmanager
@@ -13,10 +21,16 @@ async def lifespan(app: FastAPI):
     except ImportError as e:
         print(f"Warning: Правила не импортированы: {e}")
     
+    background_tasks = start_background_tasks()
+    
     yield
     
     print("Остановка сервиса")
+    await stop_tasks(background_tasks)
+    await flush_buffers()
     await engine.dispose()
+    if read_engine is not None:
+        await read_engine.dispose()
 
 
 app = FastAPI(
@@ -36,6 +50,9 @@ app.add_middleware(
 )
 
 app.include_router(campaigns_router)
+app.include_router(metrics_router)
+app.include_router(schedule_templates_router)
+app.include_router(fleet_router)
 
 @app.get("/", tags=["root"])
 async def root():
@@ -46,13 +63,24 @@ async def root():
         "endpoints": {
             "campaigns_crud": "/campaigns",
             "campaign_schedule": "/campaigns/{id}/schedule",
+            "schedule_templates": "/schedule-templates",
             "evaluate_campaign": "/campaigns/{id}/evaluate",
             "evaluate_all": "/campaigns/evaluate-all",
-            "evaluation_history": "/campaigns/{id}/evaluation-history"
+            "evaluation_history": "/campaigns/{id}/evaluation-history",
+            "metrics_ingest": "/metrics/ingest",
+            "fleet_summary": "/fleet/summary",
+            "status_changes_stream": "/campaigns/changes/stream"
         }
     }
 
 
 @app.get("/health", tags=["health"])
 async def health_check():
-    return {"status": "healthy", "service": "campaign-rules-engine"}
+    return {
+        "status": "healthy",
+        "service": "campaign-rules-engine",
+        "campaign_cache": campaign_cache.stats(),
+        "cache_invalidation": invalidation_listener.stats(),
+        "fleet_summary": fleet_summary.stats(),
+        "status_changes": status_feed.stats()
+    }
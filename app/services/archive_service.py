@@ -0,0 +1,371 @@
+import asyncio
+import json
+import os
+import zlib
+from collections import Counter
+from typing import List, Optional, Dict, Any, Tuple, Iterator
+from uuid import UUID
+from datetime import datetime, date, timezone, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, func
+
+from models.RuleEvaluationLog import RuleEvaluationLog
+from models.enums import Statuses
+from .campaign_service import CampaignService
+
+
+# Каталог холодного архива истории оценок; пустое значение выключает архив
+EVALUATION_ARCHIVE_DIR = os.getenv("EVALUATION_ARCHIVE_DIR", "")
+# Строки старше стольких дней уезжают из rule_evaluation_logs в архив
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+# Сколько дней хранятся файлы архива
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "365"))
+# Размер пачки чтения из базы (серверный курсор)
+ARCHIVE_CHUNK_SIZE = int(os.getenv("ARCHIVE_CHUNK_SIZE", "5000"))
+# Строк в группе файла: группа - минимальная единица чтения
+ARCHIVE_ROW_GROUP_SIZE = int(os.getenv("ARCHIVE_ROW_GROUP_SIZE", "5000"))
+
+FORMAT_VERSION = 1
+DATA_SUFFIX = ".clog"
+INDEX_SUFFIX = ".idx.json"
+
+ARCHIVE_COLUMNS = (
+    RuleEvaluationLog.id,
+    RuleEvaluationLog.campaign_id,
+    RuleEvaluationLog.triggered_rule,
+    RuleEvaluationLog.previous_target,
+    RuleEvaluationLog.new_target,
+    RuleEvaluationLog.context,
+    RuleEvaluationLog.created_at,
+    RuleEvaluationLog.updated_at,
+)
+ARCHIVE_FIELDS = tuple(column.key for column in ARCHIVE_COLUMNS)
+
+# Индексы файлов читаются один раз и переиспользуются, пока файл не перезаписан
+_index_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
+def as_utc(moment: datetime) -> datetime:
+    """sqlite отдает created_at без зоны, в базе всегда UTC"""
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+
+def day_bounds(day: date) -> Tuple[datetime, datetime]:
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, UUID):
+        return value.hex
+    if isinstance(value, datetime):
+        # Фиксированная ширина: строки сравниваются в том же порядке, что и моменты времени
+        return as_utc(value).isoformat(timespec="microseconds")
+    if isinstance(value, Statuses):
+        return value.value
+    return value
+
+
+def _decode_row(row: Dict[str, Any]) -> RuleEvaluationLog:
+    """Строка архива в виде непривязанного к сессии RuleEvaluationLog"""
+    return RuleEvaluationLog(
+        id=UUID(row["id"]),
+        campaign_id=UUID(row["campaign_id"]),
+        triggered_rule=row["triggered_rule"],
+        previous_target=Statuses(row["previous_target"]),
+        new_target=Statuses(row["new_target"]),
+        context=row.get("context"),
+        created_at=datetime.fromisoformat(row["created_at"]),
+        updated_at=datetime.fromisoformat(row["updated_at"])
+    )
+
+
+class ArchiveWriter:
+    """
+    Файл дня - последовательность групп строк. В группе каждая колонка сжата zlib отдельно,
+    поэтому для фильтра по campaign_id распаковывается только эта колонка.
+    Рядом лежит индекс .idx.json со смещениями колонок и min/max campaign_id и created_at по группам.
+    Файлы пишутся во временные и переименовываются, индекс последним: без индекса день не виден.
+    """
+
+    def __init__(self, directory: str, day: date):
+        self.directory = directory
+        self.day = day
+        self.data_path = os.path.join(directory, f"{day.isoformat()}{DATA_SUFFIX}")
+        self.index_path = os.path.join(directory, f"{day.isoformat()}{INDEX_SUFFIX}")
+        self.row_groups: List[Dict[str, Any]] = []
+        self.rows = 0
+        self.offset = 0
+        os.makedirs(directory, exist_ok=True)
+        self.file = open(self.data_path + ".tmp", "wb")
+
+    def write_group(self, rows: List[Dict[str, Any]]) -> None:
+        """rows отсортированы по campaign_id, колонки записываются одна за другой"""
+        group = {
+            "rows": len(rows),
+            "campaign_id_min": min(row["campaign_id"] for row in rows),
+            "campaign_id_max": max(row["campaign_id"] for row in rows),
+            "created_at_min": min(row["created_at"] for row in rows),
+            "created_at_max": max(row["created_at"] for row in rows),
+            "columns": {}
+        }
+        for field in ARCHIVE_FIELDS:
+            blob = zlib.compress(
+                json.dumps([row[field] for row in rows], separators=(",", ":")).encode(), 6
+            )
+            self.file.write(blob)
+            group["columns"][field] = [self.offset, len(blob)]
+            self.offset += len(blob)
+        self.row_groups.append(group)
+        self.rows += len(rows)
+
+    def close(self) -> None:
+        self.file.close()
+        index = {
+            "version": FORMAT_VERSION,
+            "day": self.day.isoformat(),
+            "rows": self.rows,
+            "row_groups": self.row_groups
+        }
+        with open(self.index_path + ".tmp", "w") as index_file:
+            json.dump(index, index_file)
+        os.replace(self.data_path + ".tmp", self.data_path)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    def abort(self) -> None:
+        self.file.close()
+        os.remove(self.data_path + ".tmp")
+
+
+class ArchiveReader:
+    """Чтение истории кампании из архива с отсечением дней по имени файла и групп по min/max индекса"""
+
+    def __init__(self, directory: str = EVALUATION_ARCHIVE_DIR):
+        self.directory = directory
+
+    def days(self) -> List[date]:
+        """Дни с готовым индексом, от новых к старым"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        days = []
+        for name in os.listdir(self.directory):
+            if name.endswith(INDEX_SUFFIX):
+                try:
+                    days.append(date.fromisoformat(name[:-len(INDEX_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(days, reverse=True)
+
+    def load_index(self, day: date) -> Dict[str, Any]:
+        path = os.path.join(self.directory, f"{day.isoformat()}{INDEX_SUFFIX}")
+        mtime = os.path.getmtime(path)
+        cached = _index_cache.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path) as index_file:
+                cached = (mtime, json.load(index_file))
+            _index_cache[path] = cached
+        return cached[1]
+
+    def _read_column(self, data_file, group: Dict[str, Any], field: str) -> List[Any]:
+        offset, length = group["columns"][field]
+        data_file.seek(offset)
+        return json.loads(zlib.decompress(data_file.read(length)))
+
+    def _matching_rows(
+        self,
+        day: date,
+        campaign_hex: str,
+        fields: Tuple[str, ...],
+        created_before: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        index = self.load_index(day)
+        groups = [
+            group for group in index["row_groups"]
+            if group["campaign_id_min"] <= campaign_hex <= group["campaign_id_max"]
+            and (created_before is None or group["created_at_min"] <= created_before)
+        ]
+        if not groups:
+            return
+        with open(os.path.join(self.directory, f"{day.isoformat()}{DATA_SUFFIX}"), "rb") as data_file:
+            for group in groups:
+                positions = [
+                    position for position, value in enumerate(self._read_column(data_file, group, "campaign_id"))
+                    if value == campaign_hex
+                ]
+                if not positions:
+                    continue
+                columns = {
+                    field: self._read_column(data_file, group, field)
+                    for field in fields if field != "campaign_id"
+                }
+                for position in positions:
+                    row = {field: values[position] for field, values in columns.items()}
+                    row["campaign_id"] = campaign_hex
+                    yield row
+
+    def read_history(
+        self,
+        campaign_id: UUID,
+        before: Optional[Tuple[datetime, UUID]] = None,
+        since: Optional[datetime] = None,
+        limit: int = 100,
+        with_context: bool = True
+    ) -> List[RuleEvaluationLog]:
+        """
+        Записи кампании от новых к старым строго раньше ключа before = (created_at, id).
+        Читаются только дни не позже before и группы, в диапазон campaign_id которых попадает кампания.
+        with_context=False не распаковывает колонку context (у записей context=None).
+        """
+        fields = ARCHIVE_FIELDS if with_context else tuple(field for field in ARCHIVE_FIELDS if field != "context")
+        campaign_hex = campaign_id.hex
+        before_key = (_encode_value(before[0]), before[1].hex) if before else None
+        found: List[Dict[str, Any]] = []
+        for day in self.days():
+            if before is not None and day > as_utc(before[0]).date():
+                continue
+            if since is not None and day < as_utc(since).date():
+                break
+            rows = [
+                row for row in self._matching_rows(
+                    day, campaign_hex, fields, before_key[0] if before_key else None
+                )
+                if before_key is None or (row["created_at"], row["id"]) < before_key
+            ]
+            rows.sort(key=lambda row: (row["created_at"], row["id"]), reverse=True)
+            found.extend(rows)
+            if len(found) >= limit:
+                break
+        return [_decode_row(row) for row in found[:limit]]
+
+    def count(self, campaign_id: UUID, since: Optional[datetime] = None) -> int:
+        """Количество записей кампании: распаковывается только колонка campaign_id нужных групп"""
+        total = 0
+        for day in self.days():
+            if since is not None and day < as_utc(since).date():
+                break
+            total += sum(1 for _ in self._matching_rows(day, campaign_id.hex, ("campaign_id",)))
+        return total
+
+
+def archive_enabled() -> bool:
+    return bool(EVALUATION_ARCHIVE_DIR)
+
+
+def archive_since(now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.now(timezone.utc)) - timedelta(days=ARCHIVE_RETENTION_DAYS)
+
+
+async def read_archived_history(
+    campaign_id: UUID,
+    before: Optional[Tuple[datetime, UUID]] = None,
+    limit: int = 100,
+    with_context: bool = True
+) -> List[RuleEvaluationLog]:
+    if not archive_enabled():
+        return []
+    reader = ArchiveReader(EVALUATION_ARCHIVE_DIR)
+    return await asyncio.to_thread(reader.read_history, campaign_id, before, archive_since(), limit, with_context)
+
+
+async def count_archived_history(campaign_id: UUID) -> int:
+    if not archive_enabled():
+        return 0
+    reader = ArchiveReader(EVALUATION_ARCHIVE_DIR)
+    return await asyncio.to_thread(reader.count, campaign_id, archive_since())
+
+
+class ArchiveService:
+    """Перенос старых строк rule_evaluation_logs в архив по дням с последующим удалением из базы"""
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        directory: str = EVALUATION_ARCHIVE_DIR,
+        chunk_size: int = ARCHIVE_CHUNK_SIZE,
+        row_group_size: int = ARCHIVE_ROW_GROUP_SIZE
+    ):
+        self.db = db
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.row_group_size = row_group_size
+
+    async def archive_expired(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Архивирует все полные дни старше ARCHIVE_AFTER_DAYS, от старых к новым"""
+        now = now or datetime.now(timezone.utc)
+        cutoff_day = (now - timedelta(days=ARCHIVE_AFTER_DAYS)).date()
+        oldest = await self.db.scalar(select(func.min(RuleEvaluationLog.created_at)))
+
+        archived_days, archived = [], 0
+        day = as_utc(oldest).date() if oldest is not None else cutoff_day
+        while day < cutoff_day:
+            rows = await self.archive_day(day)
+            if rows:
+                archived_days.append(day.isoformat())
+                archived += rows
+            day += timedelta(days=1)
+
+        purged = await asyncio.to_thread(self.purge_expired_files, now)
+        return {"days": archived_days, "archived": archived, "purged": purged}
+
+    async def archive_day(self, day: date) -> int:
+        """
+        Потоково выгружает строки дня, отсортированные по campaign_id, и удаляет их одной транзакцией.
+        Повторный запуск после сбоя между записью файла и удалением перезаписывает файл дня теми же строками.
+        """
+        start, end = day_bounds(day)
+        stmt = (
+            select(*ARCHIVE_COLUMNS)
+            .where(RuleEvaluationLog.created_at >= start, RuleEvaluationLog.created_at < end)
+            .order_by(RuleEvaluationLog.campaign_id, RuleEvaluationLog.created_at, RuleEvaluationLog.id)
+            .execution_options(yield_per=self.chunk_size)
+        )
+
+        writer = None
+        group: List[Dict[str, Any]] = []
+        # Записей кампаний в выгрузке: на столько уменьшается счетчик истории
+        counts: Counter = Counter()
+        try:
+            result = await self.db.stream(stmt)
+            async for partition in result.partitions(self.chunk_size):
+                for row in partition:
+                    counts[row.campaign_id] += 1
+                    group.append({field: _encode_value(value) for field, value in zip(ARCHIVE_FIELDS, row)})
+                    if len(group) >= self.row_group_size:
+                        writer = writer or ArchiveWriter(self.directory, day)
+                        await asyncio.to_thread(writer.write_group, group)
+                        group = []
+            if group:
+                writer = writer or ArchiveWriter(self.directory, day)
+                await asyncio.to_thread(writer.write_group, group)
+        except Exception:
+            if writer is not None:
+                writer.abort()
+            raise
+
+        if writer is None:
+            return 0
+        await asyncio.to_thread(writer.close)
+
+        await self.db.execute(
+            delete(RuleEvaluationLog)
+            .where(RuleEvaluationLog.created_at >= start, RuleEvaluationLog.created_at < end)
+            .execution_options(synchronize_session=False)
+        )
+        await CampaignService(self.db).forget_evaluations(counts)
+        await self.db.commit()
+        return writer.rows
+
+    def purge_expired_files(self, now: datetime) -> int:
+        oldest_day = archive_since(now).date()
+        reader = ArchiveReader(self.directory)
+        purged = 0
+        for day in reader.days():
+            if day >= oldest_day:
+                continue
+            # Индекс удаляется первым, чтобы читатели не увидели день без данных
+            for suffix in (INDEX_SUFFIX, DATA_SUFFIX):
+                path = os.path.join(self.directory, f"{day.isoformat()}{suffix}")
+                if os.path.exists(path):
+                    os.remove(path)
+            purged += 1
+        return purged
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from uuid import UUID
+
+import asyncpg
+
+from database.config import engine
+from .campaign_cache import CampaignCache, campaign_cache, CACHE_INVALIDATION_CHANNEL, PROCESS_ID
+from .ingestion_service import ThresholdIndex, metrics_buffer
+
+
+# Как часто накопленные сообщения применяются к кэшу; в шторм записей сбросы схлопываются
+CACHE_INVALIDATION_BATCH_SECONDS = float(os.getenv("CACHE_INVALIDATION_BATCH_SECONDS", "0.05"))
+# Проверка живости соединения слушателя: обрыв TCP без закрытия сокета иначе не заметить
+CACHE_INVALIDATION_PING_SECONDS = float(os.getenv("CACHE_INVALIDATION_PING_SECONDS", "10"))
+# Верхняя граница паузы между попытками переподключения
+CACHE_INVALIDATION_RECONNECT_MAX_SECONDS = float(os.getenv("CACHE_INVALIDATION_RECONNECT_MAX_SECONDS", "30"))
+
+
+def listener_dsn() -> str:
+    """DSN основной базы для asyncpg (без +asyncpg в схеме)"""
+    return engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class CacheInvalidationListener:
+    """
+    Слушатель LISTEN на выделенном соединении asyncpg: сбрасывает в кэше процесса кампании,
+    измененные другими репликами (сообщения публикует campaign_cache при коммите). Те же
+    кампании забываются индексом порогов приема метрик: пороги могли смениться.
+    Пока соединения нет, кэш выключен: пропущенные сообщения не восстановить. После
+    (пере)подключения кэш и индекс порогов очищаются целиком, кэш включается снова.
+    """
+
+    def __init__(
+        self,
+        cache: CampaignCache = campaign_cache,
+        thresholds: ThresholdIndex = metrics_buffer.thresholds,
+        connect: Optional[Callable[[], Awaitable[Any]]] = None,
+        channel: str = CACHE_INVALIDATION_CHANNEL,
+        batch_seconds: float = CACHE_INVALIDATION_BATCH_SECONDS
+    ):
+        self.cache = cache
+        self.thresholds = thresholds
+        self.connect = connect or (lambda: asyncpg.connect(listener_dsn()))
+        self.channel = channel
+        self.batch_seconds = batch_seconds
+        # Кэш включается слушателем только если он был включен настройкой
+        self.cache_enabled = cache.enabled
+        self.pending: Set[UUID] = set()
+        self.connected = False
+        self.received = 0
+        self.invalidated = 0
+        self.reconnects = 0
+        self.resyncs = 0
+        # Задержка от коммита на другой реплике до получения сообщения, секунды
+        self.last_lag: Optional[float] = None
+        self.max_lag = 0.0
+
+    def on_notification(self, connection, pid: int, channel: str, payload: str) -> None:
+        """Колбэк asyncpg: сообщение только копится, к кэшу применяется пачкой"""
+        message = json.loads(payload)
+        if message.get("origin") == PROCESS_ID:
+            return
+        self.received += 1
+        self.pending.update(UUID(campaign_id) for campaign_id, _ in message.get("campaigns") or [])
+        lag = max(time.time() - float(message["sent_at"]), 0.0)
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+
+    def apply_pending(self) -> int:
+        if not self.pending:
+            return 0
+        batch, self.pending = self.pending, set()
+        self.cache.invalidate(batch)
+        for campaign_id in batch:
+            self.thresholds.discard(campaign_id)
+        self.invalidated += len(batch)
+        return len(batch)
+
+    def resync(self) -> None:
+        """Все, что могло измениться без слушателя, считается устаревшим"""
+        self.pending.clear()
+        self.cache.clear()
+        self.thresholds.clear()
+        self.cache.enabled = self.cache_enabled
+        self.resyncs += 1
+
+    def disconnect(self) -> None:
+        self.connected = False
+        self.cache.enabled = False
+        self.cache.clear()
+
+    async def run(self) -> None:
+        """Держит соединение до отмены, переподключаясь с экспоненциальной паузой"""
+        delay = 1.0
+        try:
+            while True:
+                try:
+                    connection = await self.connect()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.disconnect()
+                    print(f"Warning: слушатель инвалидации кэша не подключился, повтор через {delay:.0f} с: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, CACHE_INVALIDATION_RECONNECT_MAX_SECONDS)
+                    continue
+
+                delay = 1.0
+                try:
+                    await self.listen(connection)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Warning: соединение слушателя инвалидации кэша потеряно: {e}")
+                finally:
+                    self.disconnect()
+                    await self._close(connection)
+                self.reconnects += 1
+        finally:
+            self.cache.enabled = self.cache_enabled
+
+    async def listen(self, connection) -> None:
+        lost = asyncio.Event()
+        connection.add_termination_listener(lambda _: lost.set())
+        await connection.add_listener(self.channel, self.on_notification)
+        self.connected = True
+        self.resync()
+
+        next_ping = time.monotonic() + CACHE_INVALIDATION_PING_SECONDS
+        while not lost.is_set():
+            try:
+                await asyncio.wait_for(lost.wait(), timeout=self.batch_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self.apply_pending()
+            if time.monotonic() >= next_ping:
+                await asyncio.wait_for(connection.fetchval("SELECT 1"), timeout=CACHE_INVALIDATION_PING_SECONDS)
+                next_ping = time.monotonic() + CACHE_INVALIDATION_PING_SECONDS
+        raise ConnectionError("соединение закрыто сервером")
+
+    async def _close(self, connection) -> None:
+        try:
+            await asyncio.wait_for(connection.close(), timeout=CACHE_INVALIDATION_PING_SECONDS)
+        except Exception:
+            connection.terminate()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "received": self.received,
+            "invalidated": self.invalidated,
+            "pending": len(self.pending),
+            "reconnects": self.reconnects,
+            "resyncs": self.resyncs,
+            "last_lag_seconds": self.last_lag,
+            "max_lag_seconds": self.max_lag
+        }
+
+
+# Слушатель процесса, запускается фоновой задачей при работе на Postgres
+invalidation_listener = CacheInvalidationListener()
@@ -0,0 +1,223 @@
+import os
+import sys
+import time as clock
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID, uuid4
+from sqlalchemy import event, select, func, cast, any_, literal, Text, Select
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PostgresUUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models.Campaign import Campaign
+
+
+# 0 - кэш выключен, все чтения идут в базу
+CAMPAIGN_CACHE_ENABLED = os.getenv("CAMPAIGN_CACHE_ENABLED", "1") != "0"
+# Бюджет памяти кэша; при превышении вытесняются давно не читанные кампании
+CAMPAIGN_CACHE_MAX_BYTES = int(os.getenv("CAMPAIGN_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Страховка от пропущенной инвалидации (например, запись другим процессом)
+CAMPAIGN_CACHE_TTL_SECONDS = float(os.getenv("CAMPAIGN_CACHE_TTL_SECONDS", "30"))
+# Сколько последних инвалидаций помнить, чтобы не положить в кэш прочитанное до них
+CAMPAIGN_CACHE_TOMBSTONES = int(os.getenv("CAMPAIGN_CACHE_TOMBSTONES", "100000"))
+
+# Канал NOTIFY, через который реплики сообщают друг другу об измененных кампаниях; пусто - не рассылать
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "campaign_cache_invalidation")
+
+# Ключ session.info: кампании, измененные в еще не завершенной транзакции сессии
+SESSION_CHANGED_KEY = "campaign_cache_changed"
+# Кампаний в одном сообщении NOTIFY: payload ограничен 8000 байт
+NOTIFY_BATCH_SIZE = 100
+# Метка процесса в сообщениях, чтобы не сбрасывать собственные записи второй раз
+PROCESS_ID = uuid4().hex
+
+
+def estimate_size(value: Any) -> int:
+    """Приблизительный размер значения в байтах вместе с вложенными контейнерами и объектами"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    elif hasattr(value, "__dict__"):
+        size += estimate_size(vars(value))
+    return size
+
+
+class CampaignCache:
+    """
+    Read-through кэш состояния кампаний (CampaignService.get_campaign_state) в памяти процесса.
+    LRU по id кампании с бюджетом по байтам и TTL. Записи CampaignService и ScheduleTemplateService
+    инвалидируют затронутые кампании сразу и повторно после commit/rollback транзакции,
+    другие реплики узнают о них через NOTIFY при коммите.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = CAMPAIGN_CACHE_MAX_BYTES,
+        ttl_seconds: float = CAMPAIGN_CACHE_TTL_SECONDS,
+        enabled: bool = CAMPAIGN_CACHE_ENABLED,
+        max_tombstones: int = CAMPAIGN_CACHE_TOMBSTONES
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.max_tombstones = max_tombstones
+        # {id: (момент истечения, размер, значение)} в порядке от давно читанных к недавним
+        self.entries: OrderedDict[UUID, Tuple[float, int, Any]] = OrderedDict()
+        self.bytes = 0
+        # Номер последней инвалидации кампании; забытые номера не больше tombstone_floor
+        self.generation = 0
+        self.tombstones: OrderedDict[UUID, int] = OrderedDict()
+        self.tombstone_floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, campaign_id: UUID) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        entry = self.entries.get(campaign_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] <= clock.monotonic():
+            self._remove(campaign_id)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(campaign_id)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, campaign_id: UUID, value: Any, read_generation: int) -> bool:
+        """
+        Положить значение, прочитанное из базы.
+
+        Args:
+            read_generation: self.generation до чтения; если кампанию инвалидировали
+                             после него, значение могло устареть и не кладется
+
+        Returns:
+            True, если значение попало в кэш
+        """
+        if not self.enabled or read_generation < max(self.tombstone_floor, self.tombstones.get(campaign_id, 0)):
+            return False
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return False
+
+        self._remove(campaign_id)
+        self.entries[campaign_id] = (clock.monotonic() + self.ttl_seconds, size, value)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+        return True
+
+    def invalidate(self, campaign_ids: Iterable[UUID]) -> None:
+        for campaign_id in campaign_ids:
+            self.generation += 1
+            self.tombstones[campaign_id] = self.generation
+            self.tombstones.move_to_end(campaign_id)
+            if self._remove(campaign_id):
+                self.invalidations += 1
+        while len(self.tombstones) > self.max_tombstones:
+            _, generation = self.tombstones.popitem(last=False)
+            self.tombstone_floor = max(self.tombstone_floor, generation)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.bytes = 0
+        # Все прочитанное до очистки считается устаревшим
+        self.generation += 1
+        self.tombstones.clear()
+        self.tombstone_floor = self.generation
+
+    def _remove(self, campaign_id: UUID) -> bool:
+        entry = self.entries.pop(campaign_id, None)
+        if entry is None:
+            return False
+        self.bytes -= entry[1]
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+
+# Кэш процесса, общий для всех сессий
+campaign_cache = CampaignCache()
+
+
+def changed_in_session(session: AsyncSession, campaign_id: UUID) -> bool:
+    """Кампания изменена в незавершенной транзакции сессии: прочитанное ею не должно попасть в кэш"""
+    return campaign_id in session.info.get(SESSION_CHANGED_KEY, ())
+
+
+def invalidate_campaigns(session: AsyncSession, campaign_ids: Iterable[UUID]) -> None:
+    """
+    Сбросить кэш кампаний, которые сессия только что изменила. Сброс повторяется после
+    завершения транзакции: до коммита другие сессии еще читают старые строки и могли положить их в кэш.
+    """
+    campaign_ids = set(campaign_ids)
+    if not campaign_ids:
+        return
+    campaign_cache.invalidate(campaign_ids)
+    session.info.setdefault(SESSION_CHANGED_KEY, set()).update(campaign_ids)
+
+
+def notify_statement(campaign_ids: List[UUID]) -> Select:
+    """
+    Один запрос, который публикует измененные кампании пачками по NOTIFY_BATCH_SIZE:
+    pg_notify с {origin, sent_at, campaigns: [[id, version], ...]} на каждую пачку.
+    NOTIFY транзакционный, поэтому сообщения уходят только при коммите.
+    """
+    ids = literal(campaign_ids, ARRAY(PostgresUUID(as_uuid=True)))
+    changed = (
+        select(
+            Campaign.id,
+            Campaign.version,
+            ((func.row_number().over(order_by=Campaign.id) - 1) // NOTIFY_BATCH_SIZE).label("batch")
+        )
+        .where(Campaign.id == any_(ids))
+        .subquery()
+    )
+    payload = func.json_build_object(
+        "origin", PROCESS_ID,
+        "sent_at", func.extract("epoch", func.clock_timestamp()),
+        "campaigns", func.json_agg(func.json_build_array(changed.c.id, changed.c.version))
+    )
+    return select(func.pg_notify(CACHE_INVALIDATION_CHANNEL, cast(payload, Text))).group_by(changed.c.batch)
+
+
+@event.listens_for(Session, "before_commit")
+def _publish_changes(session: Session) -> None:
+    """Изменения сессии рассылаются другим репликам (см. CacheInvalidationListener) в той же транзакции"""
+    changed = session.info.get(SESSION_CHANGED_KEY)
+    if changed and CACHE_INVALIDATION_CHANNEL and session.get_bind().dialect.name == "postgresql":
+        session.execute(notify_statement(list(changed)))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _invalidate_after_transaction(session: Session, transaction) -> None:
+    # Savepoint-ы пропускаются: изменения видны другим сессиям только после внешней транзакции
+    if transaction.parent is not None:
+        return
+    changed = session.info.pop(SESSION_CHANGED_KEY, None)
+    if changed:
+        campaign_cache.invalidate(changed)
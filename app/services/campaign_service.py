@@ -1,13 +1,97 @@
-from typing import List, Optional, Tuple, Dict, Any
-from uuid import UUID
+import os
+import json
+import time as clock
+from typing import List, Optional, Tuple, Dict, Any, AsyncIterator, Set, Hashable, Sequence
+from uuid import UUID, uuid4
+from datetime import datetime, time, timedelta, timezone
+from decimal import Decimal
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, func
+from sqlalchemy import (
+    select, insert, update, delete, func, or_, and_, union, bindparam, case, cast, column, literal, text,
+    Boolean, Integer, Text, Select, Update
+)
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert, ARRAY, UUID as PostgresUUID
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from pydantic import TypeAdapter
 
+from database.config import READ_REPLICA_KEY
 from models.Campaign import Campaign
 from models.CampaignSchedule import CampaignSchedule
+from models.ScheduleTemplate import ScheduleTemplate
+from models.ScheduleTemplateSlot import ScheduleTemplateSlot
 from models.schemas.campaignSchema import CampaignCreate, CampaignUpdate
 from models.schemas.campaignScheduleSchema import CampaignScheduleCreate
-from models.enums import Statuses
+from models.schemas.evaluationBatchSchema import CampaignFilter
+from models.enums import Statuses, CountMode
+from rules_engine.schedule import CompiledSchedule
+from .campaign_cache import campaign_cache, invalidate_campaigns, changed_in_session
+from .fleet_summary import fleet_key, record_transition, mark_stale
+
+
+# Колонки, которые нужны движку правил. Читаются через Core в виде кортежей,
+# без создания ORM-объектов и без регистрации в identity map.
+EVALUATION_COLUMNS = (
+    Campaign.id,
+    Campaign.name,
+    Campaign.current_status,
+    Campaign.target_status,
+    Campaign.blocked_by,
+    Campaign.is_managed,
+    Campaign.budget_limit,
+    Campaign.spend_today,
+    Campaign.stock_days_left,
+    Campaign.stock_days_min,
+    Campaign.schedule_enabled,
+    Campaign.schedule_template_id,
+    Campaign.inputs_version,
+    Campaign.version,
+)
+EVALUATION_FIELDS = tuple(column.key for column in EVALUATION_COLUMNS)
+
+# Колонки состояния кампании в кэше: вход движка правил и все поля CampaignRead
+STATE_COLUMNS = EVALUATION_COLUMNS + (Campaign.timezone, Campaign.created_at, Campaign.updated_at)
+STATE_FIELDS = tuple(column.key for column in STATE_COLUMNS)
+
+SCHEDULE_COLUMNS = (
+    CampaignSchedule.campaign_id,
+    CampaignSchedule.day_of_week,
+    CampaignSchedule.start_time,
+    CampaignSchedule.end_time,
+)
+
+EVALUATION_CHUNK_SIZE = 1000
+
+# Слоты расписания проверяются одним вызовом на весь запрос
+schedule_slots_adapter = TypeAdapter(List[CampaignScheduleCreate])
+
+# Строк в одном многострочном INSERT пакетного импорта
+BULK_CHUNK_SIZE = 1000
+
+# Поля, которые можно обновлять пакетным путем приема метрик
+METRIC_FIELDS = ("spend_today", "stock_days_left")
+
+# Значения для UPDATE, меняющего входные данные правил
+INPUTS_CHANGED = {
+    "inputs_version": Campaign.inputs_version + 1,
+    "version": Campaign.version + 1,
+}
+
+DIRTY_CLAUSE = or_(
+    Campaign.evaluated_version.is_(None),
+    Campaign.evaluated_version < Campaign.inputs_version
+)
+
+# Сколько секунд живут точные количества, отдаваемые как estimated без статистики Postgres
+COUNT_CACHE_TTL_SECONDS = float(os.getenv("COUNT_CACHE_TTL_SECONDS", "30"))
+
+# Общий для процесса кэш количеств: {ключ фильтров: (момент истечения, количество)}
+count_cache: Dict[Hashable, Tuple[float, int]] = {}
+
+
+class VersionMismatchError(Exception):
+    """Кампания изменилась после того, как клиент ее прочитал (условная запись по If-Match)"""
 
 
 class CampaignService:
@@ -21,6 +105,7 @@ class CampaignService:
         self.db.add(campaign)
         await self.db.flush()
         await self.db.refresh(campaign)
+        record_transition(self.db, None, fleet_key(campaign.current_status, campaign.target_status, campaign.blocked_by))
         return campaign
     
     async def get_campaign(self, campaign_id: UUID) -> Optional[Campaign]:
@@ -28,80 +113,274 @@ class CampaignService:
         result = await self.db.execute(stmt)
         return result.scalar_one_or_none()
     
-    async def get_campaign_with_schedules(self, campaign_id: UUID) -> Optional[Tuple[Campaign, List[CampaignSchedule]]]:
-        stmt = select(Campaign).where(Campaign.id == campaign_id)
-        result = await self.db.execute(stmt)
-        campaign = result.scalar_one_or_none()
+    async def get_campaign_version(self, campaign_id: UUID) -> Optional[int]:
+        """
+        Текущая version кампании для проверки ETag: из кэша кампаний, при промахе - одна
+        колонка по первичному ключу, без чтения строки и слотов целиком
+        """
+        state = campaign_cache.get(campaign_id)
+        if state is not None:
+            return state["campaign"]["version"]
+        return await self.db.scalar(select(Campaign.version).where(Campaign.id == campaign_id))
+    
+    async def get_campaign_fields(self, campaign_id: UUID, fields: Sequence[str]) -> Optional[Dict[str, Any]]:
+        """
+        Только поля fields кампании и ее version (для ETag): из кэша кампаний, при промахе -
+        выбранные колонки по первичному ключу, без слотов расписания и без заполнения кэша
+        """
+        fields = tuple(dict.fromkeys((*fields, "version")))
+        state = campaign_cache.get(campaign_id)
+        if state is not None:
+            return {field: state["campaign"][field] for field in fields}
+        result = await self.db.execute(
+            select(*(getattr(Campaign, field) for field in fields)).where(Campaign.id == campaign_id)
+        )
+        row = result.one_or_none()
+        return dict(row._mapping) if row is not None else None
+    
+    async def get_campaign_state(self, campaign_id: UUID, use_cache: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Кампания со слотами расписания для оценки и чтения, через кэш процесса (campaign_cache).
+        Промах читается одним запросом: колонки STATE_COLUMNS и слоты через LEFT JOIN, по строке
+        на слот. Слоты берутся у шаблона, если он привязан, иначе собственные
+        (привязка шаблона удаляет собственные слоты).
         
-        if not campaign:
+        Args:
+            use_cache: False - прочитать из базы в обход кэша (повтор после конфликта версий)
+        
+        Returns:
+            {campaign: поля STATE_FIELDS, slots: [...], template_version: версия шаблона или None,
+             schedule: скомпилированные собственные слоты или None для шаблона} или None, если кампании нет.
+            Значение общее для всех читателей и не должно изменяться
+        """
+        if use_cache:
+            state = campaign_cache.get(campaign_id)
+            if state is not None:
+                return state
+        read_generation = campaign_cache.generation
+        
+        slot_columns = [
+            func.coalesce(getattr(ScheduleTemplateSlot, name), getattr(CampaignSchedule, name)).label(f"slot_{name}")
+            for name in ("id", "day_of_week", "start_time", "end_time")
+        ]
+        stmt = (
+            select(*STATE_COLUMNS, ScheduleTemplate.version.label("template_version"), *slot_columns)
+            .outerjoin(ScheduleTemplate, ScheduleTemplate.id == Campaign.schedule_template_id)
+            .outerjoin(ScheduleTemplateSlot, ScheduleTemplateSlot.template_id == Campaign.schedule_template_id)
+            .outerjoin(
+                CampaignSchedule,
+                and_(CampaignSchedule.campaign_id == Campaign.id, Campaign.schedule_template_id.is_(None))
+            )
+            .where(Campaign.id == campaign_id)
+        )
+        rows = (await self.db.execute(stmt)).all()
+        if not rows:
             return None
         
-        schedules = await self.get_campaign_schedules(campaign_id)
-        return campaign, schedules
+        campaign = dict(zip(STATE_FIELDS, rows[0]))
+        campaign["spend_today"] = campaign["spend_today"] or Decimal("0.00")
+        template_id = campaign["schedule_template_id"]
+        owner = ("template_id", template_id) if template_id else ("campaign_id", campaign_id)
+        slots = [
+            {
+                "id": row.slot_id,
+                owner[0]: owner[1],
+                "day_of_week": row.slot_day_of_week,
+                "start_time": row.slot_start_time,
+                "end_time": row.slot_end_time
+            }
+            for row in rows if row.slot_id is not None
+        ]
+        state = {
+            "campaign": campaign,
+            "slots": slots,
+            "template_version": rows[0].template_version,
+            "schedule": None if template_id else CompiledSchedule(slots)
+        }
+        
+        # Незакоммиченные изменения своей сессии не должны стать видны другим через кэш,
+        # а реплика может отдать строку, которая старше уже сброшенной записи
+        if not changed_in_session(self.db, campaign_id) and not self.db.info.get(READ_REPLICA_KEY):
+            campaign_cache.put(campaign_id, state, read_generation)
+        return state
     
     async def get_campaigns(
         self,
         skip: int = 0,
         limit: int = 100,
         is_managed: Optional[bool] = None,
-        needs_sync: Optional[bool] = None
-    ) -> Tuple[List[Campaign], int]:
+        needs_sync: Optional[bool] = None,
+        after: Optional[UUID] = None,
+        count: CountMode = CountMode.EXACT,
+        columns: Optional[Sequence[Any]] = None
+    ) -> Tuple[List[Any], Optional[int], CountMode]:
         """
         Получить список кампаний с пагинацией
         
         Args:
-            skip: сколько пропустить
+            skip: сколько пропустить (устаревший OFFSET, для совместимости)
             limit: сколько вернуть
             is_managed: фильтр по is_managed
             needs_sync: фильтр по current_status != target_status
+            after: id последней кампании предыдущей страницы (keyset-пагинация)
+            count: как считать общее количество (exact, estimated, none)
+            columns: читать только эти колонки через Core, без ORM-объектов
             
         Returns:
-            (список кампаний, общее количество)
+            (список кампаний или строк columns, общее количество или None, фактический режим подсчета)
         """
-        query = select(Campaign)
+        query = self.campaigns_query(is_managed=is_managed, needs_sync=needs_sync, columns=columns)
         
-        if is_managed is not None:
-            query = query.where(Campaign.is_managed == is_managed)
+        total, count_mode = await self.count_rows(
+            query, count, cache_key=(Campaign.__tablename__, is_managed, needs_sync)
+        )
         
-        if needs_sync is not None:
-            if needs_sync:
-                query = query.where(Campaign.current_status != Campaign.target_status)
-            else:
-                query = query.where(Campaign.current_status == Campaign.target_status)
+        if after is not None:
+            query = query.where(Campaign.id > after)
+        query = query.offset(skip).limit(limit)
+        result = await self.db.execute(query)
+        campaigns = result.all() if columns else result.scalars().all()
+        
+        return campaigns, total, count_mode
+    
+    async def count_rows(
+        self,
+        query: Select,
+        count: CountMode,
+        cache_key: Optional[Hashable] = None
+    ) -> Tuple[Optional[int], CountMode]:
+        """
+        Общее количество строк запроса в выбранном режиме
+        
+        estimated на Postgres - оценка планировщика для того же запроса, без выполнения.
+        На других базах - точное количество из кэша процесса по ключу фильтров, живущее
+        COUNT_CACHE_TTL_SECONDS. Без ключа кэша estimated считается точно.
         
-        count_query = select(func.count()).select_from(query.subquery())
+        Returns:
+            (количество или None, фактический режим подсчета)
+        """
+        if count == CountMode.NONE:
+            return None, CountMode.NONE
+        
+        if count == CountMode.ESTIMATED:
+            if self.db.bind.dialect.name == "postgresql":
+                return await self.planner_estimate(query), CountMode.ESTIMATED
+            
+            if cache_key is not None:
+                cached = count_cache.get(cache_key)
+                if cached is not None and cached[0] > clock.monotonic():
+                    return cached[1], CountMode.ESTIMATED
+                total = await self.exact_count(query)
+                count_cache[cache_key] = (clock.monotonic() + COUNT_CACHE_TTL_SECONDS, total)
+                return total, CountMode.ESTIMATED
+        
+        return await self.exact_count(query), CountMode.EXACT
+    
+    async def exact_count(self, query: Select) -> int:
+        count_query = select(func.count()).select_from(query.order_by(None).subquery())
         count_result = await self.db.execute(count_query)
-        total = count_result.scalar_one()
+        return count_result.scalar_one()
+    
+    async def planner_estimate(self, query: Select) -> int:
+        """Оценка числа строк из EXPLAIN (FORMAT JSON): статистика pg_statistic, без чтения таблицы"""
+        sql = query.order_by(None).compile(dialect=self.db.bind.dialect, compile_kwargs={"literal_binds": True})
+        result = await self.db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+        plan = result.scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    
+    def campaigns_query(
+        self,
+        is_managed: Optional[bool] = None,
+        needs_sync: Optional[bool] = None,
+        columns: Optional[Sequence[Any]] = None
+    ) -> Select:
+        """Фильтры списка кампаний по порядку id; is_managed и needs_sync попадают в частичные индексы"""
+        query = select(*columns) if columns else select(Campaign)
+        query = query.order_by(Campaign.id)
         
-        query = query.offset(skip).limit(limit)
-        result = await self.db.execute(query)
-        campaigns = result.scalars().all()
+        if is_managed is not None:
+            query = query.where(Campaign.is_managed if is_managed else ~Campaign.is_managed)
+        
+        if needs_sync is not None:
+            query = query.where(Campaign.needs_sync if needs_sync else ~Campaign.needs_sync)
         
-        return campaigns, total
+        return query
+    
+    def filter_criteria(self, campaign_filter: CampaignFilter) -> List[Any]:
+        """Условия WHERE по заданным полям фильтра; boolean-поля записаны так же, как в частичных индексах"""
+        criteria = []
+        if campaign_filter.is_managed is not None:
+            criteria.append(Campaign.is_managed if campaign_filter.is_managed else ~Campaign.is_managed)
+        if campaign_filter.needs_sync is not None:
+            criteria.append(Campaign.needs_sync if campaign_filter.needs_sync else ~Campaign.needs_sync)
+        if campaign_filter.schedule_enabled is not None:
+            criteria.append(Campaign.schedule_enabled == campaign_filter.schedule_enabled)
+        if campaign_filter.has_budget is not None:
+            criteria.append(
+                Campaign.budget_limit.is_not(None) if campaign_filter.has_budget else Campaign.budget_limit.is_(None)
+            )
+        if campaign_filter.dirty is not None:
+            criteria.append(DIRTY_CLAUSE if campaign_filter.dirty else ~DIRTY_CLAUSE)
+        for field in ("schedule_template_id", "current_status", "target_status", "blocked_by", "timezone"):
+            value = getattr(campaign_filter, field)
+            if value is not None:
+                criteria.append(getattr(Campaign, field) == value)
+        return criteria
     
     async def update_campaign(
         self,
         campaign_id: UUID,
-        update_data: CampaignUpdate
+        update_data: CampaignUpdate,
+        expected_versions: Optional[List[int]] = None
     ) -> Optional[Campaign]:
+        """
+        Args:
+            expected_versions: запись только если version кампании - одна из них (If-Match)
+        
+        Raises:
+            VersionMismatchError: кампания изменилась после чтения клиентом
+        """
         campaign = await self.get_campaign(campaign_id)
         if not campaign:
             return None
+        if expected_versions is not None and campaign.version not in expected_versions:
+            raise VersionMismatchError(f"Кампания {campaign_id} изменилась, текущая версия {campaign.version}")
         
         update_dict = update_data.model_dump(exclude_unset=True)
         
         if not update_dict:
             return campaign
         
+        # Статус, заданный вручную, не приписывается правилу
+        if "target_status" in update_dict:
+            update_dict["blocked_by"] = None
+        before = fleet_key(campaign.current_status, campaign.target_status, campaign.blocked_by)
+        
         stmt = (
             update(Campaign)
             .where(Campaign.id == campaign_id)
-            .values(**update_dict)
+            .values(**update_dict, **INPUTS_CHANGED)
             .returning(Campaign)
         )
+        if expected_versions is not None:
+            # Версия перепроверяется в самом UPDATE: между чтением и записью кампанию могли изменить
+            stmt = stmt.where(Campaign.version.in_(expected_versions))
         
         result = await self.db.execute(stmt)
-        updated_campaign = result.scalar_one()
+        updated_campaign = result.scalar_one_or_none()
+        if updated_campaign is None:
+            if expected_versions is not None:
+                raise VersionMismatchError(f"Кампания {campaign_id} изменилась во время записи")
+            # Кампанию удалили между чтением и записью
+            return None
+        invalidate_campaigns(self.db, [campaign_id])
+        record_transition(
+            self.db,
+            before,
+            fleet_key(updated_campaign.current_status, updated_campaign.target_status, updated_campaign.blocked_by)
+        )
         
         await self.db.flush()
         return updated_campaign
@@ -110,38 +389,88 @@ class CampaignService:
     async def set_campaign_schedule(
         self,
         campaign_id: UUID,
-        schedule_slots: List[Dict[str, Any]]  # [{day_of_week: 0, start_time: ..., end_time: ...}, ...]
+        schedule_slots: List[Dict[str, Any]],  # [{day_of_week: 0, start_time: ..., end_time: ...}, ...]
+        expected_versions: Optional[List[int]] = None
     ) -> List[CampaignSchedule]:
-        await self.delete_campaign_schedule(campaign_id)
+        """
+        Замена расписания по разнице с текущими слотами: совпадающие слоты остаются,
+        лишние удаляются одним DELETE, новые вставляются одним многострочным INSERT.
+        Строка кампании обновляется, только если расписание изменилось; одинаковое
+        расписание не пишет ничего.
         
-        created_slots = []
-        for slot_data in schedule_slots:
-            slot_data_with_campaign = {**slot_data, 'campaign_id': campaign_id}
-            
-            schedule_create = CampaignScheduleCreate(**slot_data_with_campaign)
-            
-            schedule_slot = CampaignSchedule(**schedule_create.model_dump())
+        Returns:
+            слоты расписания в порядке schedule_slots
             
-            self.db.add(schedule_slot)
-            created_slots.append(schedule_slot)
-
-        if schedule_slots:
-            stmt = (
-                update(Campaign)
-                .where(Campaign.id == campaign_id)
-                .values(schedule_enabled=True)
+        Args:
+            expected_versions: запись только если version кампании - одна из них (If-Match);
+                               строка кампании блокируется до конца транзакции
+        
+        Raises:
+            ValidationError: некорректный слот
+            ValueError: кампания не найдена
+            VersionMismatchError: кампания изменилась после чтения клиентом
+        """
+        validated = schedule_slots_adapter.validate_python(
+            [{**slot, "campaign_id": campaign_id} for slot in schedule_slots]
+        )
+        
+        # Флаги кампании и текущие слоты одним запросом
+        stmt = (
+            select(Campaign.schedule_enabled, Campaign.schedule_template_id, Campaign.version, CampaignSchedule)
+            .outerjoin(CampaignSchedule, CampaignSchedule.campaign_id == Campaign.id)
+            .where(Campaign.id == campaign_id)
+        )
+        if expected_versions is not None:
+            stmt = stmt.with_for_update(of=Campaign)
+        rows = (await self.db.execute(stmt)).all()
+        if not rows:
+            raise ValueError(f"Кампания с ID {campaign_id} не найдена")
+        if expected_versions is not None and rows[0].version not in expected_versions:
+            raise VersionMismatchError(f"Кампания {campaign_id} изменилась, текущая версия {rows[0].version}")
+        
+        schedule_enabled, template_id = rows[0].schedule_enabled, rows[0].schedule_template_id
+        existing: Dict[Tuple[int, time, time], List[CampaignSchedule]] = {}
+        for row in rows:
+            if row.CampaignSchedule is not None:
+                slot = row.CampaignSchedule
+                existing.setdefault((slot.day_of_week, slot.start_time, slot.end_time), []).append(slot)
+        
+        slots: List[Optional[CampaignSchedule]] = []
+        to_insert = []
+        for slot in validated:
+            kept = existing.get((slot.day_of_week, slot.start_time, slot.end_time))
+            if kept:
+                slots.append(kept.pop())
+            else:
+                slots.append(None)
+                to_insert.append(slot.model_dump())
+        to_delete = [slot.id for kept in existing.values() for slot in kept]
+        
+        if to_delete:
+            await self.db.execute(
+                delete(CampaignSchedule).where(CampaignSchedule.id.in_(to_delete))
             )
-        else:
-            stmt = (
+        
+        if to_insert:
+            # executemany с RETURNING пачками insertmanyvalues: порядок строк совпадает с to_insert
+            # только при sort_by_parameter_order
+            result = await self.db.execute(
+                insert(CampaignSchedule).returning(CampaignSchedule, sort_by_parameter_order=True), to_insert
+            )
+            inserted = iter(result.scalars().all())
+            slots = [slot if slot is not None else next(inserted) for slot in slots]
+        
+        if to_delete or to_insert or schedule_enabled != bool(validated) or template_id is not None:
+            # inputs_version растет вместе со слотами, иначе инкрементальный прогон не увидит новое расписание.
+            # Собственное расписание заменяет шаблон
+            await self.db.execute(
                 update(Campaign)
                 .where(Campaign.id == campaign_id)
-                .values(schedule_enabled=False)
+                .values(schedule_enabled=bool(validated), schedule_template_id=None, **INPUTS_CHANGED)
             )
+            invalidate_campaigns(self.db, [campaign_id])
         
-        await self.db.execute(stmt)
-        await self.db.flush()
-        
-        return created_slots
+        return slots
     
     async def get_campaign_schedules(self, campaign_id: UUID) -> List[CampaignSchedule]:
         stmt = select(CampaignSchedule).where(CampaignSchedule.campaign_id == campaign_id)
@@ -155,9 +484,10 @@ class CampaignService:
         update_stmt = (
             update(Campaign)
             .where(Campaign.id == campaign_id)
-            .values(schedule_enabled=False)
+            .values(schedule_enabled=False, schedule_template_id=None, **INPUTS_CHANGED)
         )
         await self.db.execute(update_stmt)
+        invalidate_campaigns(self.db, [campaign_id])
         await self.db.flush()
         
         return result.rowcount > 0
@@ -171,17 +501,389 @@ class CampaignService:
         stmt = (
             update(Campaign)
             .where(Campaign.id == campaign_id)
-            .values(target_status=new_target_status)
+            .values(target_status=new_target_status, blocked_by=None, version=Campaign.version + 1)
             .returning(Campaign)
         )
         
         result = await self.db.execute(stmt)
+        invalidate_campaigns(self.db, [campaign_id])
+        mark_stale(self.db)
         await self.db.flush()
         
         return result.scalar_one_or_none()
     
+    async def ingest_metrics(self, metrics: List[Dict[str, Any]]) -> int:
+        """
+        Пакетное обновление spend_today / stock_days_left
+        
+        Args:
+            metrics: [{campaign_id: ..., spend_today: ..., stock_days_left: ...}, ...],
+                     поля метрик в записи необязательны
+            
+        Returns:
+            количество обновленных кампаний
+        """
+        # executemany компилируется по ключам первой записи, поэтому группирую по набору полей
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for metric in metrics:
+            fields = tuple(field for field in METRIC_FIELDS if field in metric)
+            if not fields:
+                continue
+            params = {"b_campaign_id": metric["campaign_id"]}
+            params.update({field: metric[field] for field in fields})
+            groups.setdefault(fields, []).append(params)
+        
+        campaigns = Campaign.__table__
+        updated = 0
+        for params in groups.values():
+            stmt = (
+                campaigns.update()
+                .where(campaigns.c.id == bindparam("b_campaign_id"))
+                .values(**INPUTS_CHANGED)
+            )
+            result = await self.db.execute(stmt, params)
+            updated += result.rowcount
+            invalidate_campaigns(self.db, [param["b_campaign_id"] for param in params])
+        
+        await self.db.flush()
+        return updated
+    
+    async def forget_evaluations(self, counts: Dict[UUID, int]) -> None:
+        """
+        Уменьшить evaluation_count на число записей лога, ушедших из rule_evaluation_logs
+        (срок хранения, перенос в архив). Счетчик не уходит ниже нуля: записи, вставленные
+        в лог в обход оценки, в нем не учтены.
+        
+        Args:
+            counts: {campaign_id: сколько записей удалено}
+        """
+        if not counts:
+            return
+        campaigns = Campaign.__table__
+        remaining = campaigns.c.evaluation_count - bindparam("b_rows")
+        stmt = (
+            campaigns.update()
+            .where(campaigns.c.id == bindparam("b_campaign_id"))
+            .values(evaluation_count=case((remaining > 0, remaining), else_=0))
+        )
+        await self.db.execute(
+            stmt, [{"b_campaign_id": campaign_id, "b_rows": rows} for campaign_id, rows in counts.items()]
+        )
+    
+    async def bulk_upsert(
+        self,
+        campaigns: List[Tuple[int, Dict[str, Any]]],
+        update_existing: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Пакетная вставка кампаний многострочным INSERT ... ON CONFLICT (name)
+        
+        Args:
+            campaigns: [(номер строки, поля CampaignCreate), ...], уже провалидированные
+            update_existing: True - обновить кампанию с тем же name, False - пропустить ее
+            
+        Returns:
+            {created, updated, skipped, errors: [{row, name, error}]}.
+            Ошибка базы в пачке не прерывает импорт: пачка повторяется построчно в savepoint,
+            чтобы найти и отчитать только сломанные строки.
+        """
+        report = {"created": 0, "updated": 0, "skipped": 0, "errors": []}
+        
+        # Многострочный VALUES компилируется по ключам первой строки, поэтому группирую по набору полей
+        groups: Dict[Tuple[str, ...], List[Tuple[int, Dict[str, Any]]]] = {}
+        for row_no, data in campaigns:
+            groups.setdefault(tuple(sorted(data)), []).append((row_no, data))
+        
+        for fields, rows in groups.items():
+            for start in range(0, len(rows), BULK_CHUNK_SIZE):
+                chunk = rows[start:start + BULK_CHUNK_SIZE]
+                try:
+                    async with self.db.begin_nested():
+                        await self._upsert_chunk(fields, chunk, update_existing, report)
+                except DBAPIError:
+                    for row_no, data in chunk:
+                        try:
+                            async with self.db.begin_nested():
+                                await self._upsert_chunk(fields, [(row_no, data)], update_existing, report)
+                        except DBAPIError as e:
+                            report["errors"].append({
+                                "row": row_no,
+                                "name": data.get("name"),
+                                "error": str(e.orig).splitlines()[0]
+                            })
+        
+        return report
+    
+    async def _upsert_chunk(
+        self,
+        fields: Tuple[str, ...],
+        chunk: List[Tuple[int, Dict[str, Any]]],
+        update_existing: bool,
+        report: Dict[str, Any]
+    ) -> None:
+        campaigns = Campaign.__table__
+        dialect_insert = postgresql_insert if self.db.bind.dialect.name == "postgresql" else sqlite_insert
+        now = datetime.now(timezone.utc)
+        stmt = dialect_insert(campaigns).values([
+            {"id": uuid4(), "created_at": now, "updated_at": now, **data}
+            for _, data in chunk
+        ])
+        
+        if update_existing:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[campaigns.c.name],
+                set_={
+                    **{field: stmt.excluded[field] for field in fields if field != "name"},
+                    "updated_at": stmt.excluded.updated_at,
+                    **INPUTS_CHANGED
+                }
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[campaigns.c.name])
+        
+        # Новая кампания возвращается с version = 1, обновленная - с увеличенной версией
+        result = await self.db.execute(stmt.returning(campaigns.c.id, campaigns.c.name, campaigns.c.version))
+        rows = result.all()
+        written = {name: version for _, name, version in rows}
+        invalidate_campaigns(self.db, [campaign_id for campaign_id, _, version in rows if version > 1])
+        if rows:
+            # Прежние статусы обновленных кампаний неизвестны, сводку парка сверит база
+            mark_stale(self.db)
+        
+        for row_no, data in chunk:
+            version = written.get(data["name"])
+            if version is None:
+                report["skipped"] += 1
+                report["errors"].append({
+                    "row": row_no,
+                    "name": data["name"],
+                    "error": "Кампания с таким именем уже существует"
+                })
+            elif version == 1:
+                report["created"] += 1
+            else:
+                report["updated"] += 1
+    
+    async def mark_evaluated(self, evaluations: List[Dict[str, Any]]) -> Set[UUID]:
+        """
+        Условная запись результатов оценки, без блокировок строк. На Postgres - один запрос
+        на пачку (mark_evaluated_statement), на остальных базах - одна и та же скомпилированная
+        строка по каждой оценке: UPDATE ... RETURNING в executemany драйверы не поддерживают.
+        
+        Args:
+            evaluations: [{id: ..., version: ..., evaluated_version: ..., target_status: ..., blocked_by: ...}, ...],
+                         version - версия, с которой выполнялась оценка,
+                         target_status и blocked_by передаются только при изменении
+            
+        Returns:
+            id кампаний, для которых запись прошла. Остальные изменились после чтения
+            и должны быть оценены заново
+        """
+        if not evaluations:
+            return set()
+        
+        if self.db.bind.dialect.name == "postgresql":
+            result = await self.db.execute(self.mark_evaluated_statement(evaluations))
+            applied = set(result.scalars().all())
+        else:
+            stmt = (
+                update(Campaign)
+                .where(Campaign.id == bindparam("b_id"), Campaign.version == bindparam("b_version"))
+                .values(**self._evaluated_values(
+                    evaluated_version=bindparam("b_evaluated_version", type_=Integer()),
+                    target_status=bindparam("b_target_status", type_=Campaign.target_status.type),
+                    status_changed=bindparam("b_status_changed", type_=Boolean()),
+                    blocked_by=bindparam("b_blocked_by", type_=Campaign.blocked_by.type),
+                    blocked_changed=bindparam("b_blocked_changed", type_=Boolean())
+                ))
+                .returning(Campaign.id)
+                .execution_options(synchronize_session=False)
+            )
+            applied = set()
+            for e in evaluations:
+                result = await self.db.execute(stmt, {
+                    "b_id": e["id"],
+                    "b_version": e["version"],
+                    "b_evaluated_version": e["evaluated_version"],
+                    "b_target_status": e.get("target_status"),
+                    "b_status_changed": "target_status" in e,
+                    "b_blocked_by": e.get("blocked_by"),
+                    "b_blocked_changed": "blocked_by" in e
+                })
+                applied.update(result.scalars().all())
+        invalidate_campaigns(self.db, applied)
+        return applied
+    
+    def mark_evaluated_statement(self, evaluations: List[Dict[str, Any]]) -> Update:
+        """
+        UPDATE ... FROM unnest(массивы полей) ... RETURNING id для Postgres. Текст запроса не зависит
+        от размера пачки, поэтому план переиспользуется; оценки сопоставляются с кампаниями
+        соединением по (id, version). Встраивается в CTE (см. EvaluationService._write_evaluation).
+        """
+        evaluated = func.unnest(
+            bindparam("b_ids", [e["id"] for e in evaluations], type_=ARRAY(PostgresUUID(as_uuid=True))),
+            bindparam("b_versions", [e["version"] for e in evaluations], type_=ARRAY(Integer())),
+            bindparam("b_evaluated_versions", [e["evaluated_version"] for e in evaluations], type_=ARRAY(Integer())),
+            # Метки status_enum - имена Statuses, как их пишет колонка Enum
+            bindparam(
+                "b_target_statuses",
+                [e["target_status"].name if "target_status" in e else None for e in evaluations],
+                type_=ARRAY(Text())
+            ),
+            bindparam("b_status_changed", ["target_status" in e for e in evaluations], type_=ARRAY(Boolean())),
+            bindparam("b_blocked_by", [e.get("blocked_by") for e in evaluations], type_=ARRAY(Text())),
+            bindparam("b_blocked_changed", ["blocked_by" in e for e in evaluations], type_=ARRAY(Boolean()))
+        ).table_valued(
+            column("id", PostgresUUID(as_uuid=True)),
+            column("version", Integer()),
+            column("evaluated_version", Integer()),
+            column("target_status", Text()),
+            column("status_changed", Boolean()),
+            column("blocked_by", Text()),
+            column("blocked_changed", Boolean()),
+            name="evaluated"
+        ).render_derived(name="evaluated")
+        return (
+            update(Campaign)
+            .where(Campaign.id == evaluated.c.id, Campaign.version == evaluated.c.version)
+            .values(**self._evaluated_values(
+                evaluated_version=evaluated.c.evaluated_version,
+                target_status=cast(evaluated.c.target_status, Campaign.target_status.type),
+                status_changed=evaluated.c.status_changed,
+                blocked_by=evaluated.c.blocked_by,
+                blocked_changed=evaluated.c.blocked_changed
+            ))
+            .returning(Campaign.id)
+            .execution_options(synchronize_session=False)
+        )
+    
+    def _evaluated_values(self, evaluated_version, target_status, status_changed, blocked_by, blocked_changed) -> Dict[str, Any]:
+        """SET записи результата оценки; target_status и blocked_by меняются только с флагом *_changed"""
+        changed = or_(status_changed, blocked_changed)
+        return {
+            "evaluated_version": evaluated_version,
+            # Каждая успешная запись сопровождается ровно одной строкой в rule_evaluation_logs
+            "evaluation_count": Campaign.evaluation_count + 1,
+            "target_status": case((status_changed, target_status), else_=Campaign.target_status),
+            "blocked_by": case((blocked_changed, blocked_by), else_=Campaign.blocked_by),
+            # version и updated_at меняются только вместе с полями ответа API (target_status, blocked_by):
+            # по version строится ETag, служебные поля оценки его не сбрасывают
+            "version": Campaign.version + case((changed, 1), else_=0),
+            "updated_at": case(
+                (changed, literal(datetime.now(timezone.utc), Campaign.updated_at.type)),
+                else_=Campaign.updated_at
+            ),
+        }
+    
+    def schedule_flips_query(self, since: datetime, until: datetime) -> Select:
+        """
+        Кампании, у которых между since и until началось или закончилось окно расписания
+        
+        Returns:
+            select(campaign_id) по индексам (day_of_week, start_time) / (day_of_week, end_time)
+        """
+        stmt = select(CampaignSchedule.campaign_id)
+        if until - since >= timedelta(days=7):
+            return stmt
+        return stmt.where(self._flip_condition(CampaignSchedule, since, until))
+    
+    def template_flips_query(self, since: datetime, until: datetime) -> Select:
+        """То же для кампаний на шаблонах: окна ищутся по слотам шаблонов, а не по копиям у кампаний"""
+        stmt = select(Campaign.id).where(Campaign.schedule_template_id.is_not(None))
+        if until - since >= timedelta(days=7):
+            return stmt
+        flipped_templates = select(ScheduleTemplateSlot.template_id).where(
+            self._flip_condition(ScheduleTemplateSlot, since, until)
+        )
+        return stmt.where(Campaign.schedule_template_id.in_(flipped_templates))
+    
+    def _flip_condition(self, slots, since: datetime, until: datetime):
+        """Граница слота (start_time или end_time) попала в интервал (since, until] своего дня недели"""
+        windows = []
+        day_start = since
+        while day_start < until:
+            next_midnight = datetime.combine(day_start.date() + timedelta(days=1), time.min)
+            day_end = min(until, next_midnight)
+            windows.append((
+                day_start.weekday(),
+                day_start.time(),
+                day_end.time() if day_end < next_midnight else time.max
+            ))
+            day_start = day_end
+        
+        conditions = [
+            and_(
+                slots.day_of_week == day_of_week,
+                or_(
+                    and_(slots.start_time > window_start, slots.start_time <= window_end),
+                    and_(slots.end_time >= window_start, slots.end_time < window_end)
+                )
+            )
+            for day_of_week, window_start, window_end in windows
+        ]
+        return or_(*conditions)
+    
+    def incremental_criteria(self, since: datetime, until: datetime):
+        """Условие инкрементального прогона: грязные кампании и кампании с переключившимся окном расписания"""
+        changed_ids = union(
+            select(Campaign.id).where(DIRTY_CLAUSE),
+            self.schedule_flips_query(since, until),
+            self.template_flips_query(since, until)
+        )
+        return Campaign.id.in_(changed_ids)
+    
+    def needing_sync_query(self) -> Select:
+        return select(Campaign).where(Campaign.needs_sync)
+    
     async def get_campaigns_needing_sync(self) -> List[Campaign]:
-        stmt = select(Campaign).where(Campaign.current_status != Campaign.target_status)
+        stmt = self.needing_sync_query()
         result = await self.db.execute(stmt)
         return result.scalars().all()
-    
\ No newline at end of file
+    
+    async def stream_evaluation_inputs(
+        self,
+        *criteria,
+        chunk_size: int = EVALUATION_CHUNK_SIZE
+    ) -> AsyncIterator[List[Row]]:
+        """
+        Потоковое чтение входных данных для движка правил (Core, без ORM)
+        
+        Args:
+            criteria: дополнительные условия WHERE
+            chunk_size: размер пачки строк (yield_per / серверный курсор)
+            
+        Returns:
+            асинхронный итератор пачек строк с колонками EVALUATION_COLUMNS
+        """
+        stmt = (
+            select(*EVALUATION_COLUMNS)
+            .where(*criteria)
+            .order_by(Campaign.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        result = await self.db.stream(stmt)
+        async for partition in result.partitions(chunk_size):
+            yield partition
+    
+    async def get_evaluation_inputs(self, *criteria, limit: Optional[int] = None) -> List[Row]:
+        """То же, что stream_evaluation_inputs, но одним запросом, без серверного курсора"""
+        stmt = select(*EVALUATION_COLUMNS).where(*criteria).order_by(Campaign.id).limit(limit)
+        result = await self.db.execute(stmt)
+        return result.all()
+    
+    async def get_schedules_for_campaigns(self, campaign_ids: List[UUID]) -> Dict[UUID, List[Dict[str, Any]]]:
+        """Слоты расписаний для пачки кампаний одним запросом: {campaign_id: [слоты]}"""
+        schedules: Dict[UUID, List[Dict[str, Any]]] = {}
+        if not campaign_ids:
+            return schedules
+        
+        stmt = select(*SCHEDULE_COLUMNS).where(CampaignSchedule.campaign_id.in_(campaign_ids))
+        result = await self.db.execute(stmt)
+        for campaign_id, day_of_week, start_time, end_time in result:
+            schedules.setdefault(campaign_id, []).append({
+                "campaign_id": campaign_id,
+                "day_of_week": day_of_week,
+                "start_time": start_time,
+                "end_time": end_time
+            })
+        return schedules
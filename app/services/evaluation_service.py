@@ -1,24 +1,61 @@
-from typing import List, Optional, Dict, Any, Tuple
-from uuid import UUID
-from datetime import datetime, time
+from typing import List, Optional, Dict, Any, Tuple, Sequence
+from uuid import UUID, uuid4
+from datetime import datetime, time, timezone
 from decimal import Decimal
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, insert, literal, tuple_, cast, Text, Select, Insert
+from sqlalchemy.engine import Row
 from enum import Enum
 
 from models.Campaign import Campaign
-from models.CampaignSchedule import CampaignSchedule
 from models.RuleEvaluationLog import RuleEvaluationLog
-from models.enums import Statuses
+from models.EvaluationSweep import EvaluationSweep
+from models.enums import Statuses, SweepMode, CountMode
 from models.schemas.ruleEvaluationLogSchema import RuleEvaluationLogCreate
 from rules_engine.engine import rule_engine
-from .campaign_service import CampaignService
+from rules_engine.schedule import CompiledSchedule
+from .campaign_service import CampaignService, EVALUATION_FIELDS, EVALUATION_CHUNK_SIZE
+from .log_partition_service import retention_cutoff
+from .archive_service import read_archived_history, count_archived_history
+from .schedule_template_service import ScheduleTemplateService, compiled_template
+from .campaign_cache import invalidate_campaigns
+from .fleet_summary import fleet_key, record_transition
+from .status_changes import mark_status_changed
+
+
+# Колонки истории оценок для ответа API без context (см. get_evaluation_history(raw_context=True))
+HISTORY_COLUMNS = (
+    RuleEvaluationLog.id,
+    RuleEvaluationLog.campaign_id,
+    RuleEvaluationLog.triggered_rule,
+    RuleEvaluationLog.previous_target,
+    RuleEvaluationLog.new_target,
+    RuleEvaluationLog.created_at,
+)
+HISTORY_FIELDS = tuple(column.key for column in HISTORY_COLUMNS) + ("context",)
+
+
+def history_columns(fields: Sequence[str] = HISTORY_FIELDS) -> List[Any]:
+    """Колонки Core-чтения истории: id и created_at читаются всегда (на них держится курсор), context - текстом JSON"""
+    selected = {"id", "created_at", *fields}
+    columns = [column for column in HISTORY_COLUMNS if column.key in selected]
+    if "context" in selected:
+        columns.append(cast(RuleEvaluationLog.context, Text).label("context"))
+    return columns
+
+# Сколько раз перечитывать и переоценивать кампанию при конфликте версий
+OCC_MAX_RETRIES = 3
+
+
+class EvaluationConflictError(Exception):
+    """Кампания постоянно менялась между чтением и записью результата оценки"""
 
 
 class EvaluationService:
     def __init__(self, db: AsyncSession):
         self.db = db
         self.campaign_service = CampaignService(db)
+        self.template_service = ScheduleTemplateService(db)
     
     async def evaluate_single_campaign(
         self,
@@ -26,173 +63,474 @@ class EvaluationService:
         current_time: datetime = None,
         dry_run: bool = False
     ) -> Dict[str, Any]:
+        """
+        Оценка одной кампании за два обращения к базе: входные данные со слотами читаются
+        одним запросом (или берутся из кэша кампаний), условная запись статуса и строка лога
+        на Postgres пишутся одним запросом с CTE. Если кампания изменилась после чтения,
+        оценка повторяется по данным из базы в обход кэша.
+        """
+        evaluated_at = datetime.now() if current_time is None else current_time
         
-        campaign_data = await self.campaign_service.get_campaign_with_schedules(campaign_id)
-        if not campaign_data:
-            raise ValueError(f"Кампания с ID {campaign_id} не найдена")
-        
-        campaign, schedules = campaign_data
-        
-        campaign_dict = self._campaign_to_dict(campaign)
-        schedule_dicts = self._schedules_to_dicts(schedules)
-        
-        target_status, triggered_rule, rule_details = await rule_engine.evaluate_campaign(
-            campaign_data=campaign_dict,
-            schedules=schedule_dicts,
-            current_time=datetime.now() if current_time is None else current_time
-        )
-        
-        log_entry = None
-        if not dry_run:
-            log_entry = await self._log_evaluation(
-                campaign=campaign,
-                triggered_rule=triggered_rule,
-                new_target_status=target_status,
-                rule_details=rule_details,
-                campaign_snapshot=campaign_dict,
-                schedule_snapshot=schedule_dicts,
-                current_time=current_time
+        for attempt in range(OCC_MAX_RETRIES + 1):
+            state = await self.campaign_service.get_campaign_state(campaign_id, use_cache=attempt == 0)
+            if not state:
+                raise ValueError(f"Кампания с ID {campaign_id} не найдена")
+            
+            campaign_dict = state["campaign"]
+            if campaign_dict["schedule_template_id"] is not None:
+                schedule_dicts = compiled_template(
+                    campaign_dict["schedule_template_id"], state["template_version"], state["slots"]
+                )
+            else:
+                schedule_dicts = state["schedule"]
+            
+            target_status, triggered_rule, rule_details = await rule_engine.evaluate_campaign(
+                campaign_data=campaign_dict,
+                schedules=schedule_dicts,
+                current_time=evaluated_at
             )
             
-            if target_status != campaign.target_status:
-                await self.campaign_service.update_campaign_target_status(
-                    campaign_id=campaign_id,
-                    new_target_status=target_status
+            if dry_run:
+                log_entry_id = None
+                break
+            
+            evaluation = self._evaluation(campaign_dict, target_status, triggered_rule)
+            
+            log_values = RuleEvaluationLogCreate(
+                campaign_id=campaign_id,
+                triggered_rule=triggered_rule,
+                previous_target=campaign_dict["target_status"],
+                new_target=target_status,
+                context=self._build_log_context(
+                    campaign_snapshot=campaign_dict,
+                    schedule_snapshot=schedule_dicts,
+                    rule_details=rule_details,
+                    current_time=current_time
                 )
+            ).model_dump()
+            # Кампания изменилась после чтения: оцениваю заново по свежим данным
+            log_entry_id = await self._write_evaluation(evaluation, log_values)
+            if log_entry_id is not None:
+                self._record_transition(campaign_dict, evaluation)
+                break
+        else:
+            raise EvaluationConflictError(
+                f"Кампания {campaign_id} менялась во время каждой из {OCC_MAX_RETRIES + 1} попыток оценки"
+            )
         
-        result = {
+        return {
             "campaign_id": campaign_id,
-            "campaign_name": campaign.name,
-            "current_status": campaign.current_status,
-            "previous_target_status": campaign.target_status,
+            "campaign_name": campaign_dict["name"],
+            "current_status": campaign_dict["current_status"],
+            "previous_target_status": campaign_dict["target_status"],
             "new_target_status": target_status,
             "triggered_rule": triggered_rule,
             "rule_details": rule_details,
-            "needs_sync": target_status != campaign.current_status,
+            "needs_sync": target_status != campaign_dict["current_status"],
             "dry_run": dry_run,
-            "log_entry_id": log_entry.id if log_entry else None,
-            "evaluated_at": datetime.now() if current_time is None else current_time
+            "log_entry_id": log_entry_id,
+            "evaluated_at": evaluated_at,
+            "conflict_retries": attempt
         }
+    
+    async def _write_evaluation(self, evaluation: Dict[str, Any], log_values: Dict[str, Any]) -> Optional[UUID]:
+        """
+        Условная запись результата (mark_evaluated) и строка лога.
+        На Postgres - один запрос (write_evaluation_statement), на остальных базах - два.
+        
+        Returns:
+            id записи лога или None, если кампания изменилась после чтения
+        """
+        now = datetime.now(timezone.utc)
+        log_values = {"id": uuid4(), **log_values, "created_at": now, "updated_at": now}
+        
+        if self.db.bind.dialect.name != "postgresql":
+            return await self._write_evaluation_separately(evaluation, log_values)
         
-        return result
+        result = await self.db.execute(self.write_evaluation_statement(evaluation, log_values))
+        log_entry_id = result.scalar_one_or_none()
+        if log_entry_id is not None:
+            invalidate_campaigns(self.db, [evaluation["id"]])
+        return log_entry_id
+    
+    async def _write_evaluation_separately(self, evaluation: Dict[str, Any], log_values: Dict[str, Any]) -> Optional[UUID]:
+        """Запись статуса и строки лога двумя запросами"""
+        if evaluation["id"] not in await self.campaign_service.mark_evaluated([evaluation]):
+            return None
+        await self.db.execute(insert(RuleEvaluationLog).values(**log_values))
+        return log_values["id"]
+    
+    def write_evaluation_statement(self, evaluation: Dict[str, Any], log_values: Dict[str, Any]) -> Insert:
+        """
+        INSERT лога, выбирающий из CTE с UPDATE ... RETURNING (только Postgres):
+        строка лога появляется только если запись статуса прошла
+        """
+        updated = self.campaign_service.mark_evaluated_statement([evaluation]).cte("updated")
+        columns = RuleEvaluationLog.__table__.c
+        return (
+            insert(RuleEvaluationLog)
+            .from_select(
+                list(log_values),
+                select(*(literal(value, columns[name].type) for name, value in log_values.items())).select_from(updated)
+            )
+            .returning(RuleEvaluationLog.id)
+        )
     
     async def evaluate_all_campaigns(
         self,
         current_time: datetime = None,
-        dry_run: bool = False
+        dry_run: bool = False,
+        mode: SweepMode = SweepMode.FULL
     ) -> Dict[str, Any]:
+        """
+        Оценка управляемых кампаний.
+        В режиме INCREMENTAL оцениваются только кампании с изменившимися входными
+        данными и кампании, у которых с прошлого прогона переключилось окно расписания.
+        Если прошлых прогонов не было, выполняется полный прогон.
+        """
 
         current_time = datetime.now() if current_time is None else current_time
-        campaigns, total = await self.campaign_service.get_campaigns(is_managed=True)
+        
+        criteria = [Campaign.is_managed]
+        if mode == SweepMode.INCREMENTAL:
+            last_sweep_at = await self.get_last_sweep_time()
+            if last_sweep_at is None:
+                mode = SweepMode.FULL
+            else:
+                criteria.append(self.campaign_service.incremental_criteria(last_sweep_at, current_time))
         
         results = []
+        total = 0
         evaluated_count = 0
         sync_needed_count = 0
         
-        for campaign in campaigns:
-            try:
-                result = await self.evaluate_single_campaign(
-                    campaign_id=campaign.id,
-                    current_time=current_time,
-                    dry_run=dry_run
-                )
-                
+        async for rows in self.campaign_service.stream_evaluation_inputs(*criteria):
+            total += len(rows)
+            chunk_results = await self.evaluate_rows(rows, current_time=current_time, dry_run=dry_run, criteria=criteria)
+            
+            for result in chunk_results:
                 results.append(result)
-                evaluated_count += 1
-                
-                if result["needs_sync"]:
-                    sync_needed_count += 1
-                    
-            except Exception as e:
-                results.append({
-                    "campaign_id": campaign.id,
-                    "campaign_name": campaign.name,
-                    "error": str(e),
-                    "success": False
-                })
+                if result.get("success", True):
+                    evaluated_count += 1
+                    if result["needs_sync"]:
+                        sync_needed_count += 1
+        
+        if not dry_run:
+            self.db.add(EvaluationSweep(mode=mode, swept_at=current_time, evaluated=evaluated_count))
+            await self.db.flush()
         
         return {
             "evaluated": evaluated_count,
             "total_managed": total,
             "needs_sync": sync_needed_count,
             "dry_run": dry_run,
+            "mode": mode,
             "evaluated_at": current_time,
             "results": results
         }
     
+    async def evaluate_batch(
+        self,
+        campaign_ids: Optional[List[UUID]] = None,
+        criteria: Tuple[Any, ...] = (),
+        current_time: datetime = None,
+        dry_run: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Оценка выбранных кампаний тем же конвейером, что и evaluate_all_campaigns: входные данные
+        читаются пачками, расписания и запись результатов - одним запросом на пачку.
+        Прогон не записывается в evaluation_sweeps и не сдвигает границу инкрементального прогона.
+        
+        Args:
+            campaign_ids: явный список кампаний, читается пачками по EVALUATION_CHUNK_SIZE id
+            criteria: условия WHERE (CampaignService.filter_criteria); вместе с campaign_ids сужают список
+            
+        Returns:
+            {evaluated, matched, needs_sync, not_matched: id из campaign_ids, которых нет
+             или которые не подошли под criteria, dry_run, evaluated_at, results}
+        """
+        current_time = datetime.now() if current_time is None else current_time
+        report = {"evaluated": 0, "matched": 0, "needs_sync": 0, "results": []}
+        
+        async def evaluate(rows: List[Row]) -> None:
+            report["matched"] += len(rows)
+            for result in await self.evaluate_rows(rows, current_time=current_time, dry_run=dry_run, criteria=criteria):
+                report["results"].append(result)
+                if result.get("success", True):
+                    report["evaluated"] += 1
+                    if result["needs_sync"]:
+                        report["needs_sync"] += 1
+        
+        not_matched = []
+        if campaign_ids is None:
+            async for rows in self.campaign_service.stream_evaluation_inputs(*criteria):
+                await evaluate(rows)
+        else:
+            campaign_ids = list(dict.fromkeys(campaign_ids))
+            for start in range(0, len(campaign_ids), EVALUATION_CHUNK_SIZE):
+                chunk = campaign_ids[start:start + EVALUATION_CHUNK_SIZE]
+                rows = await self.campaign_service.get_evaluation_inputs(Campaign.id.in_(chunk), *criteria)
+                await evaluate(rows)
+                found = {row.id for row in rows}
+                not_matched.extend(campaign_id for campaign_id in chunk if campaign_id not in found)
+        
+        return {
+            **report,
+            "not_matched": not_matched,
+            "dry_run": dry_run,
+            "evaluated_at": current_time
+        }
+    
+    async def get_last_sweep_time(self) -> Optional[datetime]:
+        result = await self.db.execute(select(func.max(EvaluationSweep.swept_at)))
+        return result.scalar_one_or_none()
+    
+    async def evaluate_rows(
+        self,
+        rows: List[Row],
+        current_time: datetime,
+        dry_run: bool = False,
+        criteria: Sequence[Any] = ()
+    ) -> List[Dict[str, Any]]:
+        """
+        Оценка пачки кампаний, прочитанных через stream_evaluation_inputs.
+        Расписания подгружаются одним запросом на пачку, лог и новые
+        target_status пишутся пакетно. Запись условна по version: кампании,
+        изменившиеся после чтения, перечитываются и оцениваются заново.
+        
+        Args:
+            criteria: условия, по которым были прочитаны rows; перечитанная кампания, которая
+                      им больше не подходит (например, стала неуправляемой), не оценивается
+        """
+        results: Dict[UUID, Dict[str, Any]] = {}
+        log_rows = []
+        pending = rows
+        
+        for attempt in range(OCC_MAX_RETRIES + 1):
+            # Кампании на шаблонах получают общее скомпилированное расписание, слоты читаются только у остальных
+            templates = await self.template_service.get_compiled(
+                {row.schedule_template_id for row in pending if row.schedule_template_id is not None}
+            )
+            schedules_by_campaign = await self.campaign_service.get_schedules_for_campaigns(
+                [row.id for row in pending if row.schedule_template_id is None]
+            )
+            outcomes = []
+            for row in pending:
+                if row.schedule_template_id is not None:
+                    schedules = templates.get(row.schedule_template_id, [])
+                else:
+                    schedules = schedules_by_campaign.get(row.id, [])
+                outcomes.append(await self._evaluate_row(row, schedules, current_time, dry_run))
+            
+            evaluations = [outcome["evaluation"] for outcome in outcomes if "evaluation" in outcome]
+            applied = set() if dry_run else await self.campaign_service.mark_evaluated(evaluations)
+            
+            conflicted = []
+            for outcome in outcomes:
+                result = outcome["result"]
+                if dry_run or "evaluation" not in outcome or result["campaign_id"] in applied:
+                    results[result["campaign_id"]] = result
+                    if "log" in outcome:
+                        log_rows.append(outcome["log"])
+                    if "evaluation" in outcome:
+                        self._record_transition(outcome["campaign"], outcome["evaluation"])
+                else:
+                    conflicted.append(result["campaign_id"])
+            
+            if not conflicted:
+                break
+            if attempt == OCC_MAX_RETRIES:
+                # Попыток больше нет, перечитывать незачем
+                conflicted = set(conflicted)
+                pending = [row for row in pending if row.id in conflicted]
+                continue
+            pending = await self.campaign_service.get_evaluation_inputs(Campaign.id.in_(conflicted), *criteria)
+            if not pending:
+                break
+        else:
+            for row in pending:
+                results[row.id] = {
+                    "campaign_id": row.id,
+                    "campaign_name": row.name,
+                    "error": f"Кампания менялась во время каждой из {OCC_MAX_RETRIES + 1} попыток оценки",
+                    "success": False
+                }
+        
+        if log_rows:
+            await self.db.execute(insert(RuleEvaluationLog), log_rows)
+            await self.db.flush()
+        
+        return [results[row.id] for row in rows if row.id in results]
+    
+    async def _evaluate_row(
+        self,
+        row: Row,
+        schedule_dicts: List[Dict[str, Any]],
+        current_time: datetime,
+        dry_run: bool
+    ) -> Dict[str, Any]:
+        """Оценка одной строки: результат для ответа, запись лога и условная запись статуса"""
+        campaign_dict = dict(zip(EVALUATION_FIELDS, row))
+        campaign_dict["spend_today"] = campaign_dict["spend_today"] or Decimal("0.00")
+        
+        try:
+            target_status, triggered_rule, rule_details = await rule_engine.evaluate_campaign(
+                campaign_data=campaign_dict,
+                schedules=schedule_dicts,
+                current_time=current_time
+            )
+            
+            outcome = {}
+            if not dry_run:
+                log_data = RuleEvaluationLogCreate(
+                    campaign_id=row.id,
+                    triggered_rule=triggered_rule,
+                    previous_target=row.target_status,
+                    new_target=target_status,
+                    context=self._build_log_context(
+                        campaign_snapshot=campaign_dict,
+                        schedule_snapshot=schedule_dicts,
+                        rule_details=rule_details,
+                        current_time=current_time
+                    )
+                )
+                outcome["log"] = log_data.model_dump()
+                outcome["campaign"] = campaign_dict
+                outcome["evaluation"] = self._evaluation(campaign_dict, target_status, triggered_rule)
+        except Exception as e:
+            return {"result": {
+                "campaign_id": row.id,
+                "campaign_name": row.name,
+                "error": str(e),
+                "success": False
+            }}
+        
+        outcome["result"] = {
+            "campaign_id": row.id,
+            "campaign_name": row.name,
+            "current_status": row.current_status,
+            "previous_target_status": row.target_status,
+            "new_target_status": target_status,
+            "triggered_rule": triggered_rule,
+            "rule_details": rule_details,
+            "needs_sync": target_status != row.current_status,
+            "dry_run": dry_run,
+            "evaluated_at": current_time
+        }
+        return outcome
+    
+    def _evaluation(self, campaign_dict: Dict[str, Any], target_status, triggered_rule: Optional[str]) -> Dict[str, Any]:
+        """Запись результата для mark_evaluated: target_status и blocked_by только при изменении"""
+        evaluation = {
+            "id": campaign_dict["id"],
+            "version": campaign_dict["version"],
+            "evaluated_version": campaign_dict["inputs_version"]
+        }
+        if target_status != campaign_dict["target_status"]:
+            evaluation["target_status"] = target_status
+        blocked_by = triggered_rule if target_status == Statuses.PAUSED else None
+        if blocked_by != campaign_dict["blocked_by"]:
+            evaluation["blocked_by"] = blocked_by
+        return evaluation
+    
+    def _record_transition(self, campaign_dict: Dict[str, Any], evaluation: Dict[str, Any]) -> None:
+        """Записанная оценка переводит кампанию в другую группу сводки парка и, если сменила target_status, попадает в поток изменений"""
+        before = fleet_key(campaign_dict["current_status"], campaign_dict["target_status"], campaign_dict["blocked_by"])
+        after = fleet_key(
+            campaign_dict["current_status"],
+            evaluation.get("target_status", campaign_dict["target_status"]),
+            evaluation.get("blocked_by", campaign_dict["blocked_by"])
+        )
+        record_transition(self.db, before, after)
+        if "target_status" in evaluation:
+            mark_status_changed(self.db)
+    
     async def get_evaluation_history(
         self,
         campaign_id: UUID,
         skip: int = 0,
-        limit: int = 100
-    ) -> Tuple[List[RuleEvaluationLog], int]:
+        limit: int = 100,
+        after: Optional[Tuple[datetime, UUID]] = None,
+        count: CountMode = CountMode.EXACT,
+        raw_context: bool = False,
+        fields: Optional[Sequence[str]] = None
+    ) -> Tuple[List[Any], Optional[int], CountMode]:
         """
+        Когда горячая таблица исчерпана, страница дочитывается из холодного архива
+        (только для курсорной пагинации, без skip).
+        
+        Args:
+            after: (created_at, id) последней записи предыдущей страницы
+            count: как считать общее количество; estimated берется из счетчика Campaign.evaluation_count
+                   (только записи в базе, без холодного архива)
+            raw_context: читать горячие записи через Core, context - текстом JSON, как он хранится в базе
+            fields: при raw_context - только эти колонки (см. history_columns); без context
+                    он не читается ни из базы, ни из архива
+            
         Returns:
-            (список записей лога, общее количество)
+            (список записей лога, общее количество или None, фактический режим подсчета)
         """
-
-        count_query = select(
-            func.count()
-        ).where(
-            RuleEvaluationLog.campaign_id == campaign_id
-        )
-        count_result = await self.db.execute(count_query)
-        total = count_result.scalar_one()
+        query = self.history_query(campaign_id, raw_context=raw_context, fields=fields)
+        if count == CountMode.ESTIMATED:
+            total = await self.db.scalar(
+                select(Campaign.evaluation_count).where(Campaign.id == campaign_id)
+            )
+            count_mode = CountMode.ESTIMATED
+        else:
+            total, count_mode = await self.campaign_service.count_rows(query, count)
+            if count_mode == CountMode.EXACT:
+                total += await count_archived_history(campaign_id)
         
-        query = (
-            select(RuleEvaluationLog)
-            .where(RuleEvaluationLog.campaign_id == campaign_id)
-            .order_by(RuleEvaluationLog.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-        )
+        if after is not None:
+            after_created_at, after_id = after
+            query = query.where(
+                # Сравнение кортежей планировщик не использует для отсечения партиций, граница дублируется
+                RuleEvaluationLog.created_at <= after_created_at,
+                tuple_(RuleEvaluationLog.created_at, RuleEvaluationLog.id) < tuple_(after_created_at, after_id)
+            )
+        query = query.offset(skip).limit(limit)
         
         result = await self.db.execute(query)
-        logs = result.scalars().all()
+        logs = list(result.all() if raw_context else result.scalars().all())
         
-        return logs, total
-    
+        if len(logs) < limit and skip == 0:
+            boundary = (logs[-1].created_at, logs[-1].id) if logs else after
+            logs.extend(await read_archived_history(
+                campaign_id, before=boundary, limit=limit - len(logs),
+                with_context=fields is None or "context" in fields
+            ))
+        
+        return logs, total, count_mode
     
-    def _campaign_to_dict(self, campaign: Campaign) -> Dict[str, Any]:
-        return {
-            "id": campaign.id,
-            "name": campaign.name,
-            "current_status": campaign.current_status,
-            "target_status": campaign.target_status,
-            "is_managed": campaign.is_managed,
-            "budget_limit": campaign.budget_limit,
-            "spend_today": campaign.spend_today or Decimal("0.00"),
-            "stock_days_left": campaign.stock_days_left,
-            "stock_days_min": campaign.stock_days_min,
-            "schedule_enabled": campaign.schedule_enabled,
-            "created_at": campaign.created_at,
-            "updated_at": campaign.updated_at
-        }
+    def history_query(
+        self,
+        campaign_id: UUID,
+        raw_context: bool = False,
+        fields: Optional[Sequence[str]] = None
+    ) -> Select:
+        """
+        История кампании в порядке индекса (campaign_id, created_at desc, id desc), без сортировки.
+        Нижняя граница по сроку хранения отсекает истекшие партиции rule_evaluation_logs.
+        """
+        entity = select(*history_columns(fields or HISTORY_FIELDS)) if raw_context else select(RuleEvaluationLog)
+        query = (
+            entity
+            .where(RuleEvaluationLog.campaign_id == campaign_id)
+            .order_by(RuleEvaluationLog.created_at.desc(), RuleEvaluationLog.id.desc())
+        )
+        cutoff = retention_cutoff()
+        if cutoff is not None:
+            query = query.where(RuleEvaluationLog.created_at >= cutoff)
+        return query
     
-    def _schedules_to_dicts(self, schedules: List[CampaignSchedule]) -> List[Dict[str, Any]]:
-        return [
-            {
-                "id": schedule.id,
-                "campaign_id": schedule.campaign_id,
-                "day_of_week": schedule.day_of_week,
-                "start_time": schedule.start_time,
-                "end_time": schedule.end_time,
-                "created_at": schedule.created_at,
-                "updated_at": schedule.updated_at
-            }
-            for schedule in schedules
-        ]
     
-    async def _log_evaluation(
+    def _build_log_context(
         self,
-        campaign: Campaign,
-        triggered_rule: Optional[str],
-        new_target_status: Statuses,
-        rule_details: str,
         campaign_snapshot: Dict[str, Any],
         schedule_snapshot: List[Dict[str, Any]],
+        rule_details: str,
         current_time: datetime = None
-    ) -> RuleEvaluationLog:
+    ) -> Dict[str, Any]:
 
         def convert_for_json(obj):
             if isinstance(obj, UUID):
@@ -211,31 +549,22 @@ class EvaluationService:
         for key, value in campaign_snapshot.items():
             processed_campaign_snapshot[key] = convert_for_json(value)
         
-        processed_schedule_snapshot = []
-        for schedule in schedule_snapshot:
-            processed_schedule = {}
-            for key, value in schedule.items():
-                processed_schedule[key] = convert_for_json(value)
-            processed_schedule_snapshot.append(processed_schedule)
+        if isinstance(schedule_snapshot, CompiledSchedule) and schedule_snapshot.snapshot is not None:
+            # Снапшот шаблона общий для всех его кампаний и собирается один раз
+            processed_schedule_snapshot = schedule_snapshot.snapshot
+        else:
+            processed_schedule_snapshot = []
+            for schedule in schedule_snapshot:
+                processed_schedule = {}
+                for key, value in schedule.items():
+                    processed_schedule[key] = convert_for_json(value)
+                processed_schedule_snapshot.append(processed_schedule)
+            if isinstance(schedule_snapshot, CompiledSchedule):
+                schedule_snapshot.snapshot = processed_schedule_snapshot
         
-        context = {
+        return {
             "campaign_snapshot": processed_campaign_snapshot,
             "schedule_snapshot": processed_schedule_snapshot,
             "rule_details": rule_details,
             "current_time": current_time.isoformat() if current_time else None
         }
-        
-        log_data = RuleEvaluationLogCreate(
-            campaign_id=campaign.id,
-            triggered_rule=triggered_rule,
-            previous_target=campaign.target_status,
-            new_target=new_target_status,
-            context=context
-        )
-        
-        log_entry = RuleEvaluationLog(**log_data.model_dump())
-        self.db.add(log_entry)
-        await self.db.flush()
-        
-        return log_entry
-    
\ No newline at end of file
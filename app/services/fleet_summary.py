@@ -0,0 +1,159 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+from sqlalchemy import event, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models.Campaign import Campaign
+from models.enums import Statuses
+
+
+# Ключи session.info: переходы кампаний и признак неизвестных изменений в незавершенной транзакции
+SESSION_TRANSITIONS_KEY = "fleet_summary_transitions"
+SESSION_STALE_KEY = "fleet_summary_stale"
+
+# (current_status, target_status, blocked_by) - все, что нужно сводке от одной кампании
+FleetKey = Tuple[Statuses, Statuses, Optional[str]]
+
+
+def fleet_key(current_status: Statuses, target_status: Statuses, blocked_by: Optional[str]) -> FleetKey:
+    return (current_status, target_status, blocked_by)
+
+
+class FleetSummary:
+    """
+    Сводка парка кампаний в памяти процесса: количество кампаний по (current_status,
+    target_status, blocked_by). Ключей не больше статусов в квадрате на число правил,
+    поэтому чтение не зависит от размера парка. Переходы, записанные CampaignService и
+    EvaluationService, применяются после коммита транзакции. Записи других реплик и
+    пакетные пути без известных старых значений исправляет сверка с базой (reconcile).
+    """
+
+    def __init__(self):
+        self.counts: Dict[FleetKey, int] = {}
+        # False - сводка еще не читалась из базы или устарела, ближайшее чтение сверит ее
+        self.loaded = False
+        self.stale = False
+        self.reconciled_at: Optional[datetime] = None
+        self.transitions = 0
+        self.reconciliations = 0
+        # Расхождение с базой при последней сверке
+        self.last_drift = 0
+
+    def apply(self, transitions: Iterable[Tuple[Optional[FleetKey], Optional[FleetKey]]]) -> None:
+        """Переходы (до, после); None - кампании не было (создание) или не стало"""
+        for before, after in transitions:
+            if before is not None:
+                self.counts[before] = self.counts.get(before, 0) - 1
+            if after is not None:
+                self.counts[after] = self.counts.get(after, 0) + 1
+            self.transitions += 1
+
+    def replace(self, counts: Dict[FleetKey, int]) -> int:
+        """
+        Заменить сводку количествами из базы
+
+        Returns:
+            расхождение: сумма отклонений количеств по группам (кампания не в той группе дает 2)
+        """
+        keys = counts.keys() | self.counts.keys()
+        drift = sum(abs(counts.get(key, 0) - self.counts.get(key, 0)) for key in keys) if self.loaded else 0
+        self.counts = dict(counts)
+        self.loaded = True
+        self.stale = False
+        self.reconciled_at = datetime.now(timezone.utc)
+        self.reconciliations += 1
+        self.last_drift = drift
+        return drift
+
+    def clear(self) -> None:
+        self.counts.clear()
+        self.loaded = False
+        self.stale = False
+
+    @property
+    def needs_reconcile(self) -> bool:
+        return not self.loaded or self.stale
+
+    def snapshot(self) -> Dict[str, Any]:
+        by_current = {status.value: 0 for status in Statuses}
+        by_target = {status.value: 0 for status in Statuses}
+        blocked_by: Dict[str, int] = {}
+        total = needs_sync = 0
+        for (current_status, target_status, rule), count in self.counts.items():
+            if not count:
+                continue
+            total += count
+            by_current[current_status.value] += count
+            by_target[target_status.value] += count
+            if current_status != target_status:
+                needs_sync += count
+            if rule is not None and target_status == Statuses.PAUSED:
+                blocked_by[rule] = blocked_by.get(rule, 0) + count
+        return {
+            "total": total,
+            "by_current_status": by_current,
+            "by_target_status": by_target,
+            "needs_sync": needs_sync,
+            "blocked_by_rule": blocked_by,
+            "reconciled_at": self.reconciled_at,
+            "last_drift": self.last_drift
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "stale": self.stale,
+            "transitions": self.transitions,
+            "reconciliations": self.reconciliations,
+            "last_drift": self.last_drift
+        }
+
+
+# Сводка процесса, общая для всех сессий
+fleet_summary = FleetSummary()
+
+
+async def reconcile(session: AsyncSession, summary: FleetSummary = fleet_summary) -> int:
+    """
+    Пересчитать сводку одним GROUP BY по кампаниям
+
+    Returns:
+        расхождение с базой (см. FleetSummary.replace)
+    """
+    result = await session.execute(
+        select(Campaign.current_status, Campaign.target_status, Campaign.blocked_by, func.count())
+        .group_by(Campaign.current_status, Campaign.target_status, Campaign.blocked_by)
+    )
+    return summary.replace({
+        fleet_key(current_status, target_status, blocked_by): count
+        for current_status, target_status, blocked_by, count in result.all()
+    })
+
+
+def record_transition(session: AsyncSession, before: Optional[FleetKey], after: Optional[FleetKey]) -> None:
+    """Кампания перешла из группы before в after; сводка изменится после коммита сессии"""
+    if before != after:
+        session.info.setdefault(SESSION_TRANSITIONS_KEY, []).append((before, after))
+
+
+def mark_stale(session: AsyncSession) -> None:
+    """Сессия меняет статусы без известных старых значений: после коммита сводку нужно сверить"""
+    session.info[SESSION_STALE_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed(session: Session) -> None:
+    transitions = session.info.pop(SESSION_TRANSITIONS_KEY, None)
+    if transitions:
+        fleet_summary.apply(transitions)
+    if session.info.pop(SESSION_STALE_KEY, False):
+        fleet_summary.stale = True
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_rolled_back(session: Session, transaction) -> None:
+    # После коммита здесь уже пусто; осталось только то, что откатилось вместе с транзакцией
+    if transaction.parent is None:
+        session.info.pop(SESSION_TRANSITIONS_KEY, None)
+        session.info.pop(SESSION_STALE_KEY, None)
@@ -0,0 +1,244 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Callable, Set, Tuple
+from uuid import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.engine import Row
+
+from database.config import AsyncSessionLocal
+from models.Campaign import Campaign
+from rules_engine.engine import rule_engine
+from rules_engine.rules.base import ThresholdRule
+from .campaign_service import CampaignService, METRIC_FIELDS, BULK_CHUNK_SIZE
+from .evaluation_service import EvaluationService
+
+
+# Как часто буфер метрик сбрасывается в базу
+METRICS_FLUSH_INTERVAL_SECONDS = float(os.getenv("METRICS_FLUSH_INTERVAL_SECONDS", "1"))
+# Сколько разных кампаний может ждать записи; сверх лимита прием отклоняется (backpressure)
+METRICS_BUFFER_MAX_CAMPAIGNS = int(os.getenv("METRICS_BUFFER_MAX_CAMPAIGNS", "50000"))
+# buffered - ответ сразу после попадания в буфер (при падении процесса несброшенное теряется),
+# flushed - ответ после коммита сброса, в который попали значения
+METRICS_DURABILITY = os.getenv("METRICS_DURABILITY", "buffered")
+
+DURABILITY_MODES = ("buffered", "flushed")
+
+
+class BufferFullError(Exception):
+    """В буфере нет места для новых кампаний, клиенту нужно повторить позже"""
+
+
+class ThresholdIndex:
+    """
+    Пороги правил-порогов (BudgetRule, StockRule) и последние известные значения метрик
+    управляемых кампаний. По нему прием метрик без обращения к базе видит, что обновление
+    перевело кампанию через порог, и оценивает только такие кампании.
+    """
+
+    def __init__(self, rules: Optional[List[ThresholdRule]] = None):
+        self.rules = rule_engine.threshold_rules if rules is None else rules
+        self.fields = tuple(dict.fromkeys(
+            field for rule in self.rules for field in (rule.metric_field, rule.threshold_field)
+        ))
+        # None - кампания известна, но не управляется, пороги для нее не важны
+        self.entries: Dict[UUID, Optional[Dict[str, Any]]] = {}
+
+    def __contains__(self, campaign_id: UUID) -> bool:
+        return campaign_id in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def load(self, rows: List[Row]) -> None:
+        """Запомнить кампании по строкам CampaignService.get_evaluation_inputs"""
+        for row in rows:
+            self.entries[row.id] = {field: getattr(row, field) for field in self.fields} if row.is_managed else None
+
+    def apply(self, campaign_id: UUID, values: Dict[str, Any]) -> bool:
+        """
+        Записать новые значения метрик кампании
+
+        Returns:
+            True, если хотя бы одно правило-порог сменило сторону порога
+        """
+        entry = self.entries.get(campaign_id)
+        if entry is None:
+            return False
+        before = self._breaches(entry)
+        entry.update((field, value) for field, value in values.items() if field in entry)
+        return self._breaches(entry) != before
+
+    def _breaches(self, entry: Dict[str, Any]) -> Tuple[bool, ...]:
+        return tuple(rule.breached(entry[rule.metric_field], entry[rule.threshold_field]) for rule in self.rules)
+
+    def discard(self, campaign_id: UUID) -> None:
+        """Забыть кампанию после изменения порогов, при следующем сбросе она загрузится заново"""
+        self.entries.pop(campaign_id, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+class MetricsBuffer:
+    """
+    Write-behind буфер метрик. Обновления одной кампании схлопываются до последнего значения
+    каждого поля, раз в интервал весь буфер пишется в базу пакетным UPDATE (CampaignService.ingest_metrics).
+    Обновление, переводящее кампанию через порог правила, запускает сброс сразу, а сама кампания
+    оценивается движком правил в том же сбросе, не дожидаясь периодического прогона.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        max_campaigns: int = METRICS_BUFFER_MAX_CAMPAIGNS
+    ):
+        self.session_factory = session_factory
+        self.max_campaigns = max_campaigns
+        self.pending: Dict[UUID, Dict[str, Any]] = {}
+        self.received = 0
+        self.coalesced = 0
+        self.flushed = 0
+        self.evaluated = 0
+        self.thresholds = ThresholdIndex()
+        # Кампании, пересекшие порог с прошлого сброса
+        self.crossed: Set[UUID] = set()
+        self._flush_lock = asyncio.Lock()
+        self._next_flush: Optional[asyncio.Future] = None
+        self._crossing_flush: Optional[asyncio.Task] = None
+
+    def add(self, metrics: List[Dict[str, Any]]) -> asyncio.Future:
+        """
+        Положить обновления в буфер целиком или не положить ничего
+
+        Returns:
+            future сброса, в который попадут эти значения (для режима flushed)
+
+        Raises:
+            BufferFullError: новые кампании не помещаются в буфер
+        """
+        new_campaigns = {metric["campaign_id"] for metric in metrics} - self.pending.keys()
+        if len(self.pending) + len(new_campaigns) > self.max_campaigns:
+            raise BufferFullError(
+                f"Буфер метрик заполнен ({len(self.pending)} кампаний ожидают записи)"
+            )
+
+        for metric in metrics:
+            values = {field: metric[field] for field in METRIC_FIELDS if field in metric}
+            current = self.pending.setdefault(metric["campaign_id"], {})
+            if current:
+                self.coalesced += 1
+            current.update(values)
+            if self.thresholds.apply(metric["campaign_id"], values):
+                self.crossed.add(metric["campaign_id"])
+        self.received += len(metrics)
+        
+        if self.crossed and (self._crossing_flush is None or self._crossing_flush.done()):
+            self._crossing_flush = asyncio.get_running_loop().create_task(self._flush_crossed())
+        return self._flush_future()
+
+    def _flush_future(self) -> asyncio.Future:
+        if self._next_flush is None:
+            self._next_flush = asyncio.get_running_loop().create_future()
+        return self._next_flush
+
+    async def _flush_crossed(self) -> None:
+        """Внеочередной сброс ради пересечений порога; ошибки оставляют значения до периодического сброса"""
+        while self.crossed and self.pending:
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Warning: внеочередной сброс метрик не удался: {e}")
+                return
+
+    async def flush(self) -> int:
+        """
+        Записать накопленное одним пакетом и оценить кампании, пересекшие порог.
+        При ошибке записи значения возвращаются в буфер, не перетирая пришедшие за время записи более свежие.
+
+        Returns:
+            количество обновленных кампаний
+        """
+        async with self._flush_lock:
+            if not self.pending:
+                return 0
+            batch, self.pending = self.pending, {}
+            crossed, self.crossed = self.crossed, set()
+            waiters, self._next_flush = self._next_flush, None
+
+            try:
+                async with self.session_factory() as session:
+                    campaign_service = CampaignService(session)
+                    crossed |= await self._load_thresholds(campaign_service, batch)
+                    updated = await campaign_service.ingest_metrics(
+                        [{"campaign_id": campaign_id, **values} for campaign_id, values in batch.items()]
+                    )
+                    await session.commit()
+            except Exception as e:
+                for campaign_id, values in batch.items():
+                    self.pending[campaign_id] = {**values, **self.pending.get(campaign_id, {})}
+                self.crossed |= crossed
+                if waiters is not None and not waiters.done():
+                    waiters.set_exception(e)
+                    # Исключение не должно считаться необработанным, если никто не ждал сброса
+                    waiters.exception()
+                raise
+
+            self.flushed += updated
+            if waiters is not None and not waiters.done():
+                waiters.set_result(updated)
+            if crossed:
+                await self._evaluate_crossed(crossed)
+            return updated
+
+    async def _load_thresholds(self, campaign_service: CampaignService, batch: Dict[UUID, Dict[str, Any]]) -> Set[UUID]:
+        """
+        Загрузить в индекс кампании, которых в нем еще нет, по значениям до записи пачки.
+
+        Returns:
+            кампании, которые пачка перевела через порог
+        """
+        cold = [campaign_id for campaign_id in batch if campaign_id not in self.thresholds]
+        for start in range(0, len(cold), BULK_CHUNK_SIZE):
+            self.thresholds.load(
+                await campaign_service.get_evaluation_inputs(Campaign.id.in_(cold[start:start + BULK_CHUNK_SIZE]))
+            )
+        
+        crossed = set()
+        for campaign_id in cold:
+            if self.thresholds.apply(campaign_id, batch[campaign_id]):
+                crossed.add(campaign_id)
+            # Значения, пришедшие во время загрузки, уже лежат в следующей пачке
+            if campaign_id in self.pending and self.thresholds.apply(campaign_id, self.pending[campaign_id]):
+                self.crossed.add(campaign_id)
+        return crossed
+
+    async def _evaluate_crossed(self, crossed: Set[UUID]) -> None:
+        """
+        Оценка кампаний, пересекших порог, сразу после записи их метрик.
+        Метрики уже записаны и подняли inputs_version, поэтому при ошибке кампании
+        оценит ближайший инкрементальный прогон.
+        """
+        try:
+            async with self.session_factory() as session:
+                rows = await CampaignService(session).get_evaluation_inputs(Campaign.id.in_(crossed))
+                results = await EvaluationService(session).evaluate_rows(rows, current_time=datetime.now())
+                await session.commit()
+        except Exception as e:
+            print(f"Warning: не удалось оценить {len(crossed)} кампаний после пересечения порога: {e}")
+            return
+        self.evaluated += sum(1 for result in results if result.get("success", True))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self.pending),
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "flushed": self.flushed,
+            "evaluated": self.evaluated,
+            "thresholds": len(self.thresholds)
+        }
+
+
+# Буфер процесса: принимает POST /metrics/ingest, сбрасывается фоновой задачей и при остановке
+metrics_buffer = MetricsBuffer()
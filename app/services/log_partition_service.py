@@ -0,0 +1,199 @@
+import os
+from collections import Counter
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime, timezone, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, text, table, column, TableClause
+
+from models.RuleEvaluationLog import RuleEvaluationLog
+from .campaign_service import CampaignService
+
+
+# Сколько дней хранится история оценок, 0 - хранить всегда
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "90"))
+# Размер партиции rule_evaluation_logs: day или month
+LOG_PARTITION_INTERVAL = os.getenv("LOG_PARTITION_INTERVAL", "month")
+# На сколько партиций вперед создавать таблицы, чтобы вставка не упала на границе интервала
+LOG_PARTITIONS_AHEAD = int(os.getenv("LOG_PARTITIONS_AHEAD", "2"))
+# drop - удалить истекшую партицию, detach - только отсоединить (таблица остается для архива)
+LOG_RETENTION_ACTION = os.getenv("LOG_RETENTION_ACTION", "drop")
+# Размер пачки DELETE для баз без партиционирования
+LOG_RETENTION_BATCH_SIZE = int(os.getenv("LOG_RETENTION_BATCH_SIZE", "5000"))
+
+PARTITION_PREFIX = f"{RuleEvaluationLog.__tablename__}_p"
+# Партиция для строк вне созданных диапазонов: без нее вставка падает, если обслуживание
+# выключено или не успело создать партицию на следующий интервал
+DEFAULT_PARTITION = f"{RuleEvaluationLog.__tablename__}_default"
+
+
+def retention_cutoff(now: Optional[datetime] = None) -> Optional[datetime]:
+    """Самый старый created_at, который еще хранится; None - хранение без ограничения"""
+    if LOG_RETENTION_DAYS <= 0:
+        return None
+    return (now or datetime.now(timezone.utc)) - timedelta(days=LOG_RETENTION_DAYS)
+
+
+def partition_start(moment: datetime, interval: str = LOG_PARTITION_INTERVAL) -> datetime:
+    moment = moment.astimezone(timezone.utc)
+    if interval == "day":
+        return datetime(moment.year, moment.month, moment.day, tzinfo=timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def next_partition_start(start: datetime, interval: str = LOG_PARTITION_INTERVAL) -> datetime:
+    if interval == "day":
+        return start + timedelta(days=1)
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(start: datetime, interval: str = LOG_PARTITION_INTERVAL) -> str:
+    return PARTITION_PREFIX + start.strftime("%Y%m%d" if interval == "day" else "%Y%m")
+
+
+def parse_partition_name(name: str) -> Optional[Tuple[datetime, str]]:
+    """(начало диапазона, интервал) по имени партиции или None для чужих таблиц"""
+    if not name.startswith(PARTITION_PREFIX):
+        return None
+    suffix = name[len(PARTITION_PREFIX):]
+    interval, fmt = ("day", "%Y%m%d") if len(suffix) == 8 else ("month", "%Y%m")
+    try:
+        return datetime.strptime(suffix, fmt).replace(tzinfo=timezone.utc), interval
+    except ValueError:
+        return None
+
+
+def default_partition_ddl() -> str:
+    return f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {RuleEvaluationLog.__tablename__} DEFAULT"
+
+
+def partition_ddl(start: datetime, interval: str = LOG_PARTITION_INTERVAL) -> str:
+    end = next_partition_start(start, interval)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start, interval)} "
+        f"PARTITION OF {RuleEvaluationLog.__tablename__} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+class LogPartitionService:
+    """
+    Обслуживание rule_evaluation_logs: на Postgres таблица разбита на партиции по created_at,
+    новые партиции создаются заранее, истекшие отсоединяются или удаляются целиком.
+    Строки, попавшие в DEFAULT-партицию, переносятся в созданную для них партицию,
+    истекшие удаляются из нее пачками. На других базах партиций нет, истекшие строки удаляются пачками.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def maintain(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        now = now or datetime.now(timezone.utc)
+        if self.db.bind.dialect.name != "postgresql":
+            return {"created": [], "expired": [], "deleted": await self.delete_expired_rows(now)}
+
+        created = await self.create_partitions_ahead(now)
+        expired = await self.remove_expired_partitions(now)
+        deleted = await self.delete_expired_rows(now, table(DEFAULT_PARTITION, column("id"), column("campaign_id"), column("created_at")))
+        return {"created": created, "expired": expired, "deleted": deleted}
+
+    async def get_partitions(self) -> List[str]:
+        result = await self.db.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = CAST(:parent AS regclass)"
+            ),
+            {"parent": RuleEvaluationLog.__tablename__}
+        )
+        return result.scalars().all()
+
+    async def create_partitions_ahead(self, now: datetime) -> List[str]:
+        existing = set(await self.get_partitions())
+        created = []
+        if DEFAULT_PARTITION not in existing:
+            await self.db.execute(text(default_partition_ddl()))
+            created.append(DEFAULT_PARTITION)
+        start = partition_start(now)
+        for _ in range(LOG_PARTITIONS_AHEAD + 1):
+            name = partition_name(start)
+            if name not in existing:
+                await self.create_partition(start)
+                created.append(name)
+            start = next_partition_start(start)
+        await self.db.commit()
+        return created
+
+    async def create_partition(self, start: datetime) -> None:
+        """
+        Партиция интервала. Если строки этого интервала уже попали в DEFAULT-партицию, Postgres
+        не даст создать партицию поверх них: DEFAULT отсоединяется, строки переносятся, DEFAULT
+        присоединяется обратно - все в одной транзакции.
+        """
+        parent = RuleEvaluationLog.__tablename__
+        bounds = {"start": start, "end": next_partition_start(start)}
+        in_range = "created_at >= :start AND created_at < :end"
+        stray = await self.db.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})"), bounds)
+        if not stray:
+            await self.db.execute(text(partition_ddl(start)))
+            return
+        await self.db.execute(text(f"ALTER TABLE {parent} DETACH PARTITION {DEFAULT_PARTITION}"))
+        await self.db.execute(text(partition_ddl(start)))
+        await self.db.execute(text(f"INSERT INTO {parent} SELECT * FROM {DEFAULT_PARTITION} WHERE {in_range}"), bounds)
+        await self.db.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_range}"), bounds)
+        await self.db.execute(text(f"ALTER TABLE {parent} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+
+    async def remove_expired_partitions(self, now: datetime) -> List[str]:
+        cutoff = retention_cutoff(now)
+        if cutoff is None:
+            return []
+
+        expired = []
+        for name in sorted(await self.get_partitions()):
+            parsed = parse_partition_name(name)
+            if parsed is None:
+                continue
+            start, interval = parsed
+            # Партиция уходит только когда вся ее граница старше срока хранения
+            if next_partition_start(start, interval) > cutoff:
+                continue
+            # Счетчик истории кампаний уменьшается в той же транзакции, что и отсоединение
+            await self.db.execute(text(
+                f"UPDATE campaigns SET evaluation_count = GREATEST(campaigns.evaluation_count - expired.rows, 0) "
+                f"FROM (SELECT campaign_id, count(*) AS rows FROM {name} GROUP BY campaign_id) AS expired "
+                f"WHERE campaigns.id = expired.campaign_id"
+            ))
+            await self.db.execute(text(f"ALTER TABLE {RuleEvaluationLog.__tablename__} DETACH PARTITION {name}"))
+            if LOG_RETENTION_ACTION == "drop":
+                await self.db.execute(text(f"DROP TABLE {name}"))
+            # Каждая партиция в своей транзакции, чтобы не держать блокировку родителя
+            await self.db.commit()
+            expired.append(name)
+        return expired
+
+    async def delete_expired_rows(self, now: datetime, logs: TableClause = RuleEvaluationLog.__table__) -> int:
+        """
+        Args:
+            logs: таблица лога или DEFAULT-партиция (нужны колонки id, campaign_id, created_at)
+        """
+        cutoff = retention_cutoff(now)
+        if cutoff is None:
+            return 0
+
+        deleted = 0
+        while True:
+            batch = (
+                select(logs.c.id)
+                .where(logs.c.created_at < cutoff)
+                .limit(LOG_RETENTION_BATCH_SIZE)
+            )
+            result = await self.db.execute(
+                delete(logs)
+                .where(logs.c.id.in_(batch))
+                .returning(logs.c.campaign_id)
+            )
+            removed = result.scalars().all()
+            await CampaignService(self.db).forget_evaluations(Counter(removed))
+            await self.db.commit()
+            deleted += len(removed)
+            if len(removed) < LOG_RETENTION_BATCH_SIZE:
+                return deleted
@@ -0,0 +1,174 @@
+from typing import List, Optional, Dict, Any, Tuple, Set, Iterable
+from uuid import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, delete, func, exists
+
+from models.Campaign import Campaign
+from models.CampaignSchedule import CampaignSchedule
+from models.ScheduleTemplate import ScheduleTemplate
+from models.ScheduleTemplateSlot import ScheduleTemplateSlot
+from models.schemas.campaignScheduleSchema import ScheduleSlotBase
+from models.schemas.scheduleTemplateSchema import ScheduleTemplateCreate
+from rules_engine.schedule import CompiledSchedule
+from .campaign_service import INPUTS_CHANGED
+from .campaign_cache import invalidate_campaigns
+
+
+# Скомпилированные расписания шаблонов, общие для процесса: {template_id: (version, расписание)}.
+# Все кампании шаблона оцениваются по одному объекту, сколько бы их ни было
+compiled_templates: Dict[UUID, Tuple[int, CompiledSchedule]] = {}
+
+
+def compiled_template(template_id: UUID, version: int, slots: List[Dict[str, Any]]) -> CompiledSchedule:
+    """Скомпилированный шаблон из кэша, если версия совпадает, иначе компиляция по переданным слотам"""
+    cached = compiled_templates.get(template_id)
+    if cached is None or cached[0] != version:
+        cached = compiled_templates[template_id] = (version, CompiledSchedule(slots))
+    return cached[1]
+
+
+class TemplateInUseError(Exception):
+    """Шаблон нельзя удалить, пока к нему привязаны кампании"""
+
+
+class ScheduleTemplateService:
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def create_template(self, template_data: ScheduleTemplateCreate) -> ScheduleTemplate:
+        template = ScheduleTemplate(name=template_data.name)
+        self.db.add(template)
+        await self.db.flush()
+        await self._insert_slots(template.id, template_data.slots)
+        return template
+    
+    async def get_template(self, template_id: UUID) -> Optional[ScheduleTemplate]:
+        result = await self.db.execute(select(ScheduleTemplate).where(ScheduleTemplate.id == template_id))
+        return result.scalar_one_or_none()
+    
+    async def get_templates(self) -> List[ScheduleTemplate]:
+        result = await self.db.execute(select(ScheduleTemplate).order_by(ScheduleTemplate.name))
+        return result.scalars().all()
+    
+    async def get_template_slots(self, template_id: UUID) -> List[ScheduleTemplateSlot]:
+        result = await self.db.execute(
+            select(ScheduleTemplateSlot)
+            .where(ScheduleTemplateSlot.template_id == template_id)
+            .order_by(ScheduleTemplateSlot.day_of_week, ScheduleTemplateSlot.start_time)
+        )
+        return result.scalars().all()
+    
+    async def replace_slots(self, template_id: UUID, slots: List[ScheduleSlotBase]) -> Optional[ScheduleTemplate]:
+        """
+        Замена слотов шаблона. Версия шаблона растет, поэтому скомпилированное расписание
+        пересоберется при следующей оценке; привязанные кампании помечаются грязными одним UPDATE.
+        """
+        result = await self.db.execute(
+            update(ScheduleTemplate)
+            .where(ScheduleTemplate.id == template_id)
+            .values(version=ScheduleTemplate.version + 1)
+            .returning(ScheduleTemplate)
+        )
+        template = result.scalar_one_or_none()
+        if template is None:
+            return None
+        
+        await self.db.execute(delete(ScheduleTemplateSlot).where(ScheduleTemplateSlot.template_id == template_id))
+        await self._insert_slots(template_id, slots)
+        result = await self.db.execute(
+            update(Campaign)
+            .where(Campaign.schedule_template_id == template_id)
+            .values(**INPUTS_CHANGED)
+            .returning(Campaign.id)
+            .execution_options(synchronize_session=False)
+        )
+        invalidate_campaigns(self.db, result.scalars().all())
+        await self.db.flush()
+        return template
+    
+    async def _insert_slots(self, template_id: UUID, slots: List[ScheduleSlotBase]) -> None:
+        await self.db.execute(
+            insert(ScheduleTemplateSlot),
+            [{"template_id": template_id, **slot.model_dump()} for slot in slots]
+        )
+    
+    async def delete_template(self, template_id: UUID) -> bool:
+        """
+        Raises:
+            TemplateInUseError: к шаблону привязаны кампании
+        """
+        in_use = await self.db.scalar(select(exists().where(Campaign.schedule_template_id == template_id)))
+        if in_use:
+            raise TemplateInUseError(f"К шаблону {template_id} привязаны кампании")
+        
+        result = await self.db.execute(delete(ScheduleTemplate).where(ScheduleTemplate.id == template_id))
+        await self.db.flush()
+        compiled_templates.pop(template_id, None)
+        return result.rowcount > 0
+    
+    async def count_campaigns(self, template_id: UUID) -> int:
+        return await self.db.scalar(
+            select(func.count()).select_from(Campaign).where(Campaign.schedule_template_id == template_id)
+        )
+    
+    async def assign_template(self, template_id: UUID, campaign_ids: List[UUID]) -> Set[UUID]:
+        """
+        Привязка шаблона к пачке кампаний: собственные слоты кампаний удаляются одним DELETE,
+        кампании обновляются одним UPDATE и помечаются грязными.
+        
+        Returns:
+            id кампаний, к которым шаблон привязан; остальные не найдены
+        """
+        await self.db.execute(delete(CampaignSchedule).where(CampaignSchedule.campaign_id.in_(campaign_ids)))
+        result = await self.db.execute(
+            update(Campaign)
+            .where(Campaign.id.in_(campaign_ids))
+            .values(schedule_template_id=template_id, schedule_enabled=True, **INPUTS_CHANGED)
+            .returning(Campaign.id)
+            .execution_options(synchronize_session=False)
+        )
+        attached = set(result.scalars().all())
+        invalidate_campaigns(self.db, attached)
+        await self.db.flush()
+        return attached
+    
+    async def get_compiled(self, template_ids: Iterable[UUID]) -> Dict[UUID, CompiledSchedule]:
+        """
+        Скомпилированные расписания шаблонов. Версии сверяются одним запросом,
+        слоты читаются и компилируются только для шаблонов, изменившихся с прошлой сборки.
+        """
+        template_ids = list(template_ids)
+        if not template_ids:
+            return {}
+        
+        result = await self.db.execute(
+            select(ScheduleTemplate.id, ScheduleTemplate.version).where(ScheduleTemplate.id.in_(template_ids))
+        )
+        versions = dict(result.all())
+        stale = [
+            template_id for template_id, version in versions.items()
+            if compiled_templates.get(template_id, (None,))[0] != version
+        ]
+        
+        if stale:
+            slots: Dict[UUID, List[Dict[str, Any]]] = {template_id: [] for template_id in stale}
+            result = await self.db.execute(
+                select(
+                    ScheduleTemplateSlot.template_id,
+                    ScheduleTemplateSlot.day_of_week,
+                    ScheduleTemplateSlot.start_time,
+                    ScheduleTemplateSlot.end_time
+                ).where(ScheduleTemplateSlot.template_id.in_(stale))
+            )
+            for template_id, day_of_week, start_time, end_time in result:
+                slots[template_id].append({
+                    "template_id": template_id,
+                    "day_of_week": day_of_week,
+                    "start_time": start_time,
+                    "end_time": end_time
+                })
+            for template_id in stale:
+                compiled_template(template_id, versions[template_id], slots[template_id])
+        
+        return {template_id: compiled_templates[template_id][1] for template_id in versions}
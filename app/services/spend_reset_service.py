@@ -0,0 +1,130 @@
+import os
+from datetime import date, datetime, timezone
+from typing import List, Optional, Dict, Any, Tuple
+from uuid import UUID
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, and_, literal
+
+from models.Campaign import Campaign
+from models.enums import Statuses
+from .campaign_service import CampaignService, INPUTS_CHANGED
+from .campaign_cache import invalidate_campaigns
+from .evaluation_service import EvaluationService
+
+
+# Кампаний в одном UPDATE сброса; каждая пачка - отдельная транзакция
+SPEND_RESET_CHUNK_SIZE = int(os.getenv("SPEND_RESET_CHUNK_SIZE", "1000"))
+
+
+class SpendResetService:
+    """
+    Обнуление spend_today в местную полночь кампании. Кампании группируются по часовому поясу,
+    пояса обходятся с востока на запад (в порядке наступления полуночи), внутри пояса
+    сброс идет пачками одним UPDATE на пачку. Повторный запуск в тот же местный день ничего
+    не меняет, поэтому прерванный сброс безопасно повторить.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.campaign_service = CampaignService(db)
+        self.evaluation_service = EvaluationService(db)
+
+    async def reset_due(self, now: Optional[datetime] = None, chunk_size: int = SPEND_RESET_CHUNK_SIZE) -> Dict[str, Any]:
+        """
+        Returns:
+            {reset: обнулено кампаний, reevaluated: переоценено, timezones: пояса, где был сброс}
+        """
+        now = now or datetime.now(timezone.utc)
+        report = {"reset": 0, "reevaluated": 0, "timezones": []}
+
+        for zone_name, local_date in await self.get_timezone_buckets(now):
+            reset_in_zone = 0
+            while True:
+                reset, budget_paused = await self._reset_chunk(zone_name, local_date, chunk_size)
+                await self.db.commit()
+                reset_in_zone += reset
+                if budget_paused:
+                    report["reevaluated"] += await self._reevaluate(budget_paused)
+                if reset < chunk_size:
+                    break
+            if reset_in_zone:
+                report["reset"] += reset_in_zone
+                report["timezones"].append(zone_name)
+        return report
+
+    async def get_timezone_buckets(self, now: datetime) -> List[Tuple[str, date]]:
+        """(пояс, местная дата) для всех поясов кампаний, от самого восточного к западному"""
+        result = await self.db.execute(select(Campaign.timezone).distinct())
+        buckets = []
+        for zone_name in result.scalars().all():
+            try:
+                local_now = now.astimezone(ZoneInfo(zone_name))
+            except (ZoneInfoNotFoundError, ValueError):
+                print(f"Warning: неизвестный часовой пояс {zone_name!r}, сброс расхода пропущен")
+                continue
+            buckets.append((local_now.utcoffset(), zone_name, local_now.date()))
+        buckets.sort(key=lambda bucket: bucket[0], reverse=True)
+        return [(zone_name, local_date) for _, zone_name, local_date in buckets]
+
+    async def _reset_chunk(self, zone_name: str, local_date: date, chunk_size: int) -> Tuple[int, List[UUID]]:
+        """
+        Одна пачка сброса. На Postgres - один UPDATE ... FROM с RETURNING из подзапроса,
+        на остальных диалектах RETURNING не видит FROM, и пачка сначала выбирается отдельным SELECT.
+
+        Returns:
+            (обнулено кампаний, управляемые кампании, которые до сброса были на паузе
+             из-за превышения бюджета)
+        """
+        not_reset = and_(Campaign.timezone == zone_name, Campaign.spend_reset_on < local_date)
+        due = (
+            select(
+                Campaign.id,
+                and_(
+                    Campaign.is_managed,
+                    Campaign.target_status == Statuses.PAUSED,
+                    Campaign.budget_limit.is_not(None),
+                    Campaign.spend_today > Campaign.budget_limit
+                ).label("budget_paused")
+            )
+            .where(not_reset)
+            .order_by(Campaign.id)
+            .limit(chunk_size)
+        )
+        # Условие повторяется во внешнем UPDATE: конкурентный сброс той же кампании
+        # перепроверяется по новой версии строки и пропускается
+        reset = (
+            update(Campaign)
+            .where(not_reset)
+            .values(spend_today=literal(0), spend_reset_on=local_date, **INPUTS_CHANGED)
+            .execution_options(synchronize_session=False)
+        )
+
+        if self.db.get_bind().dialect.name == "postgresql":
+            due = due.subquery()
+            result = await self.db.execute(
+                reset.where(Campaign.id == due.c.id).returning(Campaign.id, due.c.budget_paused)
+            )
+            rows = result.all()
+        else:
+            budget_paused = dict((await self.db.execute(due)).all())
+            result = await self.db.execute(
+                reset.where(Campaign.id.in_(budget_paused)).returning(Campaign.id)
+            )
+            rows = [(campaign_id, budget_paused[campaign_id]) for campaign_id in result.scalars().all()]
+
+        invalidate_campaigns(self.db, [campaign_id for campaign_id, _ in rows])
+        return len(rows), [campaign_id for campaign_id, paused in rows if paused]
+
+    async def _reevaluate(self, campaign_ids: List[UUID]) -> int:
+        """Кампании, поставленные на паузу BudgetRule, оцениваются сразу, не дожидаясь прогона"""
+        try:
+            rows = await self.campaign_service.get_evaluation_inputs(Campaign.id.in_(campaign_ids))
+            results = await self.evaluation_service.evaluate_rows(rows, current_time=datetime.now())
+            await self.db.commit()
+        except Exception as e:
+            # Сброс уже закоммичен и поднял inputs_version, кампании оценит инкрементальный прогон
+            await self.db.rollback()
+            print(f"Warning: не удалось переоценить {len(campaign_ids)} кампаний после сброса расхода: {e}")
+            return 0
+        return sum(1 for result in results if result.get("success", True))
@@ -0,0 +1,215 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import event, select, tuple_, Row, Select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from models.RuleEvaluationLog import RuleEvaluationLog
+from .archive_service import as_utc
+
+
+# Как часто общий опрос процесса забирает новые смены target_status; 0 выключает поток изменений
+STATUS_STREAM_POLL_SECONDS = float(os.getenv("STATUS_STREAM_POLL_SECONDS", "1"))
+# Минимальная пауза между опросами: коммиты оценок в этом процессе будят опрос раньше, шторм схлопывается
+STATUS_STREAM_BATCH_SECONDS = float(os.getenv("STATUS_STREAM_BATCH_SECONDS", "0.05"))
+# Окно перечитывания: транзакция с более ранним created_at может закоммититься позже уже выданных событий
+STATUS_STREAM_OVERLAP_SECONDS = float(os.getenv("STATUS_STREAM_OVERLAP_SECONDS", "5"))
+# Событий в очереди одного подписчика; отставший подписчик отключается и переподключается с токеном
+STATUS_STREAM_QUEUE_SIZE = int(os.getenv("STATUS_STREAM_QUEUE_SIZE", "1000"))
+# Сколько пропущенных событий досылается при переподключении, больше - клиенту нужна полная сверка
+STATUS_STREAM_REPLAY_LIMIT = int(os.getenv("STATUS_STREAM_REPLAY_LIMIT", "10000"))
+# Комментарий-пинг в тихом потоке, чтобы прокси не закрывали соединение
+STATUS_STREAM_HEARTBEAT_SECONDS = float(os.getenv("STATUS_STREAM_HEARTBEAT_SECONDS", "15"))
+
+# Ключ session.info: транзакция записала смену target_status, после коммита опрос нужен сразу
+SESSION_CHANGED_KEY = "status_changes_written"
+
+CHANGE_COLUMNS = (
+    RuleEvaluationLog.id,
+    RuleEvaluationLog.campaign_id,
+    RuleEvaluationLog.triggered_rule,
+    RuleEvaluationLog.previous_target,
+    RuleEvaluationLog.new_target,
+    RuleEvaluationLog.created_at,
+)
+
+
+def changes_query() -> Select:
+    """Записи лога, сменившие target_status, по частичному индексу ix_rule_evaluation_logs_target_changes"""
+    return (
+        select(*CHANGE_COLUMNS)
+        .where(RuleEvaluationLog.previous_target != RuleEvaluationLog.new_target)
+        .order_by(RuleEvaluationLog.created_at, RuleEvaluationLog.id)
+    )
+
+
+async def read_changes(
+    session: AsyncSession,
+    after: Tuple[datetime, UUID],
+    limit: int = STATUS_STREAM_REPLAY_LIMIT
+) -> List[Row]:
+    """Смены target_status строго после ключа (created_at, id), от старых к новым"""
+    after_created_at, after_id = after
+    result = await session.execute(
+        changes_query()
+        .where(
+            RuleEvaluationLog.created_at >= after_created_at,
+            tuple_(RuleEvaluationLog.created_at, RuleEvaluationLog.id) > tuple_(after_created_at, after_id)
+        )
+        .limit(limit)
+    )
+    return list(result.all())
+
+
+class Subscription:
+    """Очередь событий одного подписчика; None в очереди - подписчик отстал и отключен"""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.overflowed = False
+
+
+class StatusChangeFeed:
+    """
+    Поток смен target_status для всех подписчиков процесса. Новые записи лога читает один
+    опрос на процесс, а не каждый подписчик, поэтому стоимость оценки не зависит от числа
+    подписчиков. Коммит оценки в этом процессе будит опрос сразу, записи других реплик
+    приходят со следующим опросом. Последние STATUS_STREAM_OVERLAP_SECONDS перечитываются
+    каждый раз, уже выданные записи отсеиваются по id. Без подписчиков база не опрашивается.
+    """
+
+    def __init__(self, queue_size: int = STATUS_STREAM_QUEUE_SIZE, overlap_seconds: float = STATUS_STREAM_OVERLAP_SECONDS):
+        self.queue_size = queue_size
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.subscriptions: Set[Subscription] = set()
+        # Самый поздний created_at среди выданных записей; None - опрос еще не начат
+        self.high_water: Optional[datetime] = None
+        # id записей из окна перечитывания, которые уже разосланы
+        self.seen: Dict[UUID, datetime] = {}
+        self.running = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self.polls = 0
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        self.subscriptions.add(subscription)
+        self.wake()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscriptions.discard(subscription)
+        if not self.subscriptions:
+            # Пропущенное без подписчиков досылается из базы по токену при подключении
+            self.high_water = None
+            self.seen.clear()
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def publish(self, changes: List[Row]) -> None:
+        """Одни и те же строки раздаются всем подписчикам, сериализуются они один раз (см. API)"""
+        for subscription in list(self.subscriptions):
+            if subscription.overflowed:
+                continue
+            if subscription.queue.qsize() + len(changes) > self.queue_size:
+                subscription.overflowed = True
+                subscription.queue.put_nowait(None)
+                self.dropped += 1
+                continue
+            for change in changes:
+                subscription.queue.put_nowait(change)
+        self.published += len(changes)
+
+    async def poll(self, session: AsyncSession) -> int:
+        """
+        Один запрос к базе на всех подписчиков
+
+        Returns:
+            количество новых событий
+        """
+        if not self.subscriptions:
+            return 0
+        if self.high_water is None:
+            # Подписчики получают записи до своего подключения из базы по токену
+            self.high_water = datetime.now(timezone.utc)
+        since = self.high_water - self.overlap
+        result = await session.execute(changes_query().where(RuleEvaluationLog.created_at >= since))
+        self.polls += 1
+
+        changes = []
+        for change in result.all():
+            if change.id in self.seen:
+                continue
+            created_at = as_utc(change.created_at)
+            self.seen[change.id] = created_at
+            self.high_water = max(self.high_water, created_at)
+            changes.append(change)
+        horizon = self.high_water - self.overlap
+        self.seen = {change_id: created_at for change_id, created_at in self.seen.items() if created_at >= horizon}
+
+        if changes:
+            self.publish(changes)
+        return len(changes)
+
+    async def run(self, session_factory: async_sessionmaker, interval: float = STATUS_STREAM_POLL_SECONDS) -> None:
+        """Опрос до отмены; между опросами ждет интервал или пробуждение от коммита оценки"""
+        self._wakeup = asyncio.Event()
+        self.running = True
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                if self.subscriptions:
+                    try:
+                        async with session_factory() as session:
+                            await self.poll(session)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        print(f"Warning: опрос потока изменений target_status не удался: {e}")
+                await asyncio.sleep(STATUS_STREAM_BATCH_SECONDS)
+        finally:
+            self.running = False
+            self._wakeup = None
+            for subscription in list(self.subscriptions):
+                subscription.queue.put_nowait(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "subscribers": len(self.subscriptions),
+            "polls": self.polls,
+            "published": self.published,
+            "dropped_subscribers": self.dropped
+        }
+
+
+# Поток процесса, опрос запускается фоновой задачей
+status_feed = StatusChangeFeed()
+
+
+def mark_status_changed(session: AsyncSession) -> None:
+    """Сессия записала смену target_status: после коммита поток опросит базу, не дожидаясь интервала"""
+    session.info[SESSION_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_on_commit(session: Session) -> None:
+    if session.info.pop(SESSION_CHANGED_KEY, False):
+        status_feed.wake()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_rolled_back(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop(SESSION_CHANGED_KEY, None)
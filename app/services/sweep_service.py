@@ -0,0 +1,308 @@
+import os
+import socket
+import uuid
+from typing import List, Optional, Dict, Any
+from datetime import datetime, timezone, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select, update, func, or_, and_
+
+from models.Campaign import Campaign
+from models.SweepCycle import SweepCycle
+from models.SweepChunk import SweepChunk
+from models.EvaluationSweep import EvaluationSweep
+from models.enums import SweepMode, ChunkStatus
+from .evaluation_service import EvaluationService
+
+
+SWEEP_CHUNK_SIZE = int(os.getenv("SWEEP_CHUNK_SIZE", "500"))
+SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", "100"))
+SWEEP_LEASE_SECONDS = float(os.getenv("SWEEP_LEASE_SECONDS", "30"))
+SWEEP_CYCLE_SECONDS = int(os.getenv("SWEEP_CYCLE_SECONDS", "60"))
+
+
+class LeaseLostError(Exception):
+    """Чанк перехвачен другой репликой, незакоммиченная работа откатывается"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def cycle_key_for(mode: SweepMode, current_time: datetime, period_seconds: int = SWEEP_CYCLE_SECONDS) -> str:
+    """Ключ цикла: все реплики, пришедшие в одном окне period_seconds, делят один цикл"""
+    return f"{mode.value}:{int(current_time.timestamp()) // period_seconds}"
+
+
+class SweepService:
+    """
+    Кооперативное распределение evaluate-all между репликами.
+    
+    Цикл делится на чанки по диапазонам id кампаний. Реплики захватывают чанки
+    через SELECT ... FOR UPDATE SKIP LOCKED с лизой и fencing-токеном (attempt),
+    оценивают их пачками и после каждой пачки в той же транзакции продлевают лизу
+    и сдвигают progress_id. Реплика, потерявшая лизу, откатывает текущую пачку,
+    поэтому в рамках цикла каждая кампания оценивается ровно один раз.
+    """
+    
+    def __init__(
+        self,
+        db: AsyncSession,
+        worker_id: Optional[str] = None,
+        chunk_size: int = SWEEP_CHUNK_SIZE,
+        batch_size: int = SWEEP_BATCH_SIZE,
+        lease_seconds: float = SWEEP_LEASE_SECONDS
+    ):
+        self.db = db
+        self.worker_id = worker_id or default_worker_id()
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.lease = timedelta(seconds=lease_seconds)
+        self.evaluation_service = EvaluationService(db)
+        self.campaign_service = self.evaluation_service.campaign_service
+    
+    async def get_or_create_cycle(
+        self,
+        cycle_key: str,
+        current_time: datetime,
+        mode: SweepMode = SweepMode.FULL
+    ) -> SweepCycle:
+        cycle = await self._get_cycle(cycle_key)
+        if cycle:
+            return cycle
+        
+        since = None
+        if mode == SweepMode.INCREMENTAL:
+            since = await self.evaluation_service.get_last_sweep_time()
+            if since is None:
+                mode = SweepMode.FULL
+        
+        cycle = SweepCycle(cycle_key=cycle_key, mode=mode, swept_at=current_time, since=since)
+        self.db.add(cycle)
+        try:
+            await self.db.flush()
+            chunks = await self._build_chunks(cycle)
+            cycle.chunk_count = len(chunks)
+            self.db.add_all(chunks)
+            await self.db.commit()
+        except IntegrityError:
+            # Цикл с этим ключом одновременно создала другая реплика
+            await self.db.rollback()
+            return await self._get_cycle(cycle_key)
+        
+        # Откат пачки при потере лизы не должен экспайрить цикл
+        self.db.expunge(cycle)
+        return cycle
+    
+    async def claim_chunk(self, cycle: SweepCycle) -> Optional[SweepChunk]:
+        """Захватить свободный чанк или чанк с истекшей лизой"""
+        while True:
+            now = datetime.now(timezone.utc)
+            stmt = (
+                select(SweepChunk.id, SweepChunk.attempt)
+                .where(
+                    SweepChunk.cycle_id == cycle.id,
+                    or_(
+                        SweepChunk.status == ChunkStatus.PENDING,
+                        and_(SweepChunk.status == ChunkStatus.CLAIMED, SweepChunk.lease_expires_at < now)
+                    )
+                )
+                .order_by(SweepChunk.chunk_no)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            candidate = (await self.db.execute(stmt)).first()
+            if candidate is None:
+                await self.db.commit()
+                return None
+            
+            claim = (
+                update(SweepChunk)
+                .where(SweepChunk.id == candidate.id, SweepChunk.attempt == candidate.attempt)
+                .values(
+                    status=ChunkStatus.CLAIMED,
+                    lease_owner=self.worker_id,
+                    lease_expires_at=now + self.lease,
+                    attempt=SweepChunk.attempt + 1
+                )
+                .returning(SweepChunk)
+                .execution_options(synchronize_session=False)
+            )
+            chunk = (await self.db.execute(claim)).scalar_one_or_none()
+            await self.db.commit()
+            if chunk is not None:
+                return chunk
+    
+    async def heartbeat(self, chunk: SweepChunk, progress_id: Optional[uuid.UUID] = None, evaluated: int = 0) -> None:
+        """
+        Продлить лизу и зафиксировать прогресс в текущей транзакции.
+        Raises:
+            LeaseLostError: чанк уже захвачен другой репликой
+        """
+        values = {
+            "lease_expires_at": datetime.now(timezone.utc) + self.lease,
+            "evaluated": SweepChunk.evaluated + evaluated
+        }
+        if progress_id is not None:
+            values["progress_id"] = progress_id
+        
+        stmt = (
+            update(SweepChunk)
+            .where(
+                SweepChunk.id == chunk.id,
+                SweepChunk.attempt == chunk.attempt,
+                SweepChunk.status == ChunkStatus.CLAIMED
+            )
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.db.execute(stmt)
+        if result.rowcount != 1:
+            raise LeaseLostError(f"Чанк {chunk.chunk_no} перехвачен другой репликой")
+    
+    async def process_chunk(self, cycle: SweepCycle, chunk: SweepChunk, results: List[Dict[str, Any]]) -> None:
+        """Оценить чанк пачками; результаты каждой закоммиченной пачки дописываются в results"""
+        criteria = [Campaign.is_managed]
+        if chunk.id_to is not None:
+            criteria.append(Campaign.id <= chunk.id_to)
+        if cycle.mode == SweepMode.INCREMENTAL and cycle.since is not None:
+            criteria.append(self.campaign_service.incremental_criteria(cycle.since, cycle.swept_at))
+        
+        progress_id = chunk.progress_id or chunk.id_after
+        while True:
+            batch_criteria = list(criteria)
+            if progress_id is not None:
+                batch_criteria.append(Campaign.id > progress_id)
+            
+            rows = await self.campaign_service.get_evaluation_inputs(*batch_criteria, limit=self.batch_size)
+            if not rows:
+                break
+            
+            try:
+                batch_results = await self.evaluation_service.evaluate_rows(
+                    rows, current_time=cycle.swept_at, criteria=criteria
+                )
+                progress_id = rows[-1].id
+                evaluated = sum(1 for result in batch_results if result.get("success", True))
+                await self.heartbeat(chunk, progress_id=progress_id, evaluated=evaluated)
+            except Exception:
+                await self.db.rollback()
+                raise
+            await self.db.commit()
+            results.extend(batch_results)
+        
+        await self.complete_chunk(cycle, chunk)
+    
+    async def complete_chunk(self, cycle: SweepCycle, chunk: SweepChunk) -> None:
+        stmt = (
+            update(SweepChunk)
+            .where(SweepChunk.id == chunk.id, SweepChunk.attempt == chunk.attempt)
+            .values(status=ChunkStatus.DONE, lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.db.execute(stmt)
+        if result.rowcount != 1:
+            await self.db.rollback()
+            raise LeaseLostError(f"Чанк {chunk.chunk_no} перехвачен другой репликой")
+        await self.db.commit()
+        await self._finish_cycle_if_done(cycle)
+    
+    async def run(self, cycle: SweepCycle) -> Dict[str, Any]:
+        """Обрабатывать чанки цикла, пока они не закончатся"""
+        results = []
+        chunks_processed = 0
+        
+        while True:
+            chunk = await self.claim_chunk(cycle)
+            if chunk is None:
+                break
+            try:
+                await self.process_chunk(cycle, chunk, results)
+                chunks_processed += 1
+            except LeaseLostError as e:
+                print(f"Warning: {e}")
+        
+        evaluated = [result for result in results if result.get("success", True)]
+        return {
+            "evaluated": len(evaluated),
+            # Сколько кампаний оценила эта реплика; общее число по циклу реплика не знает
+            "processed": len(results),
+            "total_managed": None,
+            "needs_sync": sum(1 for result in evaluated if result["needs_sync"]),
+            "dry_run": False,
+            "mode": cycle.mode,
+            "evaluated_at": cycle.swept_at,
+            "cycle_key": cycle.cycle_key,
+            "chunks_processed": chunks_processed,
+            "results": results
+        }
+    
+    async def run_cycle(
+        self,
+        current_time: Optional[datetime] = None,
+        mode: SweepMode = SweepMode.FULL,
+        cycle_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        current_time = datetime.now() if current_time is None else current_time
+        cycle_key = cycle_key or cycle_key_for(mode, current_time)
+        cycle = await self.get_or_create_cycle(cycle_key, current_time, mode)
+        return await self.run(cycle)
+    
+    async def _get_cycle(self, cycle_key: str) -> Optional[SweepCycle]:
+        result = await self.db.execute(select(SweepCycle).where(SweepCycle.cycle_key == cycle_key))
+        cycle = result.scalar_one_or_none()
+        if cycle is not None:
+            self.db.expunge(cycle)
+        return cycle
+    
+    async def _build_chunks(self, cycle: SweepCycle) -> List[SweepChunk]:
+        """Границы чанков по id управляемых кампаний; крайние чанки открыты, чтобы не потерять новые кампании"""
+        stmt = (
+            select(Campaign.id)
+            .where(Campaign.is_managed)
+            .order_by(Campaign.id)
+            .execution_options(yield_per=self.chunk_size)
+        )
+        boundaries = []
+        result = await self.db.stream(stmt)
+        async for partition in result.partitions(self.chunk_size):
+            boundaries.append(partition[-1].id)
+        
+        chunks = []
+        id_after = None
+        for chunk_no, id_to in enumerate(boundaries):
+            is_last = chunk_no == len(boundaries) - 1
+            chunks.append(SweepChunk(
+                cycle_id=cycle.id,
+                chunk_no=chunk_no,
+                id_after=id_after,
+                id_to=None if is_last else id_to
+            ))
+            id_after = id_to
+        
+        if not chunks:
+            chunks.append(SweepChunk(cycle_id=cycle.id, chunk_no=0))
+        return chunks
+    
+    async def _finish_cycle_if_done(self, cycle: SweepCycle) -> None:
+        remaining = await self.db.scalar(
+            select(func.count())
+            .select_from(SweepChunk)
+            .where(SweepChunk.cycle_id == cycle.id, SweepChunk.status != ChunkStatus.DONE)
+        )
+        if remaining:
+            return
+        
+        finish = (
+            update(SweepCycle)
+            .where(SweepCycle.id == cycle.id, SweepCycle.finished_at.is_(None))
+            .values(finished_at=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.db.execute(finish)
+        if result.rowcount == 1:
+            evaluated = await self.db.scalar(
+                select(func.coalesce(func.sum(SweepChunk.evaluated), 0)).where(SweepChunk.cycle_id == cycle.id)
+            )
+            self.db.add(EvaluationSweep(mode=cycle.mode, swept_at=cycle.swept_at, evaluated=evaluated))
+        await self.db.commit()
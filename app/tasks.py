@@ -0,0 +1,169 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Callable, Awaitable, List, Optional
+
+from database.config import AsyncSessionLocal, engine
+from models.enums import SweepMode
+from app.services.sweep_service import SweepService, cycle_key_for
+from app.services.log_partition_service import LogPartitionService
+from app.services.archive_service import ArchiveService, archive_enabled
+from app.services.ingestion_service import metrics_buffer, METRICS_FLUSH_INTERVAL_SECONDS
+from app.services.campaign_cache import CACHE_INVALIDATION_CHANNEL
+from app.services.cache_invalidation import invalidation_listener
+from app.services.spend_reset_service import SpendResetService
+from app.services.fleet_summary import reconcile
+from app.services.status_changes import status_feed, STATUS_STREAM_POLL_SECONDS
+
+
+SWEEP_INTERVAL_SECONDS = int(os.getenv("SWEEP_INTERVAL_SECONDS", "0"))
+SWEEP_MODE = SweepMode(os.getenv("SWEEP_MODE", SweepMode.FULL.value))
+# Обслуживание партиций лога, первый запуск сразу при старте сервиса
+LOG_MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("LOG_MAINTENANCE_INTERVAL_SECONDS", "3600"))
+# Выгрузка старой истории в архив; работает только при заданном EVALUATION_ARCHIVE_DIR
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+# Проверка наступившей местной полуночи для сброса spend_today, первый запуск сразу при старте
+SPEND_RESET_INTERVAL_SECONDS = int(os.getenv("SPEND_RESET_INTERVAL_SECONDS", "60"))
+# Сверка сводки парка с базой: исправляет записи других реплик и пропущенные переходы
+FLEET_SUMMARY_RECONCILE_SECONDS = int(os.getenv("FLEET_SUMMARY_RECONCILE_SECONDS", "60"))
+
+
+async def run_periodically(
+    name: str,
+    interval: float,
+    job: Callable[[], Awaitable[None]],
+    align: bool = False,
+    immediately: bool = False
+) -> None:
+    """
+    Запускает job каждые interval секунд до отмены.
+    align=True выравнивает запуски по границам интервала, чтобы реплики стартовали одновременно.
+    immediately=True выполняет первый запуск сразу при старте.
+    """
+    while True:
+        if not immediately:
+            delay = interval - (time.time() % interval) if align else interval
+            await asyncio.sleep(delay)
+        immediately = False
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Warning: фоновая задача {name} завершилась с ошибкой: {e}")
+
+
+def start_periodic(
+    name: str,
+    interval: float,
+    job: Callable[[], Awaitable[None]],
+    align: bool = False,
+    immediately: bool = False
+) -> Optional[asyncio.Task]:
+    """Интервал <= 0 выключает задачу"""
+    if interval <= 0:
+        return None
+    return asyncio.create_task(
+        run_periodically(name, interval, job, align=align, immediately=immediately), name=name
+    )
+
+
+async def stop_tasks(tasks: List[Optional[asyncio.Task]]) -> None:
+    running = [task for task in tasks if task is not None]
+    for task in running:
+        task.cancel()
+    await asyncio.gather(*running, return_exceptions=True)
+
+
+async def sweep_job() -> None:
+    """Периодический распределенный evaluate-all: реплики делят один цикл по ключу окна"""
+    async with AsyncSessionLocal() as session:
+        sweep_service = SweepService(session)
+        cycle_key = cycle_key_for(SWEEP_MODE, datetime.now(), period_seconds=SWEEP_INTERVAL_SECONDS)
+        result = await sweep_service.run_cycle(mode=SWEEP_MODE, cycle_key=cycle_key)
+        print(f"Цикл {result['cycle_key']}: оценено {result['evaluated']} кампаний в {result['chunks_processed']} чанках")
+
+
+async def log_maintenance_job() -> None:
+    """Создает партиции rule_evaluation_logs заранее и убирает истекшие по сроку хранения"""
+    async with AsyncSessionLocal() as session:
+        result = await LogPartitionService(session).maintain()
+        if result["created"] or result["expired"] or result["deleted"]:
+            print(
+                f"Лог оценок: создано партиций {len(result['created'])}, "
+                f"убрано партиций {len(result['expired'])}, удалено строк {result['deleted']}"
+            )
+
+
+async def archive_job() -> None:
+    """Переносит полные дни старше ARCHIVE_AFTER_DAYS из rule_evaluation_logs в файлы архива"""
+    async with AsyncSessionLocal() as session:
+        result = await ArchiveService(session).archive_expired()
+        if result["archived"] or result["purged"]:
+            print(
+                f"Архив истории: выгружено {result['archived']} записей за {len(result['days'])} дней, "
+                f"удалено устаревших файлов {result['purged']}"
+            )
+
+
+async def spend_reset_job() -> None:
+    """Обнуляет spend_today кампаниям, у которых наступила местная полночь"""
+    async with AsyncSessionLocal() as session:
+        result = await SpendResetService(session).reset_due()
+    if result["reset"]:
+        # Индекс порогов помнит расход до сброса
+        metrics_buffer.thresholds.clear()
+        print(
+            f"Сброс расхода: обнулено {result['reset']} кампаний в поясах {', '.join(result['timezones'])}, "
+            f"переоценено {result['reevaluated']}"
+        )
+
+
+async def fleet_reconcile_job() -> None:
+    async with AsyncSessionLocal() as session:
+        drift = await reconcile(session)
+    if drift:
+        print(f"Сводка парка сверена с базой, расхождение {drift}")
+
+
+async def metrics_flush_job() -> None:
+    await metrics_buffer.flush()
+
+
+async def flush_buffers() -> None:
+    """Вызывается при остановке сервиса после отмены фоновых задач: буфер метрик не должен потеряться"""
+    try:
+        flushed = await metrics_buffer.flush()
+        if flushed:
+            print(f"При остановке записаны метрики {flushed} кампаний")
+    except Exception as e:
+        print(f"Warning: не удалось записать буфер метрик при остановке ({len(metrics_buffer.pending)} кампаний): {e}")
+
+
+def start_invalidation_listener() -> Optional[asyncio.Task]:
+    """Межрепликовая инвалидация кэша кампаний работает через LISTEN/NOTIFY, только на Postgres"""
+    if not CACHE_INVALIDATION_CHANNEL or engine.dialect.name != "postgresql":
+        return None
+    return asyncio.create_task(invalidation_listener.run(), name="cache_invalidation")
+
+
+def start_status_feed() -> Optional[asyncio.Task]:
+    """Опрос новых смен target_status для GET /campaigns/changes/stream, один на процесс"""
+    if STATUS_STREAM_POLL_SECONDS <= 0:
+        return None
+    return asyncio.create_task(status_feed.run(AsyncSessionLocal), name="status_feed")
+
+
+def start_background_tasks() -> List[Optional[asyncio.Task]]:
+    return [
+        start_periodic("sweep", SWEEP_INTERVAL_SECONDS, sweep_job, align=True),
+        start_periodic("log_maintenance", LOG_MAINTENANCE_INTERVAL_SECONDS, log_maintenance_job, immediately=True),
+        start_periodic("archive", ARCHIVE_INTERVAL_SECONDS if archive_enabled() else 0, archive_job),
+        start_periodic("metrics_flush", METRICS_FLUSH_INTERVAL_SECONDS, metrics_flush_job),
+        start_periodic("spend_reset", SPEND_RESET_INTERVAL_SECONDS, spend_reset_job, immediately=True),
+        start_periodic("fleet_reconcile", FLEET_SUMMARY_RECONCILE_SECONDS, fleet_reconcile_job, immediately=True),
+        start_invalidation_listener(),
+        start_status_feed(),
+    ]
+
@@ -0,0 +1,60 @@
+"""
+Пакетный импорт кампаний против создания по одной (как серия POST /campaigns).
+
+    python -m benchmarks.bench_bulk_import [количество кампаний]
+"""
+import asyncio
+import sys
+from decimal import Decimal
+
+from benchmarks.common import prepare_database, measure
+from app.api.bulk_import import validate_chunk
+from app.services.campaign_service import CampaignService, BULK_CHUNK_SIZE
+from models.schemas.campaignSchema import CampaignCreate
+
+
+def make_records(prefix: str, count: int) -> list:
+    return [
+        (i + 1, {
+            "name": f"{prefix}-{i}",
+            "current_status": "active",
+            "target_status": "active",
+            "is_managed": True,
+            "budget_limit": "1000.00",
+            "spend_today": str(Decimal(i % 1500)),
+            "stock_days_left": i % 20,
+            "stock_days_min": 5,
+        })
+        for i in range(count)
+    ]
+
+
+async def main(count: int) -> None:
+    engine, session_factory = await prepare_database()
+
+    async def single_row():
+        # Каждая строка - отдельный запрос: валидация модели, flush + refresh и commit
+        async with session_factory() as session:
+            campaign_service = CampaignService(session)
+            for _, record in make_records("single", count):
+                await campaign_service.create_campaign(CampaignCreate(**record))
+                await session.commit()
+
+    async def bulk(prefix: str):
+        async with session_factory() as session:
+            campaign_service = CampaignService(session)
+            records = make_records(prefix, count)
+            for start in range(0, count, BULK_CHUNK_SIZE):
+                valid, _ = validate_chunk(records[start:start + BULK_CHUNK_SIZE])
+                await campaign_service.bulk_upsert(valid)
+                await session.commit()
+
+    await measure("по одной (create_campaign)", count, single_row)
+    await measure("bulk_upsert, вставка", count, lambda: bulk("bulk"))
+    await measure("bulk_upsert, обновление", count, lambda: bulk("bulk"))
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
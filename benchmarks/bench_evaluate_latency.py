@@ -0,0 +1,82 @@
+"""
+Задержка оценки одной кампании (путь POST /campaigns/{id}/evaluate): p50 / p99 / max
+и число запросов к базе на оценку. Оценки идут последовательно, каждая в своей транзакции.
+Сравниваются запись статуса и лога двумя запросами (прежний путь) и одним запросом с CTE;
+второй есть только на Postgres (BENCH_DATABASE_URL), на SQLite замеряется только первый.
+
+    python -m benchmarks.bench_evaluate_latency [кампаний] [оценок]
+"""
+import asyncio
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, time as clock_time
+from unittest.mock import patch
+
+from sqlalchemy import select, insert, update, event
+
+from benchmarks.common import prepare_database, seed_campaigns
+from app.services.evaluation_service import EvaluationService
+from models.Campaign import Campaign
+from models.CampaignSchedule import CampaignSchedule
+
+
+async def two_query_write(self, evaluation, log_values):
+    """Прежний путь записи на любой базе: mark_evaluated и INSERT лога отдельными запросами"""
+    now = datetime.now(timezone.utc)
+    log_values = {"id": uuid.uuid4(), **log_values, "created_at": now, "updated_at": now}
+    return await self._write_evaluation_separately(evaluation, log_values)
+
+
+async def main(campaigns: int, evaluations: int) -> None:
+    engine, session_factory = await prepare_database()
+    await seed_campaigns(session_factory, campaigns)
+    async with session_factory() as session:
+        campaign_ids = (await session.execute(select(Campaign.id))).scalars().all()
+        # У половины кампаний расписание на будни
+        scheduled = campaign_ids[::2]
+        await session.execute(update(Campaign).where(Campaign.id.in_(scheduled)).values(schedule_enabled=True))
+        await session.execute(insert(CampaignSchedule), [
+            {"id": uuid.uuid4(), "campaign_id": campaign_id, "day_of_week": day,
+             "start_time": clock_time(9, 0), "end_time": clock_time(19, 0)}
+            for campaign_id in scheduled for day in range(5)
+        ])
+        await session.commit()
+
+    statements = 0
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_statement(*args):
+        nonlocal statements
+        statements += 1
+
+    async def run(label: str) -> None:
+        nonlocal statements
+        statements = 0
+        latencies = []
+        for _ in range(evaluations):
+            campaign_id = random.choice(campaign_ids)
+            start = time.perf_counter()
+            async with session_factory() as session:
+                await EvaluationService(session).evaluate_single_campaign(campaign_id)
+                await session.commit()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"{label}: оценок {evaluations}, запросов к базе на оценку (с BEGIN/COMMIT): {statements / evaluations:.1f}")
+        print(f"{label}: p50 {statistics.median(latencies):.2f} мс  p99 {p99:.2f} мс  max {latencies[-1]:.2f} мс")
+
+    with patch.object(EvaluationService, "_write_evaluation", two_query_write):
+        await run("два запроса")
+    if engine.dialect.name == "postgresql":
+        await run("один запрос (CTE)")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    asyncio.run(main(*(args + [10000, 2000][len(args):])))
@@ -0,0 +1,66 @@
+"""
+Смешанная нагрузка чтение / оценка / PATCH на небольшом наборе горячих кампаний.
+Показывает пропускную способность и долю конфликтов версий при оценке.
+На sqlite транзакции сериализуются целиком, поэтому конфликтов не будет —
+осмысленные цифры получаются на Postgres (BENCH_DATABASE_URL).
+
+    python -m benchmarks.bench_occ [кампаний] [воркеров] [операций на воркер]
+"""
+import asyncio
+import random
+import sys
+import time
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from benchmarks.common import prepare_database, seed_campaigns
+from app.services.campaign_service import CampaignService
+from app.services.evaluation_service import EvaluationService, EvaluationConflictError, OCC_MAX_RETRIES
+from models.Campaign import Campaign
+from models.schemas.campaignSchema import CampaignUpdate
+
+
+async def main(campaigns: int, workers: int, operations: int) -> None:
+    engine, session_factory = await prepare_database()
+    await seed_campaigns(session_factory, campaigns)
+    async with session_factory() as session:
+        campaign_ids = (await session.execute(select(Campaign.id))).scalars().all()
+
+    stats = {"read": 0, "evaluate": 0, "write": 0, "retries": 0, "failed": 0}
+
+    async def worker():
+        for _ in range(operations):
+            campaign_id = random.choice(campaign_ids)
+            operation = random.choices(["read", "evaluate", "write"], weights=[5, 3, 2])[0]
+            async with session_factory() as session:
+                if operation == "read":
+                    await CampaignService(session).get_campaign(campaign_id)
+                elif operation == "evaluate":
+                    try:
+                        result = await EvaluationService(session).evaluate_single_campaign(campaign_id)
+                        stats["retries"] += result["conflict_retries"]
+                    except EvaluationConflictError:
+                        stats["failed"] += 1
+                else:
+                    budget = Decimal(random.randint(500, 2000))
+                    await CampaignService(session).update_campaign(campaign_id, CampaignUpdate(budget_limit=budget))
+                await session.commit()
+            stats[operation] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    elapsed = time.perf_counter() - start
+
+    total = stats["read"] + stats["evaluate"] + stats["write"]
+    evaluations = max(stats["evaluate"], 1)
+    print(f"Операций: {total} за {elapsed:.2f} с — {total / elapsed:,.0f} оп/с")
+    print(f"Оценок: {stats['evaluate']}, повторов из-за конфликта: {stats['retries']} "
+          f"({stats['retries'] / evaluations:.1%}), не удалось за {OCC_MAX_RETRIES + 1} попытки: {stats['failed']}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    asyncio.run(main(*(args + [20, 16, 200][len(args):])))
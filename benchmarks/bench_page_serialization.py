@@ -0,0 +1,107 @@
+"""
+Время ответа GET /campaigns и GET /campaigns/{id}/evaluation-history на страницу из 1000 строк:
+прежний путь (ORM-объекты -> модели ответа -> повторная валидация по response_model и
+jsonable_encoder, как делает FastAPI) против быстрого (Core-строки -> TypeAdapter.dump_json,
+context истории - текстом из базы). Время включает чтение страницы из базы.
+
+    python -m benchmarks.bench_page_serialization [строк на странице] [повторов]
+"""
+import asyncio
+import json
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, insert
+
+from benchmarks.common import prepare_database, seed_campaigns
+from app.api.responses import (
+    CampaignsListResponse, CampaignSimpleResponse, EvaluationHistoryResponse, EvaluationHistoryEntry
+)
+from app.api.routers.campaigns import CAMPAIGN_LIST_COLUMNS
+from app.api.serialization import campaigns_page_json, history_page_json
+from app.services.campaign_service import CampaignService
+from app.services.evaluation_service import EvaluationService
+from models.Campaign import Campaign
+from models.RuleEvaluationLog import RuleEvaluationLog
+from models.enums import Statuses, CountMode
+
+
+def fastapi_response(response_model, content) -> bytes:
+    # serialize_response FastAPI: валидация по response_model, jsonable_encoder, json.dumps в JSONResponse
+    validated = response_model.model_validate(content.model_dump())
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+async def main(page: int, repeats: int) -> None:
+    engine, session_factory = await prepare_database()
+    await seed_campaigns(session_factory, page)
+    async with session_factory() as session:
+        campaign_id = (await session.execute(select(Campaign.id).limit(1))).scalar_one()
+        snapshot = {"name": "bench", "budget_limit": 1000.0, "spend_today": 500.0, "stock_days_left": 10}
+        now = datetime.now(timezone.utc)
+        await session.execute(insert(RuleEvaluationLog), [
+            {"id": uuid.uuid4(), "campaign_id": campaign_id, "created_at": now - timedelta(seconds=i),
+             "triggered_rule": "BudgetRule", "previous_target": Statuses.ACTIVE, "new_target": Statuses.PAUSED,
+             "context": {"campaign_snapshot": snapshot, "schedule_snapshot": [], "rule_details": "Превышен бюджет"}}
+            for i in range(page)
+        ])
+        await session.commit()
+
+    envelope = {"total": None, "count_mode": CountMode.NONE, "skip": 0, "limit": page, "next_cursor": None}
+
+    async def campaigns_old():
+        async with session_factory() as session:
+            campaigns, _, _ = await CampaignService(session).get_campaigns(limit=page, count=CountMode.NONE)
+            content = CampaignsListResponse(
+                **envelope, campaigns=[CampaignSimpleResponse.model_validate(c) for c in campaigns]
+            )
+            return fastapi_response(CampaignsListResponse, content)
+
+    async def campaigns_new():
+        async with session_factory() as session:
+            rows, _, _ = await CampaignService(session).get_campaigns(
+                limit=page, count=CountMode.NONE, columns=CAMPAIGN_LIST_COLUMNS
+            )
+            return campaigns_page_json(envelope, rows)
+
+    async def history_old():
+        async with session_factory() as session:
+            logs, _, _ = await EvaluationService(session).get_evaluation_history(
+                campaign_id, limit=page, count=CountMode.NONE
+            )
+            content = EvaluationHistoryResponse(
+                **envelope, entries=[EvaluationHistoryEntry.model_validate(log) for log in logs]
+            )
+            return fastapi_response(EvaluationHistoryResponse, content)
+
+    async def history_new():
+        async with session_factory() as session:
+            logs, _, _ = await EvaluationService(session).get_evaluation_history(
+                campaign_id, limit=page, count=CountMode.NONE, raw_context=True
+            )
+            return history_page_json(envelope, logs)
+
+    for label, func in [
+        ("GET /campaigns: модели", campaigns_old),
+        ("GET /campaigns: TypeAdapter", campaigns_new),
+        ("evaluation-history: модели", history_old),
+        ("evaluation-history: сырой context", history_new),
+    ]:
+        await func()
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            body = await func()
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{label:<36} p50 {statistics.median(timings):>7.2f} мс  min {min(timings):>7.2f} мс  {len(body):>9,} байт")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    asyncio.run(main(*(args + [1000, 30][len(args):])))
@@ -0,0 +1,41 @@
+"""
+Сравнение ORM- и Core-пути чтения кампаний для движка правил.
+
+    python -m benchmarks.bench_read_path [количество кампаний]
+"""
+import asyncio
+import sys
+
+from sqlalchemy import select
+
+from benchmarks.common import prepare_database, seed_campaigns, measure
+from app.services.campaign_service import CampaignService
+from models.Campaign import Campaign
+
+
+async def main(count: int) -> None:
+    engine, session_factory = await prepare_database()
+    await seed_campaigns(session_factory, count)
+
+    async def read_orm():
+        async with session_factory() as session:
+            result = await session.execute(select(Campaign).where(Campaign.is_managed))
+            for campaign in result.scalars().all():
+                campaign.budget_limit, campaign.spend_today
+
+    async def read_core():
+        async with session_factory() as session:
+            campaign_service = CampaignService(session)
+            async for rows in campaign_service.stream_evaluation_inputs(Campaign.is_managed):
+                for row in rows:
+                    row.budget_limit, row.spend_today
+
+    for _ in range(3):
+        await measure("ORM select(Campaign)", count, read_orm)
+        await measure("Core stream_evaluation_inputs", count, read_core)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000))
@@ -0,0 +1,61 @@
+"""
+Оценка кампаний с собственными копиями одинакового расписания против общего шаблона.
+
+    python -m benchmarks.bench_schedule_templates [количество кампаний]
+"""
+import asyncio
+import sys
+import uuid
+from datetime import datetime, time
+
+from sqlalchemy import select, insert, update
+
+from benchmarks.common import prepare_database, seed_campaigns, measure
+from app.services.evaluation_service import EvaluationService
+from app.services.schedule_template_service import ScheduleTemplateService
+from models.Campaign import Campaign
+from models.CampaignSchedule import CampaignSchedule
+from models.schemas.scheduleTemplateSchema import ScheduleTemplateCreate
+
+# Будни с перерывом на обед: 10 слотов на кампанию
+WEEK = [
+    {"day_of_week": day, "start_time": start, "end_time": end}
+    for day in range(5)
+    for start, end in ((time(9, 0), time(13, 0)), (time(14, 0), time(19, 0)))
+]
+
+
+async def main(count: int) -> None:
+    engine, session_factory = await prepare_database()
+    await seed_campaigns(session_factory, count)
+
+    async with session_factory() as session:
+        campaign_ids = (await session.execute(select(Campaign.id))).scalars().all()
+        await session.execute(update(Campaign).values(schedule_enabled=True))
+        await session.execute(insert(CampaignSchedule), [
+            {"id": uuid.uuid4(), "campaign_id": campaign_id, **slot}
+            for campaign_id in campaign_ids for slot in WEEK
+        ])
+        await session.commit()
+
+    async def evaluate_all(moment: datetime):
+        async with session_factory() as session:
+            await EvaluationService(session).evaluate_all_campaigns(current_time=moment)
+            await session.commit()
+
+    # 2024-01-01 - понедельник
+    await measure("собственные копии слотов", count, lambda: evaluate_all(datetime(2024, 1, 1, 10, 0)))
+
+    async with session_factory() as session:
+        template_service = ScheduleTemplateService(session)
+        template = await template_service.create_template(ScheduleTemplateCreate(name="bench-week", slots=WEEK))
+        await template_service.assign_template(template.id, campaign_ids)
+        await session.commit()
+
+    await measure("общий шаблон", count, lambda: evaluate_all(datetime(2024, 1, 1, 13, 30)))
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
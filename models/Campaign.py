@@ -1,13 +1,33 @@
-from sqlalchemy import String, Numeric, Boolean, Enum, Integer
+from sqlalchemy import String, Numeric, Boolean, Enum, Integer, Date, Index, Computed, ForeignKey, text
 from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import date, datetime
 from decimal import Decimal
 from typing import Optional
+from zoneinfo import ZoneInfo
 from models.Base import Base
 from models.enums import Statuses
+import uuid
+
+
+# Кампания "грязная", если ее входные данные менялись после последней оценки
+DIRTY_CONDITION = "evaluated_version IS NULL OR evaluated_version < inputs_version"
+
+DEFAULT_TIMEZONE = "UTC"
+
+
+def local_today(context) -> date:
+    """Местная дата кампании на момент вставки: расход за этот день сбрасывать уже не нужно"""
+    return datetime.now(ZoneInfo(context.get_current_parameters().get("timezone") or DEFAULT_TIMEZONE)).date()
 
 
 class Campaign(Base):
     __tablename__ = "campaigns"
+    __table_args__ = (
+        Index("ix_campaigns_dirty", "id",
+              postgresql_where=text(DIRTY_CONDITION),
+              sqlite_where=text(DIRTY_CONDITION)),
+    )
 
     name: Mapped[str] = mapped_column(String(255), unique=True, index=True, nullable=False)
 
@@ -28,8 +48,61 @@ class Campaign(Base):
                                                  default=Decimal("0.00"),
                                                  nullable=False)
     
+    # Часовой пояс IANA: spend_today обнуляется в местную полночь кампании
+    timezone: Mapped[str] = mapped_column(String(64),
+                                          default=DEFAULT_TIMEZONE,
+                                          server_default=DEFAULT_TIMEZONE,
+                                          nullable=False)
+
+    # Местная дата последнего обнуления spend_today; повторный сброс в тот же день ничего не делает
+    spend_reset_on: Mapped[date] = mapped_column(Date(),
+                                                 default=local_today,
+                                                 server_default=text("CURRENT_DATE"),
+                                                 nullable=False)
+
     stock_days_left: Mapped[Optional[int]] = mapped_column(Integer(), default=None)
 
     stock_days_min: Mapped[Optional[int]] = mapped_column(Integer(), default=None)
 
     schedule_enabled: Mapped[bool] = mapped_column(Boolean(), default=False)
+
+    # Общий шаблон расписания; пока он задан, собственные слоты кампании не используются
+    schedule_template_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True),
+                                                                      ForeignKey("schedule_templates.id"),
+                                                                      index=True,
+                                                                      default=None)
+
+    # Правило, поставившее кампанию на паузу при последней оценке; None, если target_status - active
+    # или статус задан вручную. Ведется вместе с target_status, по нему считается сводка парка
+    blocked_by: Mapped[Optional[str]] = mapped_column(String(80), default=None)
+
+    # Увеличивается при каждом изменении входных данных правил
+    inputs_version: Mapped[int] = mapped_column(Integer(), default=1, server_default=text("1"), nullable=False)
+
+    # inputs_version, с которым кампания была оценена последний раз
+    evaluated_version: Mapped[Optional[int]] = mapped_column(Integer(), default=None)
+
+    # Увеличивается при любой записи в кампанию, используется для оптимистичных блокировок
+    version: Mapped[int] = mapped_column(Integer(), default=1, server_default=text("1"), nullable=False)
+
+    # Счетчик записей в rule_evaluation_logs, ведется при записи результата оценки.
+    # Дает estimated-количество для истории без COUNT(*) по логу
+    evaluation_count: Mapped[int] = mapped_column(Integer(), default=0, server_default=text("0"), nullable=False)
+
+    # Хранимая вычисляемая колонка: кампанию нужно синхронизировать с рекламной площадкой
+    needs_sync: Mapped[bool] = mapped_column(Boolean(),
+                                             Computed("current_status <> target_status", persisted=True))
+
+
+# Частичные индексы под горячие фильтры. Условие должно совпадать с тем, как диалект
+# рендерит WHERE в запросах сервисов: sqlite сравнивает boolean с 1
+Index("ix_campaigns_needs_sync", Campaign.id,
+      postgresql_where=Campaign.needs_sync,
+      sqlite_where=Campaign.needs_sync == True)
+
+# Сброс расхода выбирает кампании пояса, у которых местная дата сменилась
+Index("ix_campaigns_timezone_reset", Campaign.timezone, Campaign.spend_reset_on)
+
+Index("ix_campaigns_managed", Campaign.id,
+      postgresql_where=Campaign.is_managed,
+      sqlite_where=Campaign.is_managed == True)
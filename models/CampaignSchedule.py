@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, Time, ForeignKey
+from sqlalchemy import Integer, Time, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import time
@@ -8,6 +8,11 @@ import uuid
 
 class CampaignSchedule(Base):
     __tablename__ = "campaign_schedules"
+    __table_args__ = (
+        # Поиск слотов, чья граница попала в окно между инкрементальными прогонами
+        Index("ix_campaign_schedules_day_start", "day_of_week", "start_time"),
+        Index("ix_campaign_schedules_day_end", "day_of_week", "end_time"),
+    )
 
     campaign_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True),
                                                    ForeignKey("campaigns.id", ondelete="CASCADE"),
@@ -0,0 +1,16 @@
+from sqlalchemy import Enum, DateTime, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+from models.Base import Base
+from models.enums import SweepMode
+
+
+class EvaluationSweep(Base):
+    __tablename__ = "evaluation_sweeps"
+
+    mode: Mapped[SweepMode] = mapped_column(Enum(SweepMode, name="sweep_mode_enum"), nullable=False)
+
+    # Время, на которое выполнялась оценка (current_time движка правил)
+    swept_at: Mapped[datetime] = mapped_column(DateTime(), nullable=False, index=True)
+
+    evaluated: Mapped[int] = mapped_column(Integer(), default=0, nullable=False)
@@ -1,8 +1,9 @@
-from sqlalchemy import String, Enum, JSON, DateTime, ForeignKey
+from sqlalchemy import String, Enum, JSON, DateTime, ForeignKey, Index, PrimaryKeyConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column
 from enum import Enum as PyEnum
 from typing import Optional, Dict, Any
+from datetime import datetime, timezone
 from models.Base import Base
 from models.enums import Statuses
 import uuid
@@ -10,6 +11,17 @@ import uuid
 
 class RuleEvaluationLog(Base):
     __tablename__ = "rule_evaluation_logs"
+    # На Postgres таблица разбита на партиции по created_at (см. LogPartitionService),
+    # ключ партиционирования обязан входить в первичный ключ
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True),
+                                                 primary_key=True,
+                                                 default=lambda: datetime.now(timezone.utc),
+                                                 nullable=False)
 
     campaign_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True),
                                                    ForeignKey("campaigns.id", ondelete='CASCADE'),
@@ -27,3 +39,19 @@ class RuleEvaluationLog(Base):
                                                  nullable=False)
     
     context: Mapped[Dict[str, Any]] = mapped_column(JSON, default=dict, nullable=False)
+
+
+# История кампании читается по campaign_id от новых записей к старым,
+# id разводит записи с одинаковым created_at для keyset-пагинации
+Index("ix_rule_evaluation_logs_campaign_created",
+      RuleEvaluationLog.campaign_id,
+      RuleEvaluationLog.created_at.desc(),
+      RuleEvaluationLog.id.desc())
+
+# Поток изменений target_status (StatusChangeFeed) читает новые смены по created_at;
+# записей без смены большинство, в индекс они не попадают
+Index("ix_rule_evaluation_logs_target_changes",
+      RuleEvaluationLog.created_at,
+      RuleEvaluationLog.id,
+      postgresql_where=RuleEvaluationLog.previous_target != RuleEvaluationLog.new_target,
+      sqlite_where=RuleEvaluationLog.previous_target != RuleEvaluationLog.new_target)
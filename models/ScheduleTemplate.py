@@ -0,0 +1,12 @@
+from sqlalchemy import String, Integer, text
+from sqlalchemy.orm import Mapped, mapped_column
+from models.Base import Base
+
+
+class ScheduleTemplate(Base):
+    __tablename__ = "schedule_templates"
+
+    name: Mapped[str] = mapped_column(String(255), unique=True, index=True, nullable=False)
+
+    # Увеличивается при замене слотов, по нему сбрасывается скомпилированное расписание в памяти
+    version: Mapped[int] = mapped_column(Integer(), default=1, server_default=text("1"), nullable=False)
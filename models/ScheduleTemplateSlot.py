@@ -0,0 +1,26 @@
+from sqlalchemy import Integer, Time, ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import time
+from models.Base import Base
+import uuid
+
+
+class ScheduleTemplateSlot(Base):
+    __tablename__ = "schedule_template_slots"
+    __table_args__ = (
+        # Те же индексы, что у campaign_schedules: инкрементальный прогон ищет переключившиеся окна шаблонов
+        Index("ix_schedule_template_slots_day_start", "day_of_week", "start_time"),
+        Index("ix_schedule_template_slots_day_end", "day_of_week", "end_time"),
+    )
+
+    template_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True),
+                                                   ForeignKey("schedule_templates.id", ondelete="CASCADE"),
+                                                   nullable=False,
+                                                   index=True)
+
+    day_of_week: Mapped[int] = mapped_column(Integer(), nullable=False)
+
+    start_time: Mapped[time] = mapped_column(Time(), nullable=False)
+
+    end_time: Mapped[time] = mapped_column(Time(), nullable=False)
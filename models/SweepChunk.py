@@ -0,0 +1,42 @@
+from sqlalchemy import String, Enum, DateTime, Integer, ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+from typing import Optional
+from models.Base import Base
+from models.enums import ChunkStatus
+import uuid
+
+
+class SweepChunk(Base):
+    __tablename__ = "sweep_chunks"
+    __table_args__ = (
+        Index("ix_sweep_chunks_cycle_status", "cycle_id", "status", "chunk_no"),
+    )
+
+    cycle_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True),
+                                                ForeignKey("sweep_cycles.id", ondelete="CASCADE"),
+                                                nullable=False)
+
+    chunk_no: Mapped[int] = mapped_column(Integer(), nullable=False)
+
+    # Диапазон id кампаний (id_after, id_to]; None - открытая граница
+    id_after: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), default=None)
+
+    id_to: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), default=None)
+
+    # Последний id, оценка которого закоммичена. Перехвативший чанк продолжает с него
+    progress_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), default=None)
+
+    status: Mapped[ChunkStatus] = mapped_column(Enum(ChunkStatus, name="chunk_status_enum"),
+                                                default=ChunkStatus.PENDING,
+                                                nullable=False)
+
+    lease_owner: Mapped[Optional[str]] = mapped_column(String(120), default=None)
+
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), default=None)
+
+    # Fencing-токен: увеличивается при каждом захвате, старый владелец теряет право записи
+    attempt: Mapped[int] = mapped_column(Integer(), default=0, nullable=False)
+
+    evaluated: Mapped[int] = mapped_column(Integer(), default=0, nullable=False)
@@ -0,0 +1,25 @@
+from sqlalchemy import String, Enum, DateTime, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+from typing import Optional
+from models.Base import Base
+from models.enums import SweepMode
+
+
+class SweepCycle(Base):
+    __tablename__ = "sweep_cycles"
+
+    # Общий для всех реплик ключ цикла, например "full:29384756"
+    cycle_key: Mapped[str] = mapped_column(String(120), unique=True, nullable=False)
+
+    mode: Mapped[SweepMode] = mapped_column(Enum(SweepMode, name="sweep_mode_enum"), nullable=False)
+
+    # current_time движка правил для всех чанков цикла
+    swept_at: Mapped[datetime] = mapped_column(DateTime(), nullable=False)
+
+    # Граница инкрементального цикла (время предыдущего прогона)
+    since: Mapped[Optional[datetime]] = mapped_column(DateTime(), default=None)
+
+    chunk_count: Mapped[int] = mapped_column(Integer(), default=0, nullable=False)
+
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), default=None)
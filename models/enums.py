@@ -5,4 +5,30 @@ class Statuses(Enum):
     PAUSED = "paused"
 
     def __str__(self):
-        return self.value
\ No newline at end of file
+        return self.value
+
+
+class SweepMode(Enum):
+    FULL = "full"
+    INCREMENTAL = "incremental"
+
+    def __str__(self):
+        return self.value
+
+
+class ChunkStatus(Enum):
+    PENDING = "pending"
+    CLAIMED = "claimed"
+    DONE = "done"
+
+    def __str__(self):
+        return self.value
+
+
+class CountMode(Enum):
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    NONE = "none"
+
+    def __str__(self):
+        return self.value
@@ -4,10 +4,10 @@ from uuid import UUID
 from typing import Optional
 from . import BaseSchema, BaseCreateSchema, BaseUpdateSchema
 
-class CampaignScheduleBase(BaseModel):
+class ScheduleSlotBase(BaseModel):
+    """Слот недельного расписания без владельца: общий для кампаний и шаблонов"""
     model_config = ConfigDict(arbitrary_types_allowed=True)
     
-    campaign_id: UUID = Field(...)
     day_of_week: int = Field(..., ge=0, le=6, description="0=Monday, 6=Sunday")
     start_time: time
     end_time: time
@@ -18,6 +18,9 @@ class CampaignScheduleBase(BaseModel):
         if 'start_time' in info.data and end_time <= info.data['start_time']:
             raise ValueError('End time must be after start time')
         return end_time
+
+class CampaignScheduleBase(ScheduleSlotBase):
+    campaign_id: UUID = Field(...)
     
 
 class CampaignScheduleCreate(CampaignScheduleBase, BaseCreateSchema):
@@ -1,9 +1,22 @@
 from decimal import Decimal
 from typing import Optional
-from pydantic import BaseModel, ConfigDict, Field
+from uuid import UUID
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from models.enums import Statuses
 from . import BaseSchema, BaseCreateSchema, BaseUpdateSchema
 
+
+def validate_timezone(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return value
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f'Unknown timezone: {value}')
+    return value
+
+
 class CampaignBase(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
     
@@ -16,6 +29,9 @@ class CampaignBase(BaseModel):
     stock_days_left: Optional[int] = Field(None, ge=0, le=365)
     stock_days_min: Optional[int] = Field(None, ge=0, le=365)
     schedule_enabled: bool = False
+    timezone: str = Field("UTC", max_length=64, description="Часовой пояс IANA для сброса spend_today")
+    
+    _validate_timezone = field_validator('timezone')(validate_timezone)
 
 class CampaignCreate(CampaignBase, BaseCreateSchema):
     pass
@@ -30,6 +46,10 @@ class CampaignUpdate(BaseUpdateSchema):
     stock_days_left: Optional[int] = Field(None, ge=0, le=365)
     stock_days_min: Optional[int] = Field(None, ge=0, le=365)
     schedule_enabled: Optional[bool] = None
+    timezone: Optional[str] = Field(None, max_length=64)
+    
+    _validate_timezone = field_validator('timezone')(validate_timezone)
 
 class CampaignRead(CampaignBase, BaseSchema):
-    pass
\ No newline at end of file
+    schedule_template_id: Optional[UUID] = None
+    blocked_by: Optional[str] = None
\ No newline at end of file
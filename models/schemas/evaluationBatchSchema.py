@@ -0,0 +1,29 @@
+from typing import List, Optional
+from uuid import UUID
+from pydantic import BaseModel, Field, model_validator
+from models.enums import Statuses
+
+
+class CampaignFilter(BaseModel):
+    """Фильтр кампаний; незаданные поля не ограничивают выборку, заданные объединяются через AND"""
+    is_managed: Optional[bool] = None
+    schedule_enabled: Optional[bool] = None
+    needs_sync: Optional[bool] = None
+    has_budget: Optional[bool] = Field(None, description="budget_limit задан")
+    schedule_template_id: Optional[UUID] = None
+    current_status: Optional[Statuses] = None
+    target_status: Optional[Statuses] = None
+    blocked_by: Optional[str] = Field(None, max_length=80)
+    timezone: Optional[str] = Field(None, max_length=64)
+    dirty: Optional[bool] = Field(None, description="Входные данные изменились после последней оценки")
+
+
+class EvaluateBatchRequest(BaseModel):
+    campaign_ids: Optional[List[UUID]] = Field(None, min_length=1, max_length=10000)
+    filter: Optional[CampaignFilter] = None
+
+    @model_validator(mode="after")
+    def validate_has_selection(self) -> "EvaluateBatchRequest":
+        if self.campaign_ids is None and self.filter is None:
+            raise ValueError("Нужно передать campaign_ids или filter")
+        return self
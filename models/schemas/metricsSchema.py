@@ -0,0 +1,17 @@
+from decimal import Decimal
+from typing import Optional
+from uuid import UUID
+from pydantic import BaseModel, Field, model_validator
+
+
+class MetricUpdate(BaseModel):
+    """Новые значения метрик кампании от площадки; незаданные поля не меняются"""
+    campaign_id: UUID
+    spend_today: Optional[Decimal] = Field(None, ge=0)
+    stock_days_left: Optional[int] = Field(None, ge=0, le=365)
+
+    @model_validator(mode="after")
+    def validate_has_metrics(self) -> "MetricUpdate":
+        if self.spend_today is None and self.stock_days_left is None:
+            raise ValueError("Нужно передать spend_today или stock_days_left")
+        return self
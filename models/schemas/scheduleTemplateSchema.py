@@ -0,0 +1,19 @@
+from typing import List
+from uuid import UUID
+from pydantic import BaseModel, Field
+from .campaignScheduleSchema import ScheduleSlotBase
+from . import BaseSchema, BaseCreateSchema
+
+class ScheduleTemplateCreate(BaseCreateSchema):
+    name: str = Field(..., min_length=1, max_length=255)
+    slots: List[ScheduleSlotBase] = Field(..., min_length=1)
+
+class ScheduleTemplateSlotsUpdate(BaseModel):
+    slots: List[ScheduleSlotBase] = Field(..., min_length=1)
+
+class ScheduleTemplateAssign(BaseModel):
+    campaign_ids: List[UUID] = Field(..., min_length=1, max_length=10000)
+
+class ScheduleTemplateRead(BaseSchema):
+    name: str
+    version: int
@@ -2,6 +2,7 @@ from typing import Dict, Any, List, Tuple, Optional
 from datetime import datetime
 from models.enums import Statuses
 from .registrator import RuleRegistry
+from .rules.base import ThresholdRule
 
 
 class RuleEngine:
@@ -16,6 +17,10 @@ class RuleEngine:
     def _initialize(self):
         self.rules = RuleRegistry.get_all_rules()
         self._validate_rules_order()
+        # Правила, срабатывание которых зависит только от пары (метрика, порог)
+        self.threshold_rules: List[ThresholdRule] = [
+            rule for rule in self.rules if isinstance(rule, ThresholdRule)
+        ]
         self._last_evaluation_details: Dict[str, Any] = {}
     
     def _validate_rules_order(self):
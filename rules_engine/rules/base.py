@@ -26,4 +26,24 @@ class Rule(ABC):
     
     @abstractmethod
     def get_details(self) -> str:
-        pass
\ No newline at end of file
+        pass
+
+class ThresholdRule(Rule):
+    """
+    Правило-порог: срабатывает, пока метрика кампании находится по одну сторону от порога.
+    По паре (метрика, порог) без базы видно, что обновление метрики перевело кампанию через порог.
+    """
+    
+    @property
+    @abstractmethod
+    def metric_field(self) -> str:
+        pass
+    
+    @property
+    @abstractmethod
+    def threshold_field(self) -> str:
+        pass
+    
+    @abstractmethod
+    def breached(self, value: Any, threshold: Any) -> bool:
+        pass
@@ -1,12 +1,12 @@
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from decimal import Decimal
-from rules_engine.rules.base import Rule
+from rules_engine.rules.base import ThresholdRule
 from rules_engine.registrator import register_rule
 from models.enums import Statuses
 
 @register_rule
-class BudgetRule(Rule):
+class BudgetRule(ThresholdRule):
     def __init__(self):
         self._details = ""
     
@@ -18,6 +18,19 @@ class BudgetRule(Rule):
     def priority(self) -> int:
         return 4
     
+    @property
+    def metric_field(self) -> str:
+        return "spend_today"
+    
+    @property
+    def threshold_field(self) -> str:
+        return "budget_limit"
+    
+    def breached(self, value: Optional[Decimal], threshold: Optional[Decimal]) -> bool:
+        if threshold is None:
+            return False
+        return (value or Decimal('0')) > threshold
+    
     async def evaluate(
         self,
         campaign_data: Dict[str, Any],
@@ -27,10 +40,7 @@ class BudgetRule(Rule):
         budget_limit = campaign_data.get('budget_limit')
         spend_today = campaign_data.get('spend_today', Decimal('0'))
         
-        if budget_limit is None:
-            return None
-        
-        if spend_today > budget_limit:
+        if self.breached(spend_today, budget_limit):
             self._details = (
                 f"Расход за сегодня {spend_today} руб. "
                 f"превышает дневной лимит в {budget_limit} руб."
@@ -2,6 +2,7 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime, time
 from rules_engine.rules.base import Rule
 from rules_engine.registrator import register_rule
+from rules_engine.schedule import CompiledSchedule
 from models.enums import Statuses
 
 @register_rule
@@ -27,7 +28,10 @@ class ScheduleRule(Rule):
         if not campaign_data.get('schedule_enabled', False):
             return None
         
-        if not schedules:
+        # Расписания шаблонов приходят уже скомпилированными и общими для всех кампаний шаблона
+        schedule = schedules if isinstance(schedules, CompiledSchedule) else CompiledSchedule(schedules or [])
+        
+        if not schedule:
             self._details = f"У компании (id: {campaign_data.get('campaign_id')}) включено управление по расписанию, но отсутствует расписание"
             return Statuses.PAUSED
         
@@ -35,25 +39,11 @@ class ScheduleRule(Rule):
         current_day = current_time.weekday()
         current_time_only = current_time.time()
         
-        today_slots = [
-            slot for slot in schedules 
-            if slot['day_of_week'] == current_day
-        ]
-        
-        if not today_slots:
+        if not schedule.has_day(current_day):
             self._details = f"Нет активных слотов на сегодня (день недели: {current_day})"
             return Statuses.PAUSED
         
-        in_active_slot = False
-        for slot in today_slots:
-            start = slot['start_time']
-            end = slot['end_time']
-            
-            if start <= current_time_only <= end:
-                in_active_slot = True
-                break
-        
-        if not in_active_slot:
+        if not schedule.is_open(current_day, current_time_only):
             self._details = f"Текущее время: {current_time_only.strftime('%H:%M')}, день недели: {current_day} --- вне активного окна."
             return Statuses.PAUSED
         
@@ -1,11 +1,11 @@
 from typing import Dict, Any, List, Optional
 from datetime import datetime
-from rules_engine.rules.base import Rule
+from rules_engine.rules.base import ThresholdRule
 from rules_engine.registrator import register_rule
 from models.enums import Statuses
 
 @register_rule
-class StockRule(Rule):
+class StockRule(ThresholdRule):
     
     def __init__(self):
         self._details = ""
@@ -18,6 +18,20 @@ class StockRule(Rule):
     def priority(self) -> int:
         return 3
     
+    @property
+    def metric_field(self) -> str:
+        return "stock_days_left"
+    
+    @property
+    def threshold_field(self) -> str:
+        return "stock_days_min"
+    
+    def breached(self, value: Optional[int], threshold: Optional[int]) -> bool:
+        # Если stock_days_left не задан, считаю что остатки есть, хотя моментик тут спорный
+        if threshold is None or value is None:
+            return False
+        return value < threshold
+    
     async def evaluate(
         self,
         campaign_data: Dict[str, Any],
@@ -27,14 +41,7 @@ class StockRule(Rule):
         stock_days_min = campaign_data.get('stock_days_min')
         stock_days_left = campaign_data.get('stock_days_left')
         
-        if stock_days_min is None:
-            return None
-        
-        # Если stock_days_left не задан, считаю что остатки есть, хотя моментик тут спорный
-        if stock_days_left is None:
-            return None
-        
-        if stock_days_left < stock_days_min:
+        if self.breached(stock_days_left, stock_days_min):
             self._details = (
                 f"Остатков хватит на {stock_days_left} дней, "
                 f"что меньше минимального порога в {stock_days_min} дней"
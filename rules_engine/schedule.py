@@ -0,0 +1,53 @@
+from bisect import bisect_right
+from typing import Dict, Any, List, Tuple, Optional, Iterator
+from datetime import time
+
+
+class CompiledSchedule:
+    """
+    Индекс занятости недели: по каждому дню отсортированные и слитые окна слотов.
+    Проверка момента - бинарный поиск по окнам дня. Строится один раз на набор слотов
+    и переиспользуется всеми кампаниями, которые на него ссылаются (шаблоны расписаний).
+    """
+    
+    def __init__(self, slots: List[Dict[str, Any]]):
+        self.slots = slots
+        # Готовый к записи в лог снапшот слотов, заполняется при первой записи
+        self.snapshot: Optional[List[Dict[str, Any]]] = None
+        
+        by_day: Dict[int, List[Tuple[time, time]]] = {}
+        for slot in slots:
+            by_day.setdefault(slot['day_of_week'], []).append((slot['start_time'], slot['end_time']))
+        
+        self._starts: Dict[int, List[time]] = {}
+        self._ends: Dict[int, List[time]] = {}
+        for day, windows in by_day.items():
+            starts, ends = [], []
+            for start, end in sorted(windows):
+                # Границы слота включительные, поэтому смыкающиеся окна тоже сливаются
+                if ends and start <= ends[-1]:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self._starts[day] = starts
+            self._ends[day] = ends
+    
+    def __bool__(self) -> bool:
+        return bool(self.slots)
+    
+    def __len__(self) -> int:
+        return len(self.slots)
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.slots)
+    
+    def has_day(self, day_of_week: int) -> bool:
+        return day_of_week in self._starts
+    
+    def is_open(self, day_of_week: int, moment: time) -> bool:
+        starts = self._starts.get(day_of_week)
+        if not starts:
+            return False
+        position = bisect_right(starts, moment) - 1
+        return position >= 0 and moment <= self._ends[day_of_week][position]
@@ -8,12 +8,24 @@ import os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+# Фоновые задачи lifespan ходят в боевую базу, в тестах они выключены
+os.environ.setdefault("LOG_MAINTENANCE_INTERVAL_SECONDS", "0")
+os.environ.setdefault("SPEND_RESET_INTERVAL_SECONDS", "0")
+os.environ.setdefault("FLEET_SUMMARY_RECONCILE_SECONDS", "0")
+os.environ.setdefault("STATUS_STREAM_POLL_SECONDS", "0")
+# Без канала слушатель LISTEN не запускается: он ходил бы в боевую базу и выключал кэш кампаний
+os.environ.setdefault("CACHE_INVALIDATION_CHANNEL", "")
+
 from fastapi.testclient import TestClient
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy import event, text
+from sqlalchemy.pool import StaticPool, NullPool
 
 from app.main import app
-from database.config import get_db
+from database.config import get_db, get_read_db, ReplicaRouter, READ_REPLICA_KEY
+from app.api.dependencies import get_metrics_buffer, get_read_router
+from app.services.ingestion_service import MetricsBuffer
+from app.services.fleet_summary import FleetSummary, fleet_summary as process_fleet_summary
 from models.Base import Base
 from models.Campaign import Campaign
 from models.enums import Statuses
@@ -42,6 +54,20 @@ async def override_get_db() -> AsyncGenerator[AsyncSession, None]:
 
 app.dependency_overrides[get_db] = override_get_db
 
+# Реплика в тестах - та же база через отдельную фабрику сессий, как при READ_REPLICA_URL = адрес основной базы
+AsyncTestingReplicaSessionLocal = async_sessionmaker(
+    test_engine, class_=AsyncSession, expire_on_commit=False, info={READ_REPLICA_KEY: True}
+)
+test_read_router = ReplicaRouter(AsyncTestingSessionLocal, AsyncTestingReplicaSessionLocal)
+
+async def override_get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    session_factory = await test_read_router.session_factory()
+    async with session_factory() as session:
+        yield session
+
+app.dependency_overrides[get_read_db] = override_get_read_db
+app.dependency_overrides[get_read_router] = lambda: test_read_router
+
 @pytest.fixture(scope="session")
 def event_loop() -> Generator:
     loop = asyncio.get_event_loop_policy().new_event_loop()
@@ -61,6 +87,66 @@ async def db_session() -> AsyncGenerator[AsyncSession, None]:
     async with test_engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
 
+@pytest.fixture
+def explain(db_session: AsyncSession):
+    """План запроса сервиса в виде текста (EXPLAIN QUERY PLAN для sqlite, EXPLAIN для Postgres)"""
+    async def _explain(stmt) -> str:
+        dialect = db_session.bind.dialect
+        sql = str(stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+        if dialect.name == "postgresql":
+            # На маленьких тестовых таблицах seq scan всегда дешевле, проверяю именно применимость индекса
+            await db_session.execute(text("SET LOCAL enable_seqscan = off"))
+            result = await db_session.execute(text(f"EXPLAIN {sql}"))
+            return "\n".join(row[0] for row in result)
+        result = await db_session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+        return "\n".join(row[-1] for row in result)
+    return _explain
+
+@pytest.fixture
+async def isolated_session_factory(tmp_path) -> AsyncGenerator[async_sessionmaker, None]:
+    """
+    Файловая sqlite-база, где у каждой сессии свое соединение и своя транзакция.
+    Нужна для тестов нескольких воркеров в одном процессе.
+    """
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'workers.sqlite3'}",
+        connect_args={"timeout": 30},
+        poolclass=NullPool
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def do_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def do_begin(conn):
+        # Писатели сериализуются, как при блокировках строк в Postgres
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+@pytest.fixture
+def metrics_buffer() -> Generator[MetricsBuffer, None, None]:
+    """Буфер метрик, который пишет в тестовую базу; сбрасывается вручную через client.portal"""
+    buffer = MetricsBuffer(session_factory=AsyncTestingSessionLocal)
+    app.dependency_overrides[get_metrics_buffer] = lambda: buffer
+    yield buffer
+    del app.dependency_overrides[get_metrics_buffer]
+
+@pytest.fixture
+def fleet_summary() -> Generator[FleetSummary, None, None]:
+    """Сводка процесса, очищенная под базу теста: первое чтение сверит ее заново"""
+    process_fleet_summary.clear()
+    yield process_fleet_summary
+    process_fleet_summary.clear()
+
+@pytest.fixture
+def read_router() -> ReplicaRouter:
+    return test_read_router
+
 @pytest.fixture(scope="function")
 def client(db_session: AsyncSession) -> Generator:
     with TestClient(app) as test_client:
@@ -1,3 +1,15 @@
+import json
+import uuid
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from app.api.pagination import encode_cursor
+from app.api.responses import CampaignsListResponse, EvaluationHistoryResponse
+from app.api.routers import metrics as metrics_router
+from app.services.campaign_cache import campaign_cache
+from app.services.status_changes import status_feed
+
+
 class TestCampaignAPISimple:
     def test_root_endpoint(self, client):
         """Тест корневого эндпоинта"""
@@ -34,6 +46,22 @@ class TestCampaignAPISimple:
         assert data["id"] == str(campaign_in_db.id)
         assert data["name"] == campaign_in_db.name
     
+    def test_get_campaign_is_cached_until_patch(self, client, campaign_in_db, read_router):
+        """Повторное чтение берется из кэша кампаний, PATCH сбрасывает запись"""
+        url = f"/campaigns/{campaign_in_db.id}"
+        # Без реплики чтения идут в основную базу и заполняют кэш (чтения с реплики его не заполняют)
+        with patch.object(read_router, "replica", None):
+            client.get(url)
+            hits, invalidations = campaign_cache.hits, campaign_cache.invalidations
+            assert client.get(url).json()["budget_limit"] == "1000.00"
+            assert campaign_cache.hits == hits + 1
+            
+            client.patch(url, json={"budget_limit": 2000})
+            assert campaign_cache.invalidations == invalidations + 1
+            assert client.get(url).json()["budget_limit"] == "2000.00"
+            assert client.get(url).json()["budget_limit"] == "2000.00"
+            assert campaign_cache.hits == hits + 2
+    
     def test_update_campaign(self, client, campaign_in_db):
         """Тест обновления кампании"""
         update_data = {
@@ -97,6 +125,37 @@ class TestScheduleAPI:
         assert len(data["slots"]) == 0
 
 
+class TestScheduleTemplatesAPI:
+
+    def test_template_is_attached_in_bulk(self, client, campaign_in_db, sample_schedule_data):
+        client.put(f"/campaigns/{campaign_in_db.id}/schedule", json=sample_schedule_data)
+        response = client.post("/schedule-templates", json={"name": "Будни", "slots": sample_schedule_data[:1]})
+        assert response.status_code == 201
+        template_id = response.json()["id"]
+        
+        unknown_id = str(uuid.uuid4())
+        response = client.post(
+            f"/schedule-templates/{template_id}/campaigns",
+            json={"campaign_ids": [str(campaign_in_db.id), unknown_id]}
+        )
+        data = response.json()
+        assert (data["attached"], data["not_found"]) == (1, [unknown_id])
+        
+        schedule = client.get(f"/campaigns/{campaign_in_db.id}/schedule").json()
+        assert schedule["schedule_template_id"] == template_id
+        assert len(schedule["slots"]) == 1
+        assert client.get(f"/schedule-templates/{template_id}").json()["campaigns"] == 1
+        
+        assert client.delete(f"/schedule-templates/{template_id}").status_code == 409
+        client.put(f"/campaigns/{campaign_in_db.id}/schedule", json=sample_schedule_data)
+        assert client.delete(f"/schedule-templates/{template_id}").status_code == 200
+    
+    def test_duplicate_template_name_conflicts(self, client, sample_schedule_data):
+        body = {"name": "Выходные", "slots": sample_schedule_data}
+        assert client.post("/schedule-templates", json=body).status_code == 201
+        assert client.post("/schedule-templates", json=body).status_code == 409
+
+
 class TestEvaluationAPI:
     
     def test_evaluate_campaign_dry_run(self, client, campaign_in_db):
@@ -129,6 +188,31 @@ class TestEvaluationAPI:
         assert "results" in data
         assert isinstance(data["results"], list)
     
+    def test_evaluate_batch_by_ids_and_filter(self, client, campaign_in_db, sample_campaign_data):
+        """Явный список сужается фильтром, отсутствующие и неподходящие id возвращаются отдельно"""
+        unbudgeted = client.post("/campaigns/", json={**sample_campaign_data, "budget_limit": None}).json()
+        missing = str(uuid.uuid4())
+        
+        response = client.post(
+            "/campaigns/evaluate-batch",
+            params={"dry_run": True},
+            json={"campaign_ids": [str(campaign_in_db.id), unbudgeted["id"], missing], "filter": {"has_budget": True}}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["matched"] == 1
+        assert [result["campaign_id"] for result in data["results"]] == [str(campaign_in_db.id)]
+        assert set(data["not_matched"]) == {unbudgeted["id"], missing}
+        
+        response = client.post("/campaigns/evaluate-batch", json={"filter": {"needs_sync": True}})
+        assert response.status_code == 200
+        assert response.json()["evaluated"] == 2
+        history = client.get(f"/campaigns/{unbudgeted['id']}/evaluation-history").json()
+        assert history["total"] == 1
+    
+    def test_evaluate_batch_requires_selection(self, client):
+        assert client.post("/campaigns/evaluate-batch", json={}).status_code == 422
+    
     def test_evaluation_history(self, client, campaign_in_db):
         """Тест получения истории оценок"""
         client.post(f"/campaigns/{campaign_in_db.id}/evaluate", params={"dry_run": False})
@@ -143,4 +227,397 @@ class TestEvaluationAPI:
         
         assert "entries" in data
         assert "total" in data
-        assert isinstance(data["entries"], list)
\ No newline at end of file
+        assert isinstance(data["entries"], list)
+
+
+class TestCursorPagination:
+
+    def test_campaigns_cursor_walks_all_pages(self, client, sample_campaign_data):
+        """Курсор проходит весь список без пропусков и повторов, total можно отключить"""
+        created = []
+        for i in range(5):
+            response = client.post("/campaigns", json={**sample_campaign_data, "name": f"Paged {i}"})
+            created.append(response.json()["id"])
+        
+        seen = []
+        params = {"limit": 2, "count": "none"}
+        while True:
+            data = client.get("/campaigns", params=params).json()
+            assert data["total"] is None
+            seen.extend(campaign["id"] for campaign in data["campaigns"])
+            if not data["next_cursor"]:
+                break
+            params["after"] = data["next_cursor"]
+        
+        assert seen == sorted(created)
+    
+    def test_skip_still_works(self, client, sample_campaign_data):
+        """Старый skip по-прежнему работает и возвращает точный total"""
+        for i in range(3):
+            client.post("/campaigns", json={**sample_campaign_data, "name": f"Skipped {i}"})
+        
+        data = client.get("/campaigns", params={"skip": 2, "limit": 10}).json()
+        assert data["total"] == 3
+        assert len(data["campaigns"]) == 1
+    
+    def test_invalid_cursor_is_rejected(self, client):
+        response = client.get("/campaigns", params={"after": "not-a-cursor"})
+        assert response.status_code == 400
+    
+    def test_history_cursor_walks_all_pages(self, client, campaign_in_db):
+        """История листается курсором от новых записей к старым"""
+        for _ in range(5):
+            client.post(f"/campaigns/{campaign_in_db.id}/evaluate", params={"dry_run": False})
+        
+        seen = []
+        params = {"limit": 2}
+        while True:
+            data = client.get(f"/campaigns/{campaign_in_db.id}/evaluation-history", params=params).json()
+            assert data["total"] == 5
+            seen.extend(entry["created_at"] for entry in data["entries"])
+            if not data["next_cursor"]:
+                break
+            params["after"] = data["next_cursor"]
+        
+        assert len(seen) == 5
+        assert seen == sorted(seen, reverse=True)
+
+
+class TestCountModes:
+
+    def test_count_mode_is_reported(self, client, sample_campaign_data):
+        """В ответе виден режим, которым посчитан total"""
+        client.post("/campaigns", json=sample_campaign_data)
+        
+        exact = client.get("/campaigns").json()
+        assert exact["count_mode"] == "exact" and exact["total"] == 1
+        
+        none = client.get("/campaigns", params={"count": "none"}).json()
+        assert none["count_mode"] == "none" and none["total"] is None
+    
+    def test_estimated_history_count_comes_from_counter(self, client, campaign_in_db):
+        """estimated для истории берется из счетчика кампании, без COUNT(*) по логу"""
+        for _ in range(3):
+            client.post(f"/campaigns/{campaign_in_db.id}/evaluate", params={"dry_run": False})
+        client.post(f"/campaigns/{campaign_in_db.id}/evaluate", params={"dry_run": True})
+        
+        data = client.get(
+            f"/campaigns/{campaign_in_db.id}/evaluation-history",
+            params={"count": "estimated", "limit": 1}
+        ).json()
+        assert data["count_mode"] == "estimated"
+        assert data["total"] == 3
+
+
+class TestBulkImport:
+
+    def test_ndjson_import_reports_row_errors(self, client):
+        """Сломанные строки попадают в отчет, остальные создаются"""
+        body = "\n".join([
+            '{"name": "Bulk A", "is_managed": true, "budget_limit": 100}',
+            '{"name": "Bulk B", "stock_days_left": 1000}',
+            'not json',
+            '{"name": "Bulk A"}',
+            '',
+            '{"name": "Bulk C", "current_status": "active"}',
+        ])
+        response = client.post(
+            "/campaigns/bulk",
+            content=body.encode(),
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["received"] == 5
+        assert data["created"] == 2
+        assert data["failed"] == 3
+        assert [error["row"] for error in data["errors"]] == [2, 3, 4]
+        assert "stock_days_left" in data["errors"][0]["error"]
+        
+        names = {c["name"] for c in client.get("/campaigns").json()["campaigns"]}
+        assert names == {"Bulk A", "Bulk C"}
+    
+    def test_csv_upsert_updates_existing_by_name(self, client, campaign_in_db):
+        """CSV с существующим name обновляет кампанию и помечает ее входные данные измененными"""
+        body = (
+            "name,budget_limit,spend_today\n"
+            f"{campaign_in_db.name},50,\n"
+            "Bulk New,10,5\n"
+        )
+        response = client.post("/campaigns/bulk", content=body.encode(), headers={"Content-Type": "text/csv"})
+        
+        data = response.json()
+        assert (data["created"], data["updated"], data["failed"]) == (1, 1, 0)
+        
+        updated = client.get(f"/campaigns/{campaign_in_db.id}").json()
+        assert float(updated["budget_limit"]) == 50
+        assert float(updated["spend_today"]) == 500
+    
+    def test_skip_mode_keeps_existing(self, client, campaign_in_db):
+        response = client.post(
+            "/campaigns/bulk",
+            params={"on_conflict": "skip", "format": "ndjson"},
+            content=f'{{"name": "{campaign_in_db.name}", "budget_limit": 1}}'.encode()
+        )
+        
+        data = response.json()
+        assert (data["created"], data["skipped"], data["failed"]) == (0, 1, 0)
+        assert float(client.get(f"/campaigns/{campaign_in_db.id}").json()["budget_limit"]) == 1000
+
+
+class TestMetricsIngest:
+
+    def test_updates_are_coalesced_and_flushed(self, client, campaign_in_db, metrics_buffer):
+        """Несколько обновлений одной кампании схлопываются до последних значений"""
+        campaign_id = str(campaign_in_db.id)
+        response = client.post("/metrics/ingest", json=[
+            {"campaign_id": campaign_id, "spend_today": 100},
+            {"campaign_id": campaign_id, "stock_days_left": 3},
+            {"campaign_id": campaign_id, "spend_today": 250.5},
+            {"campaign_id": campaign_id, "spend_today": -1},
+        ])
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["accepted"], data["rejected"], data["pending_campaigns"]) == (3, 1, 1)
+        assert data["errors"][0]["row"] == 4
+        
+        assert client.portal.call(metrics_buffer.flush) == 1
+        campaign = client.get(f"/campaigns/{campaign_id}").json()
+        assert float(campaign["spend_today"]) == 250.5
+        assert campaign["stock_days_left"] == 3
+        assert metrics_buffer.stats()["coalesced"] == 2
+    
+    def test_flushed_without_periodic_flush_writes_immediately(self, client, campaign_in_db, metrics_buffer):
+        """Без периодического сброса режим flushed сбрасывает буфер сам, а не ждет вечно"""
+        campaign_id = str(campaign_in_db.id)
+        with patch.object(metrics_router, "METRICS_FLUSH_INTERVAL_SECONDS", 0):
+            response = client.post(
+                "/metrics/ingest?durability=flushed",
+                json=[{"campaign_id": campaign_id, "stock_days_left": 7}]
+            )
+        
+        assert response.status_code == 200
+        assert (response.json()["flushed_campaigns"], response.json()["pending_campaigns"]) == (1, 0)
+        assert client.get(f"/campaigns/{campaign_id}").json()["stock_days_left"] == 7
+    
+    def test_ndjson_body_is_accepted(self, client, campaign_in_db, metrics_buffer):
+        body = f'{{"campaign_id": "{campaign_in_db.id}", "spend_today": 10}}\n\n'
+        response = client.post(
+            "/metrics/ingest",
+            content=body.encode(),
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        assert response.json()["accepted"] == 1
+    
+    def test_threshold_change_reloads_index(self, client, campaign_in_db, metrics_buffer):
+        """Новый порог из PATCH не дает индексу пропустить пересечение"""
+        campaign_id = str(campaign_in_db.id)
+        client.post("/metrics/ingest", json=[{"campaign_id": campaign_id, "spend_today": 600}])
+        client.portal.call(metrics_buffer.flush)
+        assert campaign_in_db.id in metrics_buffer.thresholds
+        
+        client.patch(f"/campaigns/{campaign_id}", json={"budget_limit": 700})
+        assert campaign_in_db.id not in metrics_buffer.thresholds
+        
+        client.post("/metrics/ingest", json=[{"campaign_id": campaign_id, "spend_today": 800}])
+        client.portal.call(metrics_buffer.flush)
+        assert metrics_buffer.stats()["evaluated"] == 1
+        assert client.get(f"/campaigns/{campaign_id}").json()["target_status"] == "paused"
+    
+    def test_full_buffer_applies_backpressure(self, client, metrics_buffer):
+        metrics_buffer.max_campaigns = 1
+        response = client.post("/metrics/ingest", json=[
+            {"campaign_id": str(uuid.uuid4()), "spend_today": 1},
+            {"campaign_id": str(uuid.uuid4()), "spend_today": 1},
+        ])
+        
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+        assert metrics_buffer.pending == {}
+
+
+class TestReadReplica:
+
+    def test_reads_use_replica_until_lag_exceeds_limit(self, client, campaign_in_db, read_router):
+        """Чтения и dry-run идут в реплику, при отставании сверх лимита - в основную базу"""
+        replica_reads = read_router.replica_reads
+        assert client.get(f"/campaigns/{campaign_in_db.id}").status_code == 200
+        assert client.get(f"/campaigns/{campaign_in_db.id}/evaluation-history").status_code == 200
+        assert read_router.replica_reads == replica_reads + 2
+        
+        fallbacks = read_router.primary_fallbacks
+        with patch.object(read_router, "lag", read_router.max_lag_seconds + 1), \
+                patch.object(read_router, "checked_at", float("inf")):
+            response = client.get(f"/campaigns/{campaign_in_db.id}/schedule")
+        assert response.status_code == 200
+        assert read_router.primary_fallbacks == fallbacks + 1
+    
+    def test_replica_is_opened_only_for_dry_run(self, client, campaign_in_db, read_router):
+        """Оценка с записью не открывает сессию реплики и не проверяет ее отставание"""
+        replica_reads = read_router.replica_reads
+        client.post(f"/campaigns/{campaign_in_db.id}/evaluate", params={"dry_run": False})
+        assert read_router.replica_reads == replica_reads
+        
+        client.post(f"/campaigns/{campaign_in_db.id}/evaluate", params={"dry_run": True})
+        assert read_router.replica_reads == replica_reads + 1
+
+
+class TestFleetSummary:
+
+    def test_summary_follows_evaluation_and_sync(self, client, campaign_in_db, sample_campaign_data, fleet_summary):
+        """Сводка обновляется оценкой и подтверждением синхронизации без пересчета по базе"""
+        over_budget = client.post("/campaigns/", json={
+            **sample_campaign_data, "target_status": "active", "spend_today": 1500.00
+        }).json()
+        summary = client.get("/fleet/summary").json()
+        assert summary["total"] == 2
+        assert summary["needs_sync"] == 1
+        reconciliations = fleet_summary.reconciliations
+        
+        assert client.post(f"/campaigns/{over_budget['id']}/evaluate").status_code == 200
+        assert client.post(f"/campaigns/{campaign_in_db.id}/evaluate").status_code == 200
+        summary = client.get("/fleet/summary").json()
+        assert summary["by_target_status"] == {"active": 1, "paused": 1}
+        assert summary["blocked_by_rule"] == {"budget_exceeded": 1}
+        assert summary["needs_sync"] == 1
+        
+        client.patch(f"/campaigns/{over_budget['id']}", json={"current_status": "paused"})
+        summary = client.get("/fleet/summary").json()
+        assert summary["by_current_status"] == {"active": 1, "paused": 1}
+        assert summary["needs_sync"] == 0
+        assert fleet_summary.reconciliations == reconciliations
+    
+    def test_bulk_import_triggers_reconciliation(self, client, fleet_summary):
+        """Пакетный импорт не знает прежних статусов, сводка сверяется с базой при следующем чтении"""
+        assert client.get("/fleet/summary").json()["total"] == 0
+        reconciliations = fleet_summary.reconciliations
+        rows = "\n".join(f'{{"name": "Imported {n}", "current_status": "paused"}}' for n in range(3))
+        client.post("/campaigns/bulk", content=rows, headers={"Content-Type": "application/x-ndjson"})
+        
+        summary = client.get("/fleet/summary").json()
+        assert summary["total"] == 3
+        assert summary["by_current_status"]["paused"] == 3
+        assert fleet_summary.reconciliations == reconciliations + 1
+
+
+class TestConditionalRequests:
+
+    def test_if_none_match_returns_304_until_campaign_changes(self, client, campaign_in_db):
+        url = f"/campaigns/{campaign_in_db.id}"
+        etag = client.get(url).headers["ETag"]
+        
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+        
+        schedule_etag = client.get(f"{url}/schedule").headers["ETag"]
+        assert client.get(f"{url}/schedule", headers={"If-None-Match": schedule_etag}).status_code == 304
+        
+        client.patch(url, json={"budget_limit": 2000})
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert client.get(f"{url}/schedule", headers={"If-None-Match": schedule_etag}).status_code == 200
+    
+    def test_evaluation_without_changes_keeps_etag(self, client, campaign_in_db):
+        """Оценка, не изменившая target_status, не сбрасывает ETag"""
+        url = f"/campaigns/{campaign_in_db.id}"
+        client.post(f"{url}/evaluate")
+        etag = client.get(url).headers["ETag"]
+        client.post(f"{url}/evaluate")
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    
+    def test_if_match_guards_writes(self, client, campaign_in_db, sample_schedule_data):
+        url = f"/campaigns/{campaign_in_db.id}"
+        etag = client.get(url).headers["ETag"]
+        
+        response = client.patch(url, json={"budget_limit": 2000}, headers={"If-Match": etag})
+        assert response.status_code == 200
+        new_etag = response.headers["ETag"]
+        
+        response = client.patch(url, json={"budget_limit": 3000}, headers={"If-Match": etag})
+        assert response.status_code == 412
+        assert client.get(url).json()["budget_limit"] == "2000.00"
+        
+        response = client.put(f"{url}/schedule", json=sample_schedule_data, headers={"If-Match": etag})
+        assert response.status_code == 412
+        response = client.put(f"{url}/schedule", json=sample_schedule_data, headers={"If-Match": new_etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] == client.get(url).headers["ETag"] != new_etag
+
+
+class TestPageSerialization:
+
+    def test_list_and_history_match_response_models(self, client, campaign_in_db):
+        """Быстрый путь отдает те же байты, что и сериализация через модели ответа"""
+        client.post(f"/campaigns/{campaign_in_db.id}/evaluate", params={"dry_run": False})
+        
+        response = client.get("/campaigns", params={"limit": 10})
+        assert response.headers["content-type"] == "application/json"
+        page = CampaignsListResponse.model_validate_json(response.content)
+        assert page.campaigns[0].id == campaign_in_db.id
+        assert response.json() == page.model_dump(mode="json")
+        
+        response = client.get(f"/campaigns/{campaign_in_db.id}/evaluation-history")
+        history = EvaluationHistoryResponse.model_validate_json(response.content)
+        assert history.entries[0].context["campaign_snapshot"]["name"] == campaign_in_db.name
+        assert response.json() == history.model_dump(mode="json")
+
+    def test_fields_limit_payload(self, client, campaign_in_db):
+        """?fields= оставляет в ответе только запрошенные поля, у проекции свой ETag"""
+        client.post(f"/campaigns/{campaign_in_db.id}/evaluate", params={"dry_run": False})
+        
+        full, = client.get("/campaigns").json()["campaigns"]
+        data = client.get("/campaigns", params={"fields": "target_status,needs_sync"}).json()
+        assert data["campaigns"] == [{"target_status": full["target_status"], "needs_sync": full["needs_sync"]}]
+        
+        url = f"/campaigns/{campaign_in_db.id}"
+        response = client.get(url, params={"fields": "id,target_status"})
+        assert response.json() == {"id": str(campaign_in_db.id), "target_status": full["target_status"]}
+        etag = response.headers["ETag"]
+        assert etag != client.get(url).headers["ETag"]
+        assert client.get(url, params={"fields": "target_status,id"}, headers={"If-None-Match": etag}).status_code == 304
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+        
+        entry, = client.get(f"{url}/evaluation-history", params={"fields": "new_target"}).json()["entries"]
+        assert list(entry) == ["new_target"]
+        
+        assert client.get(url, params={"fields": "id,secret"}).status_code == 400
+        assert client.get("/campaigns", params={"fields": "budget_limit"}).status_code == 400
+
+
+class TestStatusChangeStream:
+
+    def test_reconnect_replays_missed_changes(self, client, campaign_in_db, monkeypatch):
+        """Подключение с токеном сначала досылает пропущенные смены target_status"""
+        subscribe = status_feed.subscribe
+        
+        def closing_subscribe():
+            # TestClient дочитывает ответ целиком: поток закрывается сразу после досылки
+            subscription = subscribe()
+            subscription.queue.put_nowait(None)
+            return subscription
+        
+        monkeypatch.setattr(status_feed, "running", True)
+        monkeypatch.setattr(status_feed, "subscribe", closing_subscribe)
+        client.patch(f"/campaigns/{campaign_in_db.id}", json={"target_status": "active", "spend_today": 1500})
+        client.post(f"/campaigns/{campaign_in_db.id}/evaluate")
+        
+        start = encode_cursor(datetime(2000, 1, 1, tzinfo=timezone.utc), uuid.UUID(int=0))
+        response = client.get("/campaigns/changes/stream", headers={"Last-Event-ID": start})
+        assert response.headers["content-type"].startswith("text/event-stream")
+        event_id, event_type, data = response.text.split("\n\n")[0].split("\n")
+        change = json.loads(data[len("data: "):])
+        assert event_type == "event: target_status"
+        assert (change["campaign_id"], change["new_target"], change["triggered_rule"]) == \
+            (str(campaign_in_db.id), "paused", "budget_exceeded")
+        assert status_feed.subscriptions == set()
+        
+        response = client.get("/campaigns/changes/stream", params={"after": event_id[len("id: "):]})
+        assert response.text == ""
+    
+    def test_stream_requires_running_feed(self, client):
+        assert client.get("/campaigns/changes/stream").status_code == 503
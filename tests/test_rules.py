@@ -3,6 +3,7 @@ from datetime import datetime, time
 from decimal import Decimal
 from unittest.mock import patch
 from models.enums import Statuses
+from rules_engine.schedule import CompiledSchedule
 
 
 class TestRulesSimple:
@@ -194,4 +195,23 @@ class TestRulesSimple:
             current_time=None
         )
         
-        assert result is None
\ No newline at end of file
+        assert result is None
+    
+    
+    def test_compiled_schedule_merges_adjacent_windows(self):
+        """Смыкающиеся и вложенные слоты сливаются в одно окно, границы включительные"""
+        
+        schedule = CompiledSchedule([
+            {"day_of_week": 0, "start_time": time(12, 0), "end_time": time(18, 0)},
+            {"day_of_week": 0, "start_time": time(9, 0), "end_time": time(12, 0)},
+            {"day_of_week": 0, "start_time": time(10, 0), "end_time": time(11, 0)},
+            {"day_of_week": 0, "start_time": time(20, 0), "end_time": time(21, 0)},
+        ])
+        
+        assert schedule.has_day(0) and not schedule.has_day(1)
+        assert schedule.is_open(0, time(9, 0))
+        assert schedule.is_open(0, time(12, 0))
+        assert schedule.is_open(0, time(18, 0))
+        assert not schedule.is_open(0, time(19, 0))
+        assert schedule.is_open(0, time(20, 30))
+        assert not schedule.is_open(0, time(8, 59))
@@ -0,0 +1,1007 @@
+import asyncio
+import json
+import time
+import uuid
+import pytest
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import patch
+from sqlalchemy import select, update, delete, func, tuple_, event
+from sqlalchemy.dialects import postgresql
+
+from app.services import campaign_service as campaign_service_module
+from app.services.campaign_service import CampaignService, EVALUATION_FIELDS
+from app.services import log_partition_service
+from app.services import archive_service
+from app.services import evaluation_service as evaluation_service_module
+from app.services.evaluation_service import EvaluationService
+from app.services.sweep_service import SweepService, LeaseLostError
+from app.services.ingestion_service import MetricsBuffer, ThresholdIndex
+from app.services.schedule_template_service import ScheduleTemplateService
+from app.services.campaign_cache import CampaignCache, campaign_cache, CACHE_INVALIDATION_CHANNEL, PROCESS_ID
+from app.services.cache_invalidation import CacheInvalidationListener
+from app.services.spend_reset_service import SpendResetService
+from app.services.fleet_summary import reconcile
+from app.services.status_changes import StatusChangeFeed, read_changes
+from models.Campaign import Campaign
+from models.EvaluationSweep import EvaluationSweep
+from models.RuleEvaluationLog import RuleEvaluationLog
+from models.SweepChunk import SweepChunk
+from models.enums import Statuses, SweepMode, ChunkStatus, CountMode
+from models.schemas.campaignSchema import CampaignCreate, CampaignUpdate
+from models.schemas.evaluationBatchSchema import CampaignFilter
+from models.schemas.scheduleTemplateSchema import ScheduleTemplateCreate
+from models.schemas.campaignScheduleSchema import ScheduleSlotBase
+from rules_engine.engine import rule_engine
+
+
+async def create_campaigns(db_session, count: int, **overrides) -> list:
+    campaign_service = CampaignService(db_session)
+    campaigns = []
+    for _ in range(count):
+        data = {
+            "name": f"Campaign {uuid.uuid4().hex[:8]}",
+            "current_status": "active",
+            "target_status": "active",
+            "is_managed": True,
+            "budget_limit": 1000.00,
+            "spend_today": 500.00,
+            "stock_days_left": 10,
+            "stock_days_min": 5,
+            **overrides
+        }
+        campaigns.append(await campaign_service.create_campaign(CampaignCreate(**data)))
+    await db_session.commit()
+    return campaigns
+
+
+@contextmanager
+def recorded_statements(db_session):
+    """Первые слова SQL-запросов, отправленных в базу внутри блока"""
+    statements = []
+    
+    def record(conn, cursor, statement, *args):
+        statements.append(statement.split()[0])
+    
+    engine = db_session.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+class TestEvaluationPipeline:
+
+    async def test_stream_evaluation_inputs_returns_tuples(self, db_session):
+        """Core-путь отдает пачки кортежей, а не ORM-объекты"""
+        await create_campaigns(db_session, 5)
+        campaign_service = CampaignService(db_session)
+
+        chunks = [
+            rows async for rows in campaign_service.stream_evaluation_inputs(chunk_size=2)
+        ]
+
+        assert [len(rows) for rows in chunks] == [2, 2, 1]
+        row = chunks[0][0]
+        assert not isinstance(row, Campaign)
+        assert tuple(row._fields) == EVALUATION_FIELDS
+
+    async def test_evaluate_all_writes_logs_and_statuses(self, db_session):
+        """Пакетная оценка пишет лог по каждой кампании и обновляет target_status"""
+        over_budget = await create_campaigns(db_session, 2, spend_today=1500.00)
+        healthy = await create_campaigns(db_session, 1)
+        evaluation_service = EvaluationService(db_session)
+
+        result = await evaluation_service.evaluate_all_campaigns(current_time=datetime(2024, 1, 1, 12, 0))
+        await db_session.commit()
+
+        assert result["evaluated"] == 3
+        assert result["total_managed"] == 3
+
+        logs_count = await db_session.scalar(select(func.count()).select_from(RuleEvaluationLog))
+        assert logs_count == 3
+
+        for campaign in over_budget:
+            await db_session.refresh(campaign)
+            assert campaign.target_status == Statuses.PAUSED
+        await db_session.refresh(healthy[0])
+        assert healthy[0].target_status == Statuses.ACTIVE
+        assert healthy[0].spend_today == Decimal("500.00")
+
+
+class TestIncrementalSweep:
+
+    async def test_incremental_sweep_picks_only_dirty_campaigns(self, db_session):
+        """Инкрементальный прогон оценивает только кампании с изменившимися входными данными"""
+        campaigns = await create_campaigns(db_session, 3)
+        campaign_service = CampaignService(db_session)
+        evaluation_service = EvaluationService(db_session)
+
+        full = await evaluation_service.evaluate_all_campaigns(current_time=datetime(2024, 1, 1, 12, 0))
+        assert full["evaluated"] == 3
+
+        nothing = await evaluation_service.evaluate_all_campaigns(
+            current_time=datetime(2024, 1, 1, 12, 5), mode=SweepMode.INCREMENTAL
+        )
+        assert nothing["evaluated"] == 0
+
+        await campaign_service.update_campaign(campaigns[0].id, CampaignUpdate(budget_limit=100))
+        await campaign_service.ingest_metrics([{"campaign_id": campaigns[1].id, "spend_today": Decimal("10.00")}])
+
+        incremental = await evaluation_service.evaluate_all_campaigns(
+            current_time=datetime(2024, 1, 1, 12, 10), mode=SweepMode.INCREMENTAL
+        )
+        assert incremental["mode"] == SweepMode.INCREMENTAL
+        assert {r["campaign_id"] for r in incremental["results"]} == {campaigns[0].id, campaigns[1].id}
+        paused = next(r for r in incremental["results"] if r["campaign_id"] == campaigns[0].id)
+        assert paused["new_target_status"] == Statuses.PAUSED
+
+    async def test_incremental_sweep_picks_schedule_flips(self, db_session):
+        """Инкрементальный прогон подхватывает кампании, у которых началось окно расписания"""
+        campaigns = await create_campaigns(db_session, 2)
+        campaign_service = CampaignService(db_session)
+        evaluation_service = EvaluationService(db_session)
+        await campaign_service.set_campaign_schedule(
+            campaigns[0].id,
+            [{"day_of_week": 0, "start_time": "09:00:00", "end_time": "18:00:00"}]
+        )
+
+        # 2024-01-01 - понедельник
+        await evaluation_service.evaluate_all_campaigns(current_time=datetime(2024, 1, 1, 8, 0))
+
+        window_opened = await evaluation_service.evaluate_all_campaigns(
+            current_time=datetime(2024, 1, 1, 10, 0), mode=SweepMode.INCREMENTAL
+        )
+        assert [r["campaign_id"] for r in window_opened["results"]] == [campaigns[0].id]
+        assert window_opened["results"][0]["new_target_status"] == Statuses.ACTIVE
+
+        inside_window = await evaluation_service.evaluate_all_campaigns(
+            current_time=datetime(2024, 1, 1, 11, 0), mode=SweepMode.INCREMENTAL
+        )
+        assert inside_window["evaluated"] == 0
+
+
+class TestDistributedSweep:
+
+    async def test_workers_share_cycle_without_double_evaluation(self, isolated_session_factory):
+        """Несколько воркеров делят один цикл, каждая кампания оценивается ровно один раз"""
+        async with isolated_session_factory() as db_session:
+            await create_campaigns(db_session, 23)
+        current_time = datetime(2024, 1, 1, 12, 0)
+
+        async def worker(worker_id: str):
+            async with isolated_session_factory() as session:
+                sweep_service = SweepService(session, worker_id=worker_id, chunk_size=4, batch_size=2)
+                return await sweep_service.run_cycle(current_time=current_time, cycle_key="test-cycle")
+
+        results = await asyncio.gather(*(worker(f"worker-{i}") for i in range(3)))
+
+        assert sum(result["evaluated"] for result in results) == 23
+        assert sum(result["processed"] for result in results) == 23
+        assert sum(result["chunks_processed"] for result in results) == 6
+        assert all(result["total_managed"] is None for result in results)
+
+        async with isolated_session_factory() as db_session:
+            per_campaign = await db_session.execute(
+                select(RuleEvaluationLog.campaign_id, func.count()).group_by(RuleEvaluationLog.campaign_id)
+            )
+            counts = [count for _, count in per_campaign]
+            assert len(counts) == 23
+            assert set(counts) == {1}
+            assert await db_session.scalar(select(func.sum(SweepChunk.evaluated))) == 23
+
+            sweeps = await db_session.scalar(select(func.count()).select_from(EvaluationSweep))
+            assert sweeps == 1
+
+    async def test_expired_lease_is_reclaimed_and_old_owner_fenced(self, isolated_session_factory):
+        """Чанк с истекшей лизой перехватывается, старый владелец больше не может писать"""
+        async with isolated_session_factory() as db_session:
+            await create_campaigns(db_session, 3)
+        current_time = datetime(2024, 1, 1, 12, 0)
+
+        async with isolated_session_factory() as first_session, isolated_session_factory() as second_session:
+            stale = SweepService(first_session, worker_id="stale", lease_seconds=-1)
+            cycle = await stale.get_or_create_cycle("lease-cycle", current_time)
+            stale_chunk = await stale.claim_chunk(cycle)
+
+            fresh = SweepService(second_session, worker_id="fresh")
+            result = await fresh.run(cycle)
+            assert result["evaluated"] == 3
+
+            stale_chunk_id = stale_chunk.id
+            with pytest.raises(LeaseLostError):
+                await stale.heartbeat(stale_chunk)
+            await first_session.rollback()
+
+            chunk = await second_session.get(SweepChunk, stale_chunk_id, populate_existing=True)
+            assert chunk.status == ChunkStatus.DONE
+            assert chunk.lease_owner == "fresh"
+
+    async def test_lost_lease_keeps_results_of_committed_batches(self, isolated_session_factory):
+        """Пачки, закоммиченные до потери лизы, остаются в ответе реплики"""
+        async with isolated_session_factory() as db_session:
+            await create_campaigns(db_session, 3)
+
+        async with isolated_session_factory() as session:
+            sweep_service = SweepService(session, worker_id="lost", batch_size=1)
+            original = sweep_service.heartbeat
+            calls = []
+
+            async def heartbeat_then_lose(chunk, **kwargs):
+                calls.append(1)
+                if len(calls) == 2:
+                    raise LeaseLostError("перехвачен")
+                await original(chunk, **kwargs)
+
+            with patch.object(sweep_service, "heartbeat", side_effect=heartbeat_then_lose):
+                result = await sweep_service.run_cycle(current_time=datetime(2024, 1, 1, 12, 0), cycle_key="lost-cycle")
+
+        assert (result["processed"], result["evaluated"], result["chunks_processed"]) == (1, 1, 0)
+
+
+class TestOptimisticConcurrency:
+
+    def _patch_between_read_and_write(self, campaign_service, campaign_id):
+        """Подменяет движок правил так, чтобы во время первой оценки пришел конкурентный PATCH"""
+        original = rule_engine.evaluate_campaign
+        calls = []
+
+        async def evaluate_with_concurrent_patch(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                await campaign_service.update_campaign(campaign_id, CampaignUpdate(budget_limit=2000))
+            return await original(*args, **kwargs)
+
+        return patch.object(rule_engine, "evaluate_campaign", side_effect=evaluate_with_concurrent_patch)
+
+    async def test_single_evaluation_retries_on_version_conflict(self, db_session):
+        """Устаревший результат не перезаписывает конкурентный PATCH, кампания переоценивается"""
+        campaign, = await create_campaigns(db_session, 1, spend_today=1500.00)
+        campaign_service = CampaignService(db_session)
+        evaluation_service = EvaluationService(db_session)
+
+        with self._patch_between_read_and_write(campaign_service, campaign.id):
+            result = await evaluation_service.evaluate_single_campaign(campaign.id)
+
+        assert result["conflict_retries"] == 1
+        assert result["new_target_status"] == Statuses.ACTIVE
+        stored = await campaign_service.get_campaign(campaign.id)
+        await db_session.refresh(stored)
+        assert stored.target_status == Statuses.ACTIVE
+        assert stored.budget_limit == Decimal("2000.00")
+
+    async def test_single_evaluation_reads_once_and_writes_with_log(self, db_session):
+        """Кампания со слотами читается одним запросом, статус и лог пишутся вместе"""
+        campaign, = await create_campaigns(db_session, 1)
+        await CampaignService(db_session).set_campaign_schedule(campaign.id, [
+            {"day_of_week": 0, "start_time": "09:00:00", "end_time": "18:00:00"},
+            {"day_of_week": 1, "start_time": "09:00:00", "end_time": "18:00:00"}
+        ])
+        await db_session.commit()
+
+        with recorded_statements(db_session) as statements:
+            # 2024-01-01 - понедельник, вне окна расписания
+            result = await EvaluationService(db_session).evaluate_single_campaign(
+                campaign.id, current_time=datetime(2024, 1, 1, 20, 0)
+            )
+
+        assert result["new_target_status"] == Statuses.PAUSED
+        assert statements == ["SELECT", "UPDATE", "INSERT"]
+        logs = (await db_session.execute(select(RuleEvaluationLog))).scalars().all()
+        assert [entry.id for entry in logs] == [result["log_entry_id"]]
+        assert len(logs[0].context["schedule_snapshot"]) == 2
+
+    async def test_batch_evaluation_retries_only_conflicted_rows(self, db_session):
+        """В пакетной оценке переоцениваются только конфликтующие кампании, лог пишется один раз"""
+        conflicted, other = await create_campaigns(db_session, 2, spend_today=1500.00)
+        campaign_service = CampaignService(db_session)
+        evaluation_service = EvaluationService(db_session)
+
+        with self._patch_between_read_and_write(campaign_service, conflicted.id):
+            result = await evaluation_service.evaluate_all_campaigns(current_time=datetime(2024, 1, 1, 12, 0))
+
+        statuses = {r["campaign_id"]: r["new_target_status"] for r in result["results"]}
+        assert statuses == {conflicted.id: Statuses.ACTIVE, other.id: Statuses.PAUSED}
+
+        logs_count = await db_session.scalar(select(func.count()).select_from(RuleEvaluationLog))
+        assert logs_count == 2
+
+    async def test_conflicted_row_that_stopped_matching_is_not_reevaluated(self, db_session):
+        """Кампания, ставшая неуправляемой между чтением и записью, не переоценивается пакетным прогоном"""
+        conflicted, other = await create_campaigns(db_session, 2, spend_today=1500.00)
+        campaign_service = CampaignService(db_session)
+        original = rule_engine.evaluate_campaign
+        calls = []
+
+        async def evaluate_with_concurrent_unmanage(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                await campaign_service.update_campaign(conflicted.id, CampaignUpdate(is_managed=False))
+            return await original(*args, **kwargs)
+
+        with patch.object(rule_engine, "evaluate_campaign", side_effect=evaluate_with_concurrent_unmanage):
+            result = await EvaluationService(db_session).evaluate_all_campaigns(current_time=datetime(2024, 1, 1, 12, 0))
+
+        assert [r["campaign_id"] for r in result["results"]] == [other.id]
+        logged = (await db_session.execute(select(RuleEvaluationLog.campaign_id))).scalars().all()
+        assert logged == [other.id]
+
+    async def test_last_attempt_does_not_reread_conflicts(self, db_session):
+        """После последней попытки конфликтующие кампании помечаются ошибкой без лишнего чтения"""
+        campaign, = await create_campaigns(db_session, 1)
+        campaign_service = CampaignService(db_session)
+        evaluation_service = EvaluationService(db_session)
+        original = rule_engine.evaluate_campaign
+
+        async def evaluate_with_constant_patches(*args, **kwargs):
+            await campaign_service.ingest_metrics([{"campaign_id": campaign.id, "spend_today": Decimal("1.00")}])
+            return await original(*args, **kwargs)
+
+        rows = await campaign_service.get_evaluation_inputs(Campaign.id == campaign.id)
+        with patch.object(rule_engine, "evaluate_campaign", side_effect=evaluate_with_constant_patches), \
+                patch.object(
+                    evaluation_service.campaign_service, "get_evaluation_inputs",
+                    wraps=evaluation_service.campaign_service.get_evaluation_inputs
+                ) as reread:
+            result, = await evaluation_service.evaluate_rows(rows, current_time=datetime(2024, 1, 1, 12, 0))
+
+        assert result["success"] is False
+        assert reread.call_count == evaluation_service_module.OCC_MAX_RETRIES
+
+    def test_single_write_is_one_postgres_statement(self):
+        """На Postgres лог вставляется из CTE с условным UPDATE: без прошедшей записи статуса строки лога нет"""
+        now = datetime.now(timezone.utc)
+        campaign_id = uuid.uuid4()
+        stmt = EvaluationService(None).write_evaluation_statement(
+            {"id": campaign_id, "version": 3, "evaluated_version": 4, "target_status": Statuses.PAUSED},
+            {"id": uuid.uuid4(), "campaign_id": campaign_id, "triggered_rule": "BudgetRule",
+             "previous_target": Statuses.ACTIVE, "new_target": Statuses.PAUSED, "context": {},
+             "created_at": now, "updated_at": now}
+        )
+        compiled = stmt.compile(dialect=postgresql.asyncpg.dialect())
+        sql = " ".join(str(compiled).split())
+
+        assert sql.startswith("WITH updated AS (UPDATE campaigns SET")
+        assert "INSERT INTO rule_evaluation_logs" in sql
+        assert "FROM updated RETURNING rule_evaluation_logs.id" in sql
+        assert compiled.params["b_ids"] == [campaign_id]
+        assert compiled.params["b_target_statuses"] == ["PAUSED"]
+
+    def test_mark_evaluated_sql_does_not_depend_on_batch_size(self):
+        """На Postgres пачка передается массивами: текст запроса одинаков для любого размера пачки"""
+        def compiled(size):
+            evaluations = [
+                {"id": uuid.uuid4(), "version": 1, "evaluated_version": 2, "target_status": Statuses.PAUSED}
+                for _ in range(size)
+            ]
+            return str(CampaignService(None).mark_evaluated_statement(evaluations).compile(dialect=postgresql.dialect()))
+
+        assert compiled(1) == compiled(500)
+        assert "FROM unnest(" in compiled(1)
+        assert "CASE campaigns.id" not in compiled(500)
+
+    async def test_update_without_if_match_racing_delete_returns_none(self, db_session):
+        """PATCH без If-Match по кампании, удаленной между чтением и записью - не найдено, а не конфликт версий"""
+        campaign, = await create_campaigns(db_session, 1)
+        campaign_service = CampaignService(db_session)
+        original = campaign_service.get_campaign
+
+        async def get_then_delete(campaign_id):
+            found = await original(campaign_id)
+            await db_session.execute(delete(Campaign).where(Campaign.id == campaign_id))
+            return found
+
+        with patch.object(campaign_service, "get_campaign", side_effect=get_then_delete):
+            updated = await campaign_service.update_campaign(campaign.id, CampaignUpdate(budget_limit=2000))
+
+        assert updated is None
+
+
+class TestCountModes:
+
+    async def test_estimated_campaign_count_is_cached_per_filters(self, db_session):
+        """Без статистики Postgres estimated - точное количество из кэша по комбинации фильтров"""
+        campaign_service_module.count_cache.clear()
+        await create_campaigns(db_session, 2)
+        campaign_service = CampaignService(db_session)
+        
+        _, total, mode = await campaign_service.get_campaigns(is_managed=True, count=CountMode.ESTIMATED)
+        assert (total, mode) == (2, CountMode.ESTIMATED)
+        
+        await create_campaigns(db_session, 1)
+        _, cached, _ = await campaign_service.get_campaigns(is_managed=True, count=CountMode.ESTIMATED)
+        _, other_filters, _ = await campaign_service.get_campaigns(count=CountMode.ESTIMATED)
+        _, exact, mode = await campaign_service.get_campaigns(is_managed=True)
+        assert cached == 2
+        assert other_filters == 3
+        assert (exact, mode) == (3, CountMode.EXACT)
+        campaign_service_module.count_cache.clear()
+
+
+class TestLogRetention:
+
+    def test_partition_ranges(self):
+        """Границы и имена партиций по дням и месяцам, включая переход через год"""
+        december = log_partition_service.partition_start(datetime(2024, 12, 17, 15, 0, tzinfo=timezone.utc), "month")
+        assert december == datetime(2024, 12, 1, tzinfo=timezone.utc)
+        assert log_partition_service.next_partition_start(december, "month") == datetime(2025, 1, 1, tzinfo=timezone.utc)
+        
+        day = log_partition_service.partition_start(datetime(2024, 12, 31, 23, 0, tzinfo=timezone.utc), "day")
+        name = log_partition_service.partition_name(day, "day")
+        assert name == "rule_evaluation_logs_p20241231"
+        assert log_partition_service.parse_partition_name(name) == (day, "day")
+        assert log_partition_service.parse_partition_name("rule_evaluation_logs_legacy") is None
+        assert log_partition_service.parse_partition_name(log_partition_service.DEFAULT_PARTITION) is None
+    
+    async def test_expired_rows_are_deleted_and_hidden_from_history(self, db_session, monkeypatch):
+        """Без партиций истекшие строки удаляются пачками, история их не показывает"""
+        monkeypatch.setattr(log_partition_service, "LOG_RETENTION_DAYS", 30)
+        monkeypatch.setattr(log_partition_service, "LOG_RETENTION_BATCH_SIZE", 2)
+        campaign, = await create_campaigns(db_session, 1)
+        now = datetime.now(timezone.utc)
+        for days_ago in (100, 60, 45, 10, 0):
+            db_session.add(RuleEvaluationLog(
+                campaign_id=campaign.id,
+                previous_target=Statuses.ACTIVE,
+                new_target=Statuses.ACTIVE,
+                context={},
+                created_at=now - timedelta(days=days_ago)
+            ))
+        await db_session.execute(update(Campaign).where(Campaign.id == campaign.id).values(evaluation_count=5))
+        await db_session.commit()
+        
+        logs, total, _ = await EvaluationService(db_session).get_evaluation_history(campaign.id)
+        assert total == len(logs) == 2
+        
+        result = await log_partition_service.LogPartitionService(db_session).maintain(now)
+        assert result["deleted"] == 3
+        remaining = await db_session.scalar(select(func.count()).select_from(RuleEvaluationLog))
+        assert remaining == 2
+        _, estimated, _ = await EvaluationService(db_session).get_evaluation_history(campaign.id, count=CountMode.ESTIMATED)
+        assert estimated == 2
+
+
+class TestColdArchive:
+
+    async def _add_logs(self, db_session, campaign_id, moments):
+        for moment in moments:
+            db_session.add(RuleEvaluationLog(
+                campaign_id=campaign_id,
+                previous_target=Statuses.ACTIVE,
+                new_target=Statuses.PAUSED,
+                triggered_rule="BudgetRule",
+                context={"moment": moment.isoformat()},
+                created_at=moment
+            ))
+        await db_session.commit()
+
+    async def test_old_days_move_to_archive_and_history_falls_back(self, db_session, tmp_path, monkeypatch):
+        """Старые дни уезжают в файлы архива, история дочитывает их прозрачно тем же курсором"""
+        monkeypatch.setattr(archive_service, "EVALUATION_ARCHIVE_DIR", str(tmp_path))
+        first, second = await create_campaigns(db_session, 2)
+        now = datetime.now(timezone.utc)
+        old_day = now - timedelta(days=40)
+        await self._add_logs(db_session, first.id, [old_day + timedelta(minutes=i) for i in range(5)] + [now])
+        await self._add_logs(db_session, second.id, [old_day, now - timedelta(days=35)])
+        await db_session.execute(update(Campaign).where(Campaign.id == first.id).values(evaluation_count=6))
+        await db_session.commit()
+        
+        result = await archive_service.ArchiveService(db_session, directory=str(tmp_path), row_group_size=2).archive_expired(now)
+        
+        assert result["archived"] == 7
+        counts = dict((await db_session.execute(select(Campaign.id, Campaign.evaluation_count))).all())
+        assert counts == {first.id: 1, second.id: 0}
+        assert len(result["days"]) == 2
+        hot_rows = await db_session.scalar(select(func.count()).select_from(RuleEvaluationLog))
+        assert hot_rows == 1
+        index = archive_service.ArchiveReader(str(tmp_path)).load_index(old_day.date())
+        assert index["rows"] == 6
+        assert all(group["campaign_id_min"] <= group["campaign_id_max"] for group in index["row_groups"])
+        
+        evaluation_service = EvaluationService(db_session)
+        pages, after, total = [], None, None
+        while True:
+            logs, total, _ = await evaluation_service.get_evaluation_history(first.id, limit=4, after=after)
+            pages.append(logs)
+            if len(logs) < 4:
+                break
+            after = (logs[-1].created_at, logs[-1].id)
+        
+        entries = [log for page in pages for log in page]
+        assert total == 6
+        assert [len(page) for page in pages] == [4, 2]
+        assert entries[0].context["moment"] == now.isoformat()
+        assert {log.campaign_id for log in entries} == {first.id}
+        created = [archive_service.as_utc(log.created_at) for log in entries]
+        assert created == sorted(created, reverse=True)
+
+    async def test_projection_skips_context_in_database_and_archive(self, db_session, tmp_path, monkeypatch):
+        """История без поля context не читает его ни из базы, ни из файлов архива"""
+        monkeypatch.setattr(archive_service, "EVALUATION_ARCHIVE_DIR", str(tmp_path))
+        campaign, = await create_campaigns(db_session, 1)
+        now = datetime.now(timezone.utc)
+        await self._add_logs(db_session, campaign.id, [now - timedelta(days=40), now])
+        await archive_service.ArchiveService(db_session, directory=str(tmp_path)).archive_expired(now)
+        
+        evaluation_service = EvaluationService(db_session)
+        query = evaluation_service.history_query(campaign.id, raw_context=True, fields=("new_target",))
+        assert "context" not in str(query)
+        logs, _, _ = await evaluation_service.get_evaluation_history(
+            campaign.id, raw_context=True, fields=("new_target",)
+        )
+        assert [log.new_target for log in logs] == [Statuses.PAUSED, Statuses.PAUSED]
+        assert not hasattr(logs[0], "context")
+        assert logs[1].context is None
+
+
+class TestMetricsBuffer:
+
+    async def test_flushed_waiters_resolve_after_commit(self, isolated_session_factory):
+        """Ожидающие режима flushed получают результат после коммита общего сброса"""
+        async with isolated_session_factory() as db_session:
+            campaign, = await create_campaigns(db_session, 1)
+        buffer = MetricsBuffer(session_factory=isolated_session_factory)
+        
+        first = buffer.add([{"campaign_id": campaign.id, "spend_today": Decimal("1.00")}])
+        second = buffer.add([{"campaign_id": campaign.id, "spend_today": Decimal("2.00")}])
+        assert first is second
+        
+        assert await buffer.flush() == 1
+        assert await first == 1
+        async with isolated_session_factory() as db_session:
+            stored = await CampaignService(db_session).get_campaign(campaign.id)
+            assert stored.spend_today == Decimal("2.00")
+            assert stored.inputs_version == 2
+    
+    async def test_failed_flush_keeps_newer_values(self):
+        """Неудачный сброс возвращает значения в буфер, не перетирая более свежие"""
+        campaign_id = uuid.uuid4()
+        
+        def broken_session():
+            raise ConnectionError("база недоступна")
+        
+        buffer = MetricsBuffer(session_factory=broken_session)
+        waiter = buffer.add([{"campaign_id": campaign_id, "spend_today": Decimal("1.00"), "stock_days_left": 4}])
+        
+        with pytest.raises(ConnectionError):
+            await buffer.flush()
+        buffer.add([{"campaign_id": campaign_id, "spend_today": Decimal("5.00")}])
+        
+        assert buffer.pending[campaign_id] == {"spend_today": Decimal("5.00"), "stock_days_left": 4}
+        with pytest.raises(ConnectionError):
+            await waiter
+    
+    async def test_crossing_threshold_triggers_evaluation(self, isolated_session_factory):
+        """Оценивается только обновление, переводящее метрику через порог, и в том же сбросе"""
+        async with isolated_session_factory() as db_session:
+            campaign, = await create_campaigns(db_session, 1, budget_limit=100.00, spend_today=50.00)
+        buffer = MetricsBuffer(session_factory=isolated_session_factory)
+        
+        buffer.add([{"campaign_id": campaign.id, "spend_today": Decimal("60.00")}])
+        await buffer.flush()
+        assert campaign.id in buffer.thresholds
+        assert buffer.stats()["evaluated"] == 0
+        
+        buffer.add([{"campaign_id": campaign.id, "spend_today": Decimal("150.00")}])
+        assert buffer.crossed == {campaign.id}
+        await buffer.flush()
+        
+        assert buffer.stats()["evaluated"] == 1
+        async with isolated_session_factory() as db_session:
+            stored = await CampaignService(db_session).get_campaign(campaign.id)
+            assert stored.target_status == Statuses.PAUSED
+            assert stored.evaluated_version == stored.inputs_version
+            logs, _, _ = await EvaluationService(db_session).get_evaluation_history(campaign.id)
+            assert [log.triggered_rule for log in logs] == ["budget_exceeded"]
+    
+    async def test_first_flush_detects_crossing_from_stored_values(self, isolated_session_factory):
+        """Кампания, которой еще нет в индексе, сравнивается со значениями из базы до записи"""
+        async with isolated_session_factory() as db_session:
+            campaign, = await create_campaigns(db_session, 1, target_status="paused", stock_days_left=2)
+        buffer = MetricsBuffer(session_factory=isolated_session_factory)
+        
+        buffer.add([{"campaign_id": campaign.id, "stock_days_left": 30}])
+        assert buffer.crossed == set()
+        await buffer.flush()
+        
+        async with isolated_session_factory() as db_session:
+            stored = await CampaignService(db_session).get_campaign(campaign.id)
+            assert stored.target_status == Statuses.ACTIVE
+    
+    def test_threshold_index_reports_only_crossings(self):
+        campaign_id = uuid.uuid4()
+        index = ThresholdIndex()
+        row = dict.fromkeys(EVALUATION_FIELDS)
+        row.update(id=campaign_id, is_managed=True, stock_days_min=5, stock_days_left=10, budget_limit=None)
+        index.load([type("Row", (), row)])
+        
+        assert index.apply(campaign_id, {"stock_days_left": 7}) is False
+        assert index.apply(campaign_id, {"stock_days_left": 4}) is True
+        assert index.apply(campaign_id, {"stock_days_left": 1, "spend_today": Decimal("1e6")}) is False
+        assert index.apply(campaign_id, {"stock_days_left": 5}) is True
+        
+        index.discard(campaign_id)
+        assert index.apply(campaign_id, {"stock_days_left": 1}) is False
+
+
+class TestScheduleWrites:
+
+    async def test_schedule_is_replaced_by_diff(self, db_session):
+        """Совпадающие слоты остаются на месте, меняются только лишние и новые"""
+        campaign, = await create_campaigns(db_session, 1)
+        campaign_service = CampaignService(db_session)
+        monday = {"day_of_week": 0, "start_time": "09:00:00", "end_time": "18:00:00"}
+        first = await campaign_service.set_campaign_schedule(
+            campaign.id, [monday, {"day_of_week": 1, "start_time": "09:00:00", "end_time": "12:00:00"}]
+        )
+        
+        with recorded_statements(db_session) as statements:
+            second = await campaign_service.set_campaign_schedule(
+                campaign.id, [{"day_of_week": 2, "start_time": "10:00:00", "end_time": "11:00:00"}, monday]
+            )
+        
+        assert statements == ["SELECT", "DELETE", "INSERT", "UPDATE"]
+        assert second[1].id == first[0].id
+        assert second[0].day_of_week == 2
+        slots = await campaign_service.get_campaign_schedules(campaign.id)
+        assert sorted(slot.day_of_week for slot in slots) == [0, 2]
+    
+    async def test_same_schedule_writes_nothing(self, db_session):
+        campaign, = await create_campaigns(db_session, 1)
+        campaign_service = CampaignService(db_session)
+        slots = [{"day_of_week": 0, "start_time": "09:00:00", "end_time": "18:00:00"}]
+        await campaign_service.set_campaign_schedule(campaign.id, slots)
+        await db_session.commit()
+        version = (await campaign_service.get_campaign(campaign.id)).inputs_version
+        
+        with recorded_statements(db_session) as statements:
+            await campaign_service.set_campaign_schedule(campaign.id, slots)
+        
+        assert statements == ["SELECT"]
+        assert (await campaign_service.get_campaign(campaign.id)).inputs_version == version
+
+
+class TestScheduleTemplates:
+
+    async def test_template_campaigns_share_compiled_schedule(self, db_session):
+        """Кампании шаблона оцениваются по одному скомпилированному расписанию и общему снапшоту"""
+        campaigns = await create_campaigns(db_session, 3)
+        template_service = ScheduleTemplateService(db_session)
+        template = await template_service.create_template(ScheduleTemplateCreate(
+            name=f"Template {uuid.uuid4().hex[:8]}",
+            slots=[{"day_of_week": 0, "start_time": "09:00:00", "end_time": "18:00:00"}]
+        ))
+        attached = await template_service.assign_template(template.id, [c.id for c in campaigns] + [uuid.uuid4()])
+        assert attached == {c.id for c in campaigns}
+        
+        # 2024-01-01 - понедельник, вне окна шаблона
+        result = await EvaluationService(db_session).evaluate_all_campaigns(current_time=datetime(2024, 1, 1, 20, 0))
+        assert {r["new_target_status"] for r in result["results"]} == {Statuses.PAUSED}
+        
+        compiled = await template_service.get_compiled([template.id])
+        assert compiled[template.id] is (await template_service.get_compiled([template.id]))[template.id]
+        logs = (await db_session.execute(select(RuleEvaluationLog))).scalars().all()
+        assert {len(log.context["schedule_snapshot"]) for log in logs} == {1}
+    
+    async def test_template_change_reaches_incremental_sweep(self, db_session):
+        """Замена слотов шаблона пересобирает расписание и помечает привязанные кампании грязными"""
+        campaigns = await create_campaigns(db_session, 2)
+        template_service = ScheduleTemplateService(db_session)
+        evaluation_service = EvaluationService(db_session)
+        template = await template_service.create_template(ScheduleTemplateCreate(
+            name=f"Template {uuid.uuid4().hex[:8]}",
+            slots=[{"day_of_week": 0, "start_time": "09:00:00", "end_time": "18:00:00"}]
+        ))
+        await template_service.assign_template(template.id, [campaigns[0].id])
+        await evaluation_service.evaluate_all_campaigns(current_time=datetime(2024, 1, 1, 20, 0))
+        
+        await template_service.replace_slots(
+            template.id, [ScheduleSlotBase(day_of_week=0, start_time="19:00:00", end_time="23:00:00")]
+        )
+        result = await evaluation_service.evaluate_all_campaigns(
+            current_time=datetime(2024, 1, 1, 20, 1), mode=SweepMode.INCREMENTAL
+        )
+        assert [(r["campaign_id"], r["new_target_status"]) for r in result["results"]] == [
+            (campaigns[0].id, Statuses.ACTIVE)
+        ]
+        
+        # Окно шаблона закрылось: кампания попадает в инкрементальный прогон по слотам шаблона
+        closed = await evaluation_service.evaluate_all_campaigns(
+            current_time=datetime(2024, 1, 1, 23, 30), mode=SweepMode.INCREMENTAL
+        )
+        assert [(r["campaign_id"], r["new_target_status"]) for r in closed["results"]] == [
+            (campaigns[0].id, Statuses.PAUSED)
+        ]
+
+
+class TestCampaignCache:
+
+    async def test_reads_are_cached_and_writes_invalidate(self, db_session):
+        """Повторное чтение не идет в базу; запись сбрасывает кэш, незакоммиченное в кэш не попадает"""
+        campaign, = await create_campaigns(db_session, 1)
+        campaign_service = CampaignService(db_session)
+
+        await campaign_service.get_campaign_state(campaign.id)
+        with recorded_statements(db_session) as statements:
+            cached = await campaign_service.get_campaign_state(campaign.id)
+        assert statements == []
+        assert cached["campaign"]["budget_limit"] == Decimal("1000.00")
+
+        await campaign_service.update_campaign(campaign.id, CampaignUpdate(budget_limit=2000))
+        uncommitted = await campaign_service.get_campaign_state(campaign.id)
+        assert uncommitted["campaign"]["budget_limit"] == Decimal("2000.00")
+        assert campaign_cache.get(campaign.id) is None
+
+        await db_session.commit()
+        await campaign_service.get_campaign_state(campaign.id)
+        assert campaign_cache.get(campaign.id)["campaign"]["budget_limit"] == Decimal("2000.00")
+
+    async def test_evaluation_write_invalidates_state(self, db_session):
+        campaign, = await create_campaigns(db_session, 1, spend_today=1500.00)
+        await CampaignService(db_session).get_campaign_state(campaign.id)
+
+        result = await EvaluationService(db_session).evaluate_single_campaign(campaign.id)
+        assert result["new_target_status"] == Statuses.PAUSED
+        assert campaign_cache.get(campaign.id) is None
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        cache = CampaignCache(max_bytes=10_000, ttl_seconds=60, enabled=True)
+        ids = [uuid.uuid4() for _ in range(3)]
+        for campaign_id in ids[:2]:
+            assert cache.put(campaign_id, {"payload": "x" * 4000}, cache.generation)
+        cache.get(ids[0])
+        cache.put(ids[2], {"payload": "x" * 4000}, cache.generation)
+
+        assert set(cache.entries) == {ids[0], ids[2]}
+        assert cache.bytes <= cache.max_bytes
+        assert cache.stats()["evictions"] == 1
+        assert not cache.put(uuid.uuid4(), {"payload": "x" * 20_000}, cache.generation)
+
+    def test_ttl_and_stale_reads(self):
+        cache = CampaignCache(max_bytes=10_000, ttl_seconds=0, enabled=True)
+        campaign_id = uuid.uuid4()
+        cache.put(campaign_id, {}, cache.generation)
+        assert cache.get(campaign_id) is None
+        assert cache.stats()["expirations"] == 1
+
+        # Прочитанное до инвалидации устарело и не кладется
+        read_generation = cache.generation
+        cache.invalidate([campaign_id])
+        assert not cache.put(campaign_id, {}, read_generation)
+        assert cache.put(campaign_id, {}, cache.generation)
+
+
+class FakeListenConnection:
+    """Соединение asyncpg для слушателя инвалидации: уведомления и обрыв вызываются тестом"""
+
+    def __init__(self):
+        self.listeners = {}
+        self.on_terminate = None
+
+    def add_termination_listener(self, callback):
+        self.on_terminate = callback
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    async def fetchval(self, query):
+        return 1
+
+    async def close(self):
+        pass
+
+    def terminate(self):
+        pass
+
+    def notify(self, origin: str, campaign_id: uuid.UUID):
+        payload = json.dumps({"origin": origin, "sent_at": time.time(), "campaigns": [[str(campaign_id), 2]]})
+        self.listeners[CACHE_INVALIDATION_CHANNEL](self, 1, CACHE_INVALIDATION_CHANNEL, payload)
+
+
+class TestCacheInvalidation:
+
+    async def test_listener_evicts_other_replicas_changes_and_resyncs(self):
+        """Чужие изменения сбрасываются пачкой вместе с порогами, свои пропускаются; после обрыва все очищается"""
+        cache = CampaignCache(max_bytes=10_000, ttl_seconds=60, enabled=True)
+        connections = []
+
+        async def connect():
+            connections.append(FakeListenConnection())
+            return connections[-1]
+
+        thresholds = ThresholdIndex()
+        listener = CacheInvalidationListener(cache=cache, thresholds=thresholds, connect=connect, batch_seconds=0.01)
+        task = asyncio.create_task(listener.run())
+        try:
+            await asyncio.sleep(0.02)
+            assert listener.connected and cache.enabled
+
+            changed, own = uuid.uuid4(), uuid.uuid4()
+            cache.put(changed, {}, cache.generation)
+            cache.put(own, {}, cache.generation)
+            thresholds.entries.update({changed: None, own: None})
+            connections[0].notify("other-replica", changed)
+            connections[0].notify(PROCESS_ID, own)
+            await asyncio.sleep(0.03)
+            assert set(cache.entries) == {own}
+            assert changed not in thresholds and own in thresholds
+            assert listener.received == 1
+            assert listener.last_lag is not None
+
+            connections[0].on_terminate(connections[0])
+            await asyncio.sleep(0.03)
+            assert len(connections) == 2
+            assert listener.reconnects == 1 and listener.resyncs == 2
+            assert not cache.entries and cache.enabled
+            assert len(thresholds) == 0
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+class TestHotPathIndexes:
+
+    async def test_needs_sync_is_maintained_by_database(self, db_session):
+        """needs_sync вычисляется базой и обновляется вместе со статусами"""
+        campaign, = await create_campaigns(db_session, 1, current_status="active", target_status="paused")
+        assert campaign.needs_sync is True
+
+        updated = await CampaignService(db_session).update_campaign(
+            campaign.id, CampaignUpdate(current_status=Statuses.PAUSED)
+        )
+        assert updated.needs_sync is False
+
+    async def test_needing_sync_query_uses_partial_index(self, db_session, explain):
+        plan = await explain(CampaignService(db_session).needing_sync_query())
+        assert "ix_campaigns_needs_sync" in plan
+
+    async def test_managed_filter_uses_partial_index(self, db_session, explain):
+        plan = await explain(CampaignService(db_session).campaigns_query(is_managed=True))
+        assert "ix_campaigns_managed" in plan
+
+    async def test_batch_filter_uses_partial_index(self, db_session, explain):
+        """Фильтр evaluate-batch уходит в SQL и попадает в тот же частичный индекс, что и список"""
+        campaign_service = CampaignService(db_session)
+        criteria = campaign_service.filter_criteria(CampaignFilter(needs_sync=True))
+        plan = await explain(select(Campaign.id).where(*criteria))
+        assert "ix_campaigns_needs_sync" in plan
+
+    async def test_history_query_uses_composite_index_without_sort(self, db_session, explain):
+        plan = await explain(EvaluationService(db_session).history_query(uuid.uuid4()).limit(100))
+        assert "ix_rule_evaluation_logs_campaign_created" in plan
+        assert "TEMP B-TREE" not in plan and "Sort" not in plan
+
+    async def test_history_cursor_page_uses_composite_index_without_sort(self, db_session, explain):
+        query = EvaluationService(db_session).history_query(uuid.uuid4()).where(
+            tuple_(RuleEvaluationLog.created_at, RuleEvaluationLog.id) < tuple_(datetime(2024, 1, 1), uuid.uuid4())
+        )
+        plan = await explain(query.limit(100))
+        assert "ix_rule_evaluation_logs_campaign_created" in plan
+        assert "TEMP B-TREE" not in plan and "Sort" not in plan
+
+
+class TestSpendReset:
+
+    async def _campaigns_in(self, db_session, zone_name: str, count: int, **overrides) -> list:
+        campaigns = await create_campaigns(db_session, count, timezone=zone_name, **overrides)
+        await db_session.execute(
+            update(Campaign)
+            .where(Campaign.id.in_([campaign.id for campaign in campaigns]))
+            .values(spend_reset_on=date(2024, 1, 1))
+        )
+        await db_session.commit()
+        return campaigns
+
+    async def _spend(self, db_session, campaigns) -> list:
+        result = await db_session.execute(
+            select(Campaign.spend_today).where(Campaign.id.in_([campaign.id for campaign in campaigns]))
+        )
+        return result.scalars().all()
+
+    async def test_reset_follows_local_midnight(self, db_session):
+        """Пояс сбрасывается, когда в нем наступила полночь; повторный запуск ничего не делает"""
+        tokyo = await self._campaigns_in(db_session, "Asia/Tokyo", 3)
+        los_angeles = await self._campaigns_in(db_session, "America/Los_Angeles", 2)
+        reset_service = SpendResetService(db_session)
+
+        # 00:30 2 января в Токио, в Лос-Анджелесе еще 1 января
+        tokyo_midnight = datetime(2024, 1, 1, 15, 30, tzinfo=timezone.utc)
+        result = await reset_service.reset_due(now=tokyo_midnight, chunk_size=2)
+        assert result["reset"] == 3
+        assert result["timezones"] == ["Asia/Tokyo"]
+        assert await self._spend(db_session, tokyo) == [Decimal("0.00")] * 3
+        assert await self._spend(db_session, los_angeles) == [Decimal("500.00")] * 2
+        assert (await reset_service.reset_due(now=tokyo_midnight))["reset"] == 0
+
+        result = await reset_service.reset_due(now=datetime(2024, 1, 2, 9, 0, tzinfo=timezone.utc))
+        assert result["reset"] == 2
+        assert result["timezones"] == ["America/Los_Angeles"]
+
+        stored = (await db_session.execute(
+            select(Campaign.spend_reset_on, Campaign.inputs_version).where(Campaign.id == tokyo[0].id)
+        )).one()
+        assert stored == (date(2024, 1, 2), 2)
+
+    async def test_budget_paused_campaigns_are_reevaluated(self, db_session):
+        """Кампании на паузе из-за бюджета сразу возвращаются в работу, остальные не оцениваются"""
+        paused, = await self._campaigns_in(
+            db_session, "UTC", 1, spend_today=1500.00, current_status="paused", target_status="paused"
+        )
+        untouched, = await self._campaigns_in(db_session, "UTC", 1)
+
+        result = await SpendResetService(db_session).reset_due(now=datetime(2024, 1, 2, 0, 5, tzinfo=timezone.utc))
+        assert result == {"reset": 2, "reevaluated": 1, "timezones": ["UTC"]}
+
+        result = await db_session.execute(
+            select(Campaign.id, Campaign.target_status, Campaign.evaluated_version)
+            .where(Campaign.id.in_([paused.id, untouched.id]))
+        )
+        states = {campaign_id: (status, version) for campaign_id, status, version in result.all()}
+        assert states[paused.id][0] == Statuses.ACTIVE
+        assert states[untouched.id][1] is None
+
+
+class TestFleetSummary:
+
+    async def test_rolled_back_transitions_are_discarded(self, db_session, fleet_summary):
+        """Переходы применяются к сводке только после коммита"""
+        await create_campaigns(db_session, 2, spend_today=1500.00)
+        await reconcile(db_session)
+        
+        rows = await CampaignService(db_session).get_evaluation_inputs()
+        await EvaluationService(db_session).evaluate_rows(rows, current_time=datetime.now())
+        await db_session.rollback()
+        assert fleet_summary.snapshot()["blocked_by_rule"] == {}
+        
+        await EvaluationService(db_session).evaluate_rows(rows, current_time=datetime.now())
+        await db_session.commit()
+        assert fleet_summary.snapshot()["blocked_by_rule"] == {"budget_exceeded": 2}
+        assert await reconcile(db_session) == 0
+
+
+class TestStatusChangeFeed:
+
+    async def _evaluate(self, db_session, campaigns):
+        evaluation_service = EvaluationService(db_session)
+        for campaign in campaigns:
+            await evaluation_service.evaluate_single_campaign(campaign.id)
+        await db_session.commit()
+
+    async def test_one_poll_fans_out_to_all_subscribers(self, db_session):
+        """Смена target_status доходит до всех подписчиков одним запросом, оценка без смены - нет"""
+        feed = StatusChangeFeed()
+        first, second = feed.subscribe(), feed.subscribe()
+        paused, = await create_campaigns(db_session, 1, spend_today=1500.00)
+        unchanged, = await create_campaigns(db_session, 1)
+        await self._evaluate(db_session, [paused, unchanged])
+        
+        with recorded_statements(db_session) as statements:
+            assert await feed.poll(db_session) == 1
+        assert statements == ["SELECT"]
+        for subscription in (first, second):
+            change = subscription.queue.get_nowait()
+            assert (change.campaign_id, change.previous_target, change.new_target, change.triggered_rule) == \
+                (paused.id, Statuses.ACTIVE, Statuses.PAUSED, "budget_exceeded")
+        
+        # Окно перечитывания снова видит запись, но она уже разослана
+        assert await feed.poll(db_session) == 0
+        assert first.queue.empty()
+    
+    async def test_replay_after_token_and_lagging_subscriber(self, db_session):
+        """Переподключение досылает смены после токена; отставший подписчик отключается"""
+        campaigns = await create_campaigns(db_session, 3, spend_today=1500.00)
+        await self._evaluate(db_session, campaigns)
+        
+        changes = await read_changes(db_session, (datetime(2000, 1, 1, tzinfo=timezone.utc), uuid.UUID(int=0)))
+        assert {change.campaign_id for change in changes} == {campaign.id for campaign in campaigns}
+        rest = await read_changes(db_session, (changes[0].created_at, changes[0].id))
+        assert [change.id for change in rest] == [change.id for change in changes[1:]]
+        
+        feed = StatusChangeFeed(queue_size=2)
+        subscription = feed.subscribe()
+        assert await feed.poll(db_session) == 3
+        assert subscription.overflowed
+        assert subscription.queue.get_nowait() is None
+        assert feed.stats()["dropped_subscribers"] == 1